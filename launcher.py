@@ -3,8 +3,11 @@
 
 # Imports
 import os
+import sys
+import json
 import subprocess
 from scripts.interface import main_menu
+from scripts.utility import collect_machine_state, setup_unattended_upgrades
 
 def verify_ubuntu_version():
     """Check if running on Ubuntu 25.x (major version match only)"""
@@ -22,7 +25,35 @@ def verify_ubuntu_version():
         print(f"Version check failed: {e}")
         return False
 
+def print_machine_state(as_json: bool) -> None:
+    """Print the machine state snapshot (`launcher.py state [--json]`)"""
+    state = collect_machine_state()
+    if as_json:
+        print(json.dumps(state, indent=2, sort_keys=True))
+        return
+    for section, values in state.items():
+        if isinstance(values, dict):
+            print(f"{section}:")
+            for key, value in values.items():
+                print(f"    {key}: {value}")
+        elif isinstance(values, list):
+            print(f"{section}:")
+            for value in values:
+                print(f"    {value}")
+        else:
+            print(f"{section}: {values}")
+
 if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == "state":
+        print_machine_state("--json" in sys.argv[2:])
+        exit(0)
+    if len(sys.argv) > 1 and sys.argv[1] == "unattended-upgrades":
+        # Headless: optional JSON file with UNATTENDED_DEFAULTS keys
+        config = None
+        if len(sys.argv) > 2:
+            with open(sys.argv[2], "r") as f:
+                config = json.load(f)
+        exit(0 if setup_unattended_upgrades(config) else 1)
     if verify_ubuntu_version():
         main_menu()
     else:
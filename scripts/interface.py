@@ -3,6 +3,8 @@
 
 # Imports
 import os
+import sys
+import select
 from scripts.utility import *
 
 SEPARATOR_WIDTH = 80
@@ -54,11 +56,13 @@ def system_installation_menu():
     while True:
         os.system('clear')
         print_title("System Install and Updates")
-        print("\n\n\n\n\n    1. Update package lists + system packages\n\n"
+        print("\n\n\n\n    1. Update package lists + system packages\n\n"
               "    2. Install essential tools\n\n"
-              "    3. Configure automatic security updates\n\n\n\n\n\n")
+              "    3. Configure automatic security updates\n\n"
+              "    4. Rank package mirrors and tune apt downloads\n\n"
+              f"    5. Pause background apt timers this session (Status: {'Paused' if apt_timers_paused() else 'Running'})\n\n\n")
         thin_separator()
-        print("Selection; Menu Options 1-3, Back To Main = B: ", end="")
+        print("Selection; Menu Options 1-5, Back To Main = B: ", end="")
         choice = input().strip().upper()
         if choice == "1":
             os.system('clear')
@@ -94,7 +98,24 @@ def system_installation_menu():
             os.system('clear')
             print_title("Configuring Automatic Security Updates")
             try:
-                if setup_unattended_upgrades():
+                config = {**UNATTENDED_DEFAULTS, **load_state("unattended-upgrades", {})}
+                print("Press Enter to keep the value shown.\n")
+                start = input(f"Maintenance window start, HH:MM ({config['window_start']}): ").strip()
+                hours = input(f"Window length in hours ({config['window_hours']}): ").strip()
+                limit = input(f"Background download limit in KB/s, 0 = unlimited ({config['download_limit_kb']}): ").strip()
+                if start:
+                    config["window_start"] = start
+                if hours.isdigit():
+                    config["window_hours"] = int(hours)
+                if limit.isdigit():
+                    config["download_limit_kb"] = int(limit)
+                for key, question in (("only_on_ac_power", "Only when on AC power"),
+                                      ("skip_metered", "Skip on metered connections")):
+                    answer = input(f"{question}? [{'Y/n' if config[key] else 'y/N'}]: ").strip().lower()
+                    if answer in ("y", "n"):
+                        config[key] = answer == "y"
+                print("")
+                if setup_unattended_upgrades(config):
                     print("\nAutomatic security updates configured successfully.\n")
                     print("Note: Critical security updates will be installed automatically")
                 else:
@@ -102,12 +123,94 @@ def system_installation_menu():
             except Exception as e:
                 print(f"\nError during configuration: {e}\n")
             input("Press Enter to continue...")
+        elif choice == "4":
+            package_mirror_menu()
+        elif choice == "5":
+            os.system('clear')
+            print_title("Background Apt Timers")
+            holders = dpkg_lock_holders()
+            if holders:
+                print("The package manager lock is currently held by:")
+                for holder in holders:
+                    print(f"    {holder}")
+                print("")
+            else:
+                print("The package manager lock is free.\n")
+            if apt_timers_paused():
+                if resume_apt_timers():
+                    print("\nBackground apt timers resumed.\n")
+                else:
+                    print("\nOperation failed.\n")
+            elif pause_apt_timers():
+                print("\nBackground apt timers paused until this program exits.\n")
+                print("Note: a run already in progress is left to finish; installs wait for its lock.")
+            else:
+                print("\nOperation failed.\n")
+            input("Press Enter to continue...")
         elif choice == "B":
             break
         else:
             print("Invalid choice. Press Enter to try again...")
             input()
 
+def package_mirror_menu():
+    os.system('clear')
+    print_title("Package Mirrors")
+    codename = release_codename()
+    arch = dpkg_architecture()
+    current = current_archive_mirror(read_text(os.path.join("/", UBUNTU_SOURCES_FILE)) or "")
+    print(f"    Current mirror: {current or 'not found (no deb822 ubuntu.sources)'}")
+    acquire = "Installed" if os.path.exists(APT_ACQUIRE_FILE) else "Not installed"
+    print(f"    Apt download settings: {acquire}\n")
+    print("    1. Benchmark mirrors and switch to the fastest\n\n"
+          "    2. Toggle apt retry/timeout/pipelining settings\n\n"
+          "    R. Restore original sources\n\n")
+    thin_separator()
+    print("Selection; Menu Options 1-2, Restore = R, Back To Main = B: ", end="")
+    choice = input().strip().upper()
+    if choice == "1":
+        if not codename or not current:
+            print("\nCannot rank mirrors without a release codename and a deb822 ubuntu.sources.\n")
+            input("Press Enter to continue...")
+            return
+        extra = input("Extra mirror URLs to include, space separated (Enter for none): ").split()
+        candidates = [current] + DEFAULT_MIRRORS + extra
+        if arch in ("amd64", "i386"):
+            candidates += fetch_mirror_list()
+        print(f"\nTesting {len(set(candidates))} mirror(s) for {codename}/{arch}...\n")
+        ranked = rank_mirrors(candidates, codename, arch)
+        for result in ranked[:10]:
+            if result["throughput"]:
+                print(f"    {format_size(result['throughput']):>10}/s  {result['latency'] * 1000:6.0f} ms  {result['mirror']}")
+            elif result["latency"] is not None:
+                print(f"    {'untested':>12}  {result['latency'] * 1000:6.0f} ms  {result['mirror']}")
+            else:
+                print(f"    {'failed':>12}  {'':>9}  {result['mirror']}")
+        best = ranked[0] if ranked and ranked[0]["throughput"] else None
+        if best is None:
+            print("\nNo mirror could be measured.\n")
+        elif normalise_mirror(best["mirror"]) == normalise_mirror(current):
+            print("\nThe current mirror is already the fastest.\n")
+        elif input(f"\nSwitch to {best['mirror']}? [y/N]: ").strip().lower() == "y":
+            if apply_mirror(best["mirror"]) and update_system():
+                print("\nMirror switched and package lists refreshed.\n")
+            else:
+                print("\nOperation failed.\n")
+        input("Press Enter to continue...")
+    elif choice == "2":
+        result = toggle_apt_acquire_settings()
+        if result:
+            print(f"\nApt download settings written to {APT_ACQUIRE_FILE}.\n")
+        elif result is False:
+            print("\nApt download settings removed.\n")
+        else:
+            print("\nOperation failed.\n")
+        input("Press Enter to continue...")
+    elif choice == "R":
+        if restore_sources() and update_system():
+            print("\nOriginal sources restored.\n")
+        input("Press Enter to continue...")
+
 def software_management_menu():
     """Manage software and package installations with status display"""
     while True:
@@ -123,13 +226,15 @@ def software_management_menu():
         print("\n    1. Install virtualization packages (KVM, Libvirt)\n\n"
               "    2. Setup software managers (Gnome, Synaptic, Snap)\n\n"
               f"    3. Install Wine and Winetricks (Status: {wine_status})\n\n"
-              "    4. Install Python and related packages\n\n"
+              "    4. Python toolchain and wheelhouse\n\n"
               f"    5. OpenSnitch Firewall (Status: {opensnitch_status})\n\n"
               f"    6. Notepadqq Text Editor (Status: {notepadqq_status})\n\n"
-              f"    7. Tor Browser (Status: {tor_status})\n\n")
+              f"    7. Tor Browser (Status: {tor_status})\n\n"
+              "    8. KVM performance tuning (hugepages, pinning, virtio)\n\n"
+              "    9. Wine prefix templates (fast prefix creation)\n\n")
         
         thin_separator()
-        print("Selection; Menu Options 1-7, Back To Main = B: ", end="")
+        print("Selection; Menu Options 1-9, Back To Main = B: ", end="")
         choice = input().strip().upper()
         if choice == "1":
             os.system('clear')
@@ -170,16 +275,7 @@ def software_management_menu():
                 print(f"\nError during Wine and Winetricks operation: {e}\n")
             input("Press Enter to continue...")
         elif choice == "4":
-            os.system('clear')
-            print_title("Installing Python Packages")
-            try:
-                if install_python_packages():
-                    print("\nPython packages installed successfully.\n")
-                else:
-                    print("\nPython installation completed with some errors.\n")
-            except Exception as e:
-                print(f"\nError during Python packages installation: {e}\n")
-            input("Press Enter to continue...")
+            python_toolchain_menu()
         elif choice == "5":
             os.system('clear')
             action = "Installing" if not is_opensnitch_installed() else "Uninstalling"
@@ -230,21 +326,154 @@ def software_management_menu():
             else:
                 print("\nOperation failed.\n")
             input("Press Enter to continue...")
+        elif choice == "8":
+            kvm_tuning_menu()
+        elif choice == "9":
+            wine_templates_menu()
+        elif choice == "B":
+            break
+        else:
+            print("Invalid choice. Press Enter to try again...")
+            input()
+
+def python_toolchain_menu():
+    while True:
+        os.system('clear')
+        print_title("Python Toolchain")
+        status = "Installed" if is_python_toolchain_installed() else "Not installed"
+        wheels = list_wheelhouse()
+        print(f"    Wheelhouse: {WHEELHOUSE_DIR} ({len(wheels)} wheels, "
+              f"{format_size(sum(os.path.getsize(w) for w in wheels))})\n")
+        print(f"    1. Install Python development packages (Status: {status})\n\n"
+              "    2. Add packages to the wheelhouse (downloads once)\n\n"
+              "    3. Create virtual environment from the wheelhouse (offline)\n\n")
+        thin_separator()
+        print("Selection; Menu Options 1-3, Back To Main = B: ", end="")
+        choice = input().strip().upper()
+        if choice == "1":
+            os.system('clear')
+            print_title("Installing Python Packages")
+            try:
+                if install_python_packages():
+                    print("\nPython packages installed successfully.\n")
+                else:
+                    print("\nPython installation completed with some errors.\n")
+            except Exception as e:
+                print(f"\nError during Python packages installation: {e}\n")
+            input("Press Enter to continue...")
+        elif choice == "2":
+            requirements = input("Requirements, space separated (e.g. numpy requests==2.32.3): ").split()
+            if requirements and fill_wheelhouse(requirements):
+                print("\nWheelhouse updated.\n")
+            input("Press Enter to continue...")
+        elif choice == "3":
+            path = input("New environment path (e.g. ~/venvs/project): ").strip()
+            requirements = input("Requirements, space separated (Enter for none): ").split()
+            if path:
+                if path.startswith("~"):
+                    path = HOME_DIR + path[1:]
+                result = create_python_env(os.path.abspath(path), requirements)
+                if result is None:
+                    print("\nOperation failed.\n")
+                else:
+                    print(f"\nEnvironment ready in {result['seconds']}s: {result['packages']} package(s), "
+                          f"{result['hardlink']} hardlinked, {result['reflink']} reflinked, {result['copy']} copied file(s).\n")
+            input("Press Enter to continue...")
+        elif choice == "B":
+            break
+        else:
+            print("Invalid choice. Press Enter to try again...")
+            input()
+
+def wine_templates_menu():
+    while True:
+        os.system('clear')
+        print_title("Wine Prefix Templates")
+        version = get_wine_version()
+        print(f"    Installed Wine: {version or 'Not installed'}\n")
+        templates = list_wine_templates()
+        for meta in templates:
+            stale = "" if meta.get("version") == version else " (stale)"
+            verbs = " ".join(meta.get("verbs", [])) or "no verbs"
+            print(f"    - Wine {meta.get('version')}{stale}: {verbs} (built in {meta.get('build_seconds')}s)")
+        if not templates:
+            print("    No templates built yet.")
+        print("\n    1. Build template for a verb set\n\n"
+              "    2. Create new prefix from template\n\n"
+              "    3. Remove all templates\n\n")
+        thin_separator()
+        print("Selection; Menu Options 1-3, Back To Main = B: ", end="")
+        choice = input().strip().upper()
+        if choice in ("1", "2"):
+            verbs = input("Winetricks verbs, space separated (Enter for none): ").split()
+            if choice == "1":
+                build_wine_template(verbs)
+            else:
+                dest = input("New prefix path (e.g. ~/.wine-app): ").strip()
+                if dest and not create_wine_prefix(dest, verbs):
+                    print("\nOperation failed.\n")
+            input("Press Enter to continue...")
+        elif choice == "3":
+            print(f"\nRemoved {invalidate_wine_templates(None)} template(s).\n")
+            input("Press Enter to continue...")
         elif choice == "B":
             break
         else:
             print("Invalid choice. Press Enter to try again...")
             input()
 
+def kvm_tuning_menu():
+    os.system('clear')
+    print_title("KVM Performance Tuning")
+    host = check_kvm_host()
+    yes_no = {True: "Yes", False: "No", None: "Unknown"}
+    print(f"    KVM acceleration: {yes_no[host['kvm']]}")
+    print(f"    IOMMU active: {yes_no[host['iommu']]}"
+          + ("" if host["iommu"] else " (enable 'IOMMU passthrough' in Kernel boot parameters)"))
+    print(f"    Nested virtualization: {yes_no[host['nested']]}")
+    print(f"    Hugepages: {host['hugepages_total']} x {host['hugepage_size_kb']} KB "
+          f"({host['hugepages_free']} free)\n")
+    cores = read_cpu_topology()
+    print(f"    Host topology: {len(cores)} cores, {len(cores[0]) if cores else 1} thread(s) per core\n")
+    thin_separator()
+    name = input("Guest name (Enter to go back): ").strip()
+    if not name:
+        return
+    memory = input("Guest memory in MiB: ").strip()
+    vcpus = input("Guest vCPUs: ").strip()
+    if not memory.isdigit() or not vcpus.isdigit():
+        print("Invalid input. Must be numbers. Press Enter to continue...")
+        input()
+        return
+    disk_path = input("Disk image path (Enter to skip): ").strip()
+    hugepages = input(f"Reserve {memory} MiB of static hugepages for this guest? [y/N]: ").strip().lower() == "y"
+    path = create_kvm_template(name, int(memory), int(vcpus), disk_path, hugepages)
+    if path:
+        allocated = reserve_kvm_hugepages(name, int(memory), hugepages)
+        if allocated is not None:
+            print(f"Hugepages reserved for all planned guests: {allocated}")
+        print(f"\nDomain template written to {path}")
+        print(f"Define it with: virsh define {path}\n")
+    else:
+        print("\nTemplate generation failed.\n")
+    input("Press Enter to continue...")
+
 def hardware_optimization_menu():
     while True:
         os.system('clear')
         print_title("Hardware and Drivers")
+        dkms_status = "Enabled" if is_dkms_acceleration_enabled() else "Disabled"
         print("    1. CPU Setup\n\n"
               "    2. GPU Setup\n\n"
-              "    3. ARM64 Firmware (Snapdragon)\n\n")  # New option
+              "    3. ARM64 Firmware (Snapdragon)\n\n"  # New option
+              f"    4. DKMS build acceleration (Status: {dkms_status})\n\n"
+              "    5. Auto-detect hardware and recommended setup\n\n"
+              "    6. Kernel boot parameters\n\n"
+              "    7. Storage tuning\n\n"
+              "    8. Performance monitor\n\n"
+              "    9. Benchmark before/after a tweak\n\n")
         thin_separator()
-        print("Selection; Menu Options 1-3, Back To Main = B: ", end="")
+        print("Selection; Menu Options 1-9, Back To Main = B: ", end="")
         choice = input().strip().upper()
         if choice == "1":
             cpu_setup_menu()
@@ -259,6 +488,249 @@ def hardware_optimization_menu():
             except Exception as e:
                 print(f"\nError during ARM64 setup: {e}\n")
             input("Press Enter to continue...")
+        elif choice == "4":
+            os.system('clear')
+            action = "Disabling" if is_dkms_acceleration_enabled() else "Enabling"
+            print_title(f"{action} DKMS Build Acceleration")
+            result = toggle_dkms_acceleration()
+            if result:
+                print("\nDKMS builds will use ccache and parallel jobs.\n")
+            elif result is False:
+                print("\nDKMS build acceleration removed.\n")
+            else:
+                print("\nOperation failed.\n")
+            show_dkms_build_times()
+            print("")
+            input("Press Enter to continue...")
+        elif choice == "5":
+            os.system('clear')
+            print_title("Hardware Autodetection")
+            hardware = detect_hardware()
+            print(f"CPU: {hardware['cpu']['model']} ({hardware['cpu']['vendor']})")
+            for gpu in hardware["gpus"]:
+                print(f"GPU: {gpu['name']} [{gpu['vendor']}:{gpu['device']}] at {gpu['slot']}")
+            if not hardware["recommended"]:
+                print("\nNo matching setup options for the detected hardware.\n")
+            else:
+                print("\nRecommended setup:")
+                for function, reason in hardware["recommended"]:
+                    print(f"    - {SETUP_DESCRIPTIONS[function]}: {reason}")
+                if input("\nRun recommended setup now? [y/N]: ").strip().lower() == "y":
+                    try:
+                        if run_recommended_setup(hardware["recommended"]):
+                            print("\nRecommended setup completed.\n")
+                        else:
+                            print("\nRecommended setup completed with some errors.\n")
+                    except Exception as e:
+                        print(f"\nError during recommended setup: {e}\n")
+            input("Press Enter to continue...")
+        elif choice == "6":
+            kernel_params_menu()
+        elif choice == "7":
+            storage_tuning_menu()
+        elif choice == "8":
+            performance_monitor_screen()
+        elif choice == "9":
+            benchmark_menu()
+        elif choice == "B":
+            break
+        else:
+            print("Invalid choice. Press Enter to try again...")
+            input()
+
+def kernel_params_menu():
+    while True:
+        os.system('clear')
+        print_title("Kernel Boot Parameters")
+        applied = applied_param_sets()
+        names = list(KERNEL_PARAM_SETS)
+        for i, name in enumerate(names, 1):
+            status = "Applied" if name in applied else "Not applied"
+            print(f"    {i}. {KERNEL_PARAM_SETS[name]['description']} (Status: {status})")
+        try:
+            diff = kernel_param_diff()
+        except OSError as e:
+            diff = []
+            print(f"\n    Cannot read GRUB configuration: {e}")
+        print("")
+        for token, action in diff:
+            print(f"    Pending: {token} ({action})")
+        print("")
+        thin_separator()
+        print(f"Selection; Toggle Options 1-{len(names)}, Back = B: ", end="")
+        choice = input().strip().upper()
+        if choice.isdigit() and 1 <= int(choice) <= len(names):
+            name = names[int(choice) - 1]
+            if name in applied:
+                remove_kernel_param_set(name)
+            else:
+                values = None
+                if name == "hugepages-1g":
+                    count = input("Number of 1 GiB hugepages to reserve: ").strip()
+                    if not count.isdigit():
+                        print("Invalid input. Must be a number. Press Enter to continue...")
+                        input()
+                        continue
+                    values = {"hugepages": count}
+                apply_kernel_param_set(name, values)
+        elif choice == "B":
+            regenerate_grub_config()
+            break
+        else:
+            print("Invalid choice. Press Enter to try again...")
+            input()
+
+def performance_monitor_screen():
+    monitor = open_monitor()
+    sample_monitor(monitor)
+    os.system('clear')
+    try:
+        while True:
+            # Waiting on stdin doubles as the sample interval; Enter stops the monitor
+            if select.select([sys.stdin], [], [], MONITOR_INTERVAL)[0]:
+                sys.stdin.readline()
+                break
+            sample = sample_monitor(monitor)
+            if sample is None:
+                continue
+            sys.stdout.write("\x1b[H")
+            print_title("Performance Monitor")
+            print(render_monitor(monitor, sample))
+            print("")
+            thin_separator()
+            sys.stdout.write("Press Enter to return...\x1b[J")
+            sys.stdout.flush()
+    except KeyboardInterrupt:
+        print("")
+    finally:
+        close_monitor(monitor)
+
+def print_benchmark_comparison(rows):
+    print(f"\n    {'Benchmark':<36}{'Before':>10}{'After':>10}  {'Change (95% CI)':<24}Verdict")
+    for row in rows:
+        interval = f"{row['change']:+.1f}% [{row['low']:+.1f}, {row['high']:+.1f}]"
+        print(f"    {row['description']:<36}{row['before']:>10.2f}{row['after']:>10.2f}  {interval:<24}{row['verdict']}")
+    print("")
+
+def benchmark_menu():
+    # Tweaks that can be wrapped by an A/B run
+    operations = [
+        ("CPU profile: throughput", lambda: apply_cpu_profile("throughput")),
+        ("CPU profile: latency", lambda: apply_cpu_profile("latency")),
+        ("CPU profile: balanced", lambda: apply_cpu_profile("balanced")),
+        ("Revert CPU profile", revert_cpu_profile),
+        ("I/O scheduler tuning", lambda: apply_io_tuning() is not None),
+        ("Revert I/O scheduler tuning", revert_io_tuning),
+    ] + [(f"Sysctl profile: {name}", lambda name=name: apply_sysctl_profile(name)) for name in SYSCTL_PROFILES]
+    while True:
+        os.system('clear')
+        print_title("Benchmark Harness")
+        history = load_benchmark_history()
+        print(f"    {len(history)} recorded run(s) for {socket.gethostname()}\n")
+        print("    1. Run benchmark battery and record it\n\n"
+              "    2. Compare two recorded runs\n\n"
+              "    3. A/B test a tweak (benchmark, apply, benchmark, compare)\n\n")
+        thin_separator()
+        print("Selection; Menu Options 1-3, Back To Main = B: ", end="")
+        choice = input().strip().upper()
+        if choice == "1":
+            label = input("Label for this run (e.g. 'stock kernel'): ").strip()
+            print("")
+            run_benchmarks(label)
+            print("\nRun recorded.\n")
+            input("Press Enter to continue...")
+        elif choice == "2":
+            print("")
+            for i, run in enumerate(history[-15:], max(1, len(history) - 14)):
+                when = time.strftime("%Y-%m-%d %H:%M", time.localtime(run["time"]))
+                print(f"    {i}. {when} {run.get('label', '')}")
+            picks = input("\nRuns to compare, before and after (e.g. '3 4'): ").split()
+            if len(picks) == 2 and all(p.isdigit() and 1 <= int(p) <= len(history) for p in picks):
+                print_benchmark_comparison(compare_benchmarks(history[int(picks[0]) - 1], history[int(picks[1]) - 1]))
+            else:
+                print("\nInvalid selection.\n")
+            input("Press Enter to continue...")
+        elif choice == "3":
+            print("")
+            for i, (description, _) in enumerate(operations, 1):
+                print(f"    {i}. {description}")
+            pick = input(f"\nTweak to test (1-{len(operations)}): ").strip()
+            if pick.isdigit() and 1 <= int(pick) <= len(operations):
+                description, operation = operations[int(pick) - 1]
+                print("")
+                rows = ab_benchmark(operation, description)
+                if rows:
+                    print_benchmark_comparison(rows)
+            input("Press Enter to continue...")
+        elif choice == "B":
+            break
+        else:
+            print("Invalid choice. Press Enter to try again...")
+            input()
+
+def print_io_table(rows):
+    print(f"    {'Device':<10}{'Type':<6}{'Scheduler':<24}{'Read-ahead':<22}{'nr_requests'}")
+    for before, after in rows:
+        scheduler = before["scheduler"] if before["scheduler"] == after["scheduler"] else f"{before['scheduler']} -> {after['scheduler']}"
+        read_ahead = (f"{before['read_ahead_kb']}" if before["read_ahead_kb"] == after["read_ahead_kb"]
+                      else f"{before['read_ahead_kb']} -> {after['read_ahead_kb']}")
+        print(f"    {before['name']:<10}{before['kind']:<6}{scheduler:<24}{read_ahead + ' KB':<22}{after['nr_requests']}")
+
+def storage_tuning_menu():
+    while True:
+        os.system('clear')
+        print_title("Storage Tuning")
+        io_status = "Applied" if is_io_tuning_applied() else "Not applied"
+        print("    Current / recommended:\n")
+        print_io_table([(device, dict(device, scheduler=device["target_scheduler"], read_ahead_kb=device["target_read_ahead_kb"]))
+                        for device in plan_io_tuning()])
+        print(f"\n\n    1. I/O scheduler and read-ahead udev rules (Status: {io_status})\n\n"
+              "    2. Mount options and TRIM (/etc/fstab)\n\n")
+        thin_separator()
+        print("Selection; Menu Options 1-2, Roll Back fstab = R, Back = B: ", end="")
+        choice = input().strip().upper()
+        if choice == "1":
+            os.system('clear')
+            if is_io_tuning_applied():
+                print_title("Reverting I/O Scheduler Tuning")
+                if revert_io_tuning():
+                    print("\nudev rules removed and previous settings restored.\n")
+            else:
+                print_title("Applying I/O Scheduler Tuning")
+                rows = apply_io_tuning()
+                if rows is not None:
+                    print_io_table(rows)
+                    print(f"\nRules written to {IO_UDEV_RULES}.\n")
+            input("Press Enter to continue...")
+        elif choice == "2":
+            os.system('clear')
+            print_title("Mount Options and TRIM")
+            try:
+                _, _, changes, use_fstrim = plan_fstab_optimization()
+            except OSError as e:
+                print(f"Cannot read /etc/fstab: {e}\n")
+                input("Press Enter to continue...")
+                continue
+            if not changes:
+                print("No mount option changes proposed.\n")
+            else:
+                for change in changes:
+                    print(f"    {change}")
+                if use_fstrim:
+                    print("    fstrim.timer: weekly TRIM instead of continuous discard")
+                print("")
+                if input("Apply these changes (validated with findmnt --verify)? [y/N]: ").strip().lower() == "y":
+                    if apply_fstab_optimization():
+                        print("\nfstab updated, previous version kept for rollback.\n")
+                    else:
+                        print("\nfstab left unchanged.\n")
+            input("Press Enter to continue...")
+        elif choice == "R":
+            os.system('clear')
+            print_title("Rolling Back fstab")
+            if rollback_fstab():
+                print("\nPrevious fstab restored.\n")
+            input("Press Enter to continue...")
         elif choice == "B":
             break
         else:
@@ -269,10 +741,15 @@ def cpu_setup_menu():
     while True:
         os.system('clear')
         print_title("Processor Setup")
-        print("    1. AMD CPU\n\n"
-              "    2. Intel CPU\n\n")
+        detected = [function for function, _ in detect_hardware()["recommended"]]
+        amd_mark = " (Detected)" if "amd_cpu_setup" in detected else ""
+        intel_mark = " (Detected)" if "intel_cpu_setup" in detected else ""
+        print(f"    1. AMD CPU{amd_mark}\n\n"
+              f"    2. Intel CPU{intel_mark}\n\n"
+              "    3. CPU tuning profile\n\n")
+        print(f"    {cpu_tuning_status_line()}\n")
         thin_separator()
-        print("Selection; Menu Options 1-2, Back To Main = B: ", end="")
+        print("Selection; Menu Options 1-3, Back To Main = B: ", end="")
         choice = input().strip().upper()
         if choice == "1":
             os.system('clear')
@@ -292,6 +769,42 @@ def cpu_setup_menu():
             except Exception as e:
                 print(f"\nError during Intel CPU setup: {e}\n")
             input("Press Enter to continue...")
+        elif choice == "3":
+            cpu_profile_menu()
+        elif choice == "B":
+            break
+        else:
+            print("Invalid choice. Press Enter to try again...")
+            input()
+
+def cpu_profile_menu():
+    while True:
+        os.system('clear')
+        print_title("CPU Tuning Profile")
+        print(f"    {cpu_tuning_status_line()}\n\n")
+        profiles = list(CPU_PROFILES)
+        for i, name in enumerate(profiles, 1):
+            print(f"    {i}. {name.title()} - {CPU_PROFILES[name]['description']}\n")
+        print("\n")
+        thin_separator()
+        print(f"Selection; Menu Options 1-{len(profiles)}, Revert = R, Back = B: ", end="")
+        choice = input().strip().upper()
+        if choice.isdigit() and 1 <= int(choice) <= len(profiles):
+            profile = profiles[int(choice) - 1]
+            os.system('clear')
+            print_title(f"Applying {profile.title()} CPU Profile")
+            if apply_cpu_profile(profile):
+                print(f"\n{profile.title()} profile applied and enabled at boot.\n")
+            else:
+                print("\nProfile applied with some errors.\n")
+            print(f"    {cpu_tuning_status_line()}\n")
+            input("Press Enter to continue...")
+        elif choice == "R":
+            os.system('clear')
+            print_title("Reverting CPU Profile")
+            if revert_cpu_profile():
+                print("\nOriginal CPU settings restored and boot unit removed.\n")
+            input("Press Enter to continue...")
         elif choice == "B":
             break
         else:
@@ -303,10 +816,13 @@ def gpu_setup_menu():
         os.system('clear')
         print_title("Graphics Setup")
         cuda_status = "Installed" if is_cuda_installed() else "Not installed"
-        print("    1. AMDGPU (Non-ROCm)\n\n"
-              "    2. AMDGPU (ROCm)\n\n"
-              "    3. NVIDIA GPU\n\n"
-              "    4. Intel GPU\n\n"
+        detected = [function for function, _ in detect_hardware()["recommended"]]
+        marks = {function: " (Detected)" if function in detected else ""
+                 for function in ("amdgpu_non_rocm_setup", "amdgpu_rocm_setup", "nvidia_gpu_setup", "intel_gpu_setup")}
+        print(f"    1. AMDGPU (Non-ROCm){marks['amdgpu_non_rocm_setup']}\n\n"
+              f"    2. AMDGPU (ROCm){marks['amdgpu_rocm_setup']}\n\n"
+              f"    3. NVIDIA GPU{marks['nvidia_gpu_setup']}\n\n"
+              f"    4. Intel GPU{marks['intel_gpu_setup']}\n\n"
               f"    5. NVIDIA CUDA Toolkit (Status: {cuda_status})\n\n")
         thin_separator()
         print("Selection; Menu Options 1-5, Back To Main = B: ", end="")
@@ -349,10 +865,19 @@ def gpu_setup_menu():
             input("Press Enter to continue...")
         elif choice == "5":
             os.system('clear')
-            action = "Uninstalling" if is_cuda_installed() else "Installing"
+            installed = is_cuda_installed()
+            action = "Uninstalling" if installed else "Installing"
             print_title(f"{action} NVIDIA CUDA Toolkit")
+            preset = "full"
+            if not installed:
+                presets = list(CUDA_PRESETS)
+                for i, name in enumerate(presets, 1):
+                    print(f"    {i}. {CUDA_PRESETS[name]['description']}\n")
+                selection = input(f"Select components 1-{len(presets)} (Enter = full): ").strip()
+                if selection.isdigit() and 1 <= int(selection) <= len(presets):
+                    preset = presets[int(selection) - 1]
             try:
-                result = install_cuda_toolkit()
+                result = install_cuda_toolkit(preset)
                 if result is True:
                     print("\nCUDA Toolkit installed successfully.\n")
                     print("NOTE: You may need to reboot and set environment variables.")
@@ -375,26 +900,47 @@ def system_tweaks_menu():
         print_title("Tweaks and Hacks")
         
         # Get current statuses
+        hang_timeout = get_hang_timeout()
         statuses = {
-            "sudo": "Enabled" if check_sudo_nopasswd() else "Disabled",
+            "sudo": {True: "Enabled", False: "Disabled", None: "Unknown"}[check_sudo_nopasswd()],
             "auto_login": "Enabled" if check_auto_login() else "Disabled",
             "windows_commands": "Enabled" if check_windows_commands() else "Disabled",
             "windows_shortcuts": "Enabled" if check_windows_shortcuts() else "Disabled",
-            "hang_timeout": f"{get_hang_timeout()}s"
+            "hang_timeout": f"{hang_timeout}s" if hang_timeout is not None else "Unavailable",
+            "zram": "Enabled" if is_zram_configured() else "Disabled"
         }
         
         # Print menu
-        print(f"\n\n\n    1. Toggle sudo password prompt (Status: {statuses['sudo']})\n\n"
+        print(f"\n    1. Toggle sudo password prompt (Status: {statuses['sudo']})\n\n"
               f"    2. Toggle auto-login (Status: {statuses['auto_login']})\n\n"
               f"    3. Implement Windows-like commands (Status: {statuses['windows_commands']})\n\n"
               f"    4. Set Windows-like keyboard shortcuts (Status: {statuses['windows_shortcuts']})\n\n"
-              f"    5. Adjust GNOME hang timeout (Current: {statuses['hang_timeout']})\n\n\n\n")
+              f"    5. Adjust GNOME hang timeout (Current: {statuses['hang_timeout']})\n\n"
+              f"    6. Memory: zram swap sizing (Status: {statuses['zram']})\n\n"
+              "    7. Sysctl performance profiles\n\n"
+              "    8. Apply per-user tweaks to multiple users\n\n"
+              "    9. Shell startup report\n\n"
+              "   10. Boot performance\n\n"
+              "   11. Log volume (rsyslog filters, journal limits)\n\n")
         
         thin_separator()
-        print("Selection; Menu Options 1-6, Back To Main = B: ", end="")
+        print("Selection; Menu Options 1-11, Back To Main = B: ", end="")
         
         choice = input().strip().upper()
         
+        # Sub-menus
+        submenus = {
+            "6": zram_menu,
+            "7": sysctl_profiles_menu,
+            "8": multi_user_menu,
+            "9": shell_startup_menu,
+            "10": boot_performance_menu,
+            "11": logging_menu
+        }
+        if choice in submenus:
+            submenus[choice]()
+            continue
+        
         # Menu actions
         actions = {
             "1": {
@@ -431,8 +977,10 @@ def system_tweaks_menu():
             os.system('clear')
             print_title(actions[choice]["title"])
             try:
-                actions[choice]["function"]()
-                print(f"\n{actions[choice]['success']}.\n")
+                if actions[choice]["function"]() is False:
+                    print("\nOperation failed.\n")
+                else:
+                    print(f"\n{actions[choice]['success']}.\n")
             except Exception as e:
                 print(f"\nError: {e}\n")
             input("Press Enter to continue...")
@@ -440,6 +988,274 @@ def system_tweaks_menu():
             print("Invalid choice. Press Enter to try again...")
             input()
 
+def zram_menu():
+    while True:
+        os.system('clear')
+        print_title("Memory: zram Swap")
+        saved = load_state("zram", {})
+        meminfo = read_meminfo()
+        print(f"    RAM: {format_size(meminfo.get('MemTotal', 0) * 1024)}, "
+              f"Configured profile: {saved.get('profile', 'none')}\n")
+        for device in read_zram_stats():
+            print(f"    {device['device']}: {format_size(device['disksize'])} {device['algorithm']}, "
+                  f"stored {format_size(device['original'])} in {format_size(device['used'])} "
+                  f"(ratio {device['ratio']:.2f}, saving {format_size(device['saved'])})")
+        print("")
+        profiles = list(ZRAM_PROFILES)
+        for i, name in enumerate(profiles, 1):
+            plan = plan_zram(name)
+            print(f"    {i}. {ZRAM_PROFILES[name]['description']} -> {plan['size_mb']} MiB\n")
+        thin_separator()
+        print(f"Selection; Menu Options 1-{len(profiles)}, Revert = R, Back = B: ", end="")
+        choice = input().strip().upper()
+        if choice.isdigit() and 1 <= int(choice) <= len(profiles):
+            profile = profiles[int(choice) - 1]
+            os.system('clear')
+            print_title(f"Applying zram Profile: {profile.title()}")
+            if apply_zram(profile):
+                print("\nzram swap configured.\n")
+            else:
+                print("\nzram setup completed with some errors.\n")
+            input("Press Enter to continue...")
+        elif choice == "R":
+            os.system('clear')
+            print_title("Reverting zram Swap")
+            if revert_zram():
+                print("\nzram removed and swap settings restored.\n")
+            input("Press Enter to continue...")
+        elif choice == "B":
+            break
+        else:
+            print("Invalid choice. Press Enter to try again...")
+            input()
+
+def sysctl_profiles_menu():
+    while True:
+        os.system('clear')
+        print_title("Sysctl Performance Profiles")
+        profiles = list(SYSCTL_PROFILES)
+        for i, name in enumerate(profiles, 1):
+            status = "Applied" if is_sysctl_profile_applied(name) else "Not applied"
+            pending = len(diff_sysctl_profile(name))
+            print(f"    {i}. {SYSCTL_PROFILES[name]['description']}\n"
+                  f"       (Status: {status}, {pending} value(s) differ from live)\n")
+        thin_separator()
+        print(f"Selection; Menu Options 1-{len(profiles)}, Back = B: ", end="")
+        choice = input().strip().upper()
+        if choice.isdigit() and 1 <= int(choice) <= len(profiles):
+            name = profiles[int(choice) - 1]
+            applied = is_sysctl_profile_applied(name)
+            os.system('clear')
+            print_title(f"{'Reverting' if applied else 'Applying'} Sysctl Profile: {name.title()}")
+            for key, live, target in diff_sysctl_profile(name):
+                print(f"    {key}: {live if live is not None else '(missing)'} -> {target}")
+            print("")
+            if input(f"{'Revert' if applied else 'Apply'} this profile? [y/N]: ").strip().lower() == "y":
+                if applied:
+                    result = revert_sysctl_profile(name)
+                else:
+                    result = apply_sysctl_profile(name)
+                print("\nDone.\n" if result else "\nOperation failed.\n")
+            input("Press Enter to continue...")
+        elif choice == "B":
+            break
+        else:
+            print("Invalid choice. Press Enter to try again...")
+            input()
+
+def multi_user_menu():
+    os.system('clear')
+    print_title("Multi-User Tweaks")
+    pattern = input("User name pattern, e.g. 'lab*' (Enter for all human users): ").strip() or None
+    users = list_human_users(pattern)
+    if not users:
+        print("\nNo matching users.\n")
+        input("Press Enter to continue...")
+        return
+    print("")
+    for user in users:
+        session = "logged in" if session_bus_address(user["name"]) else "offline"
+        print(f"    {user['name']} (UID {user['uid']}, {session})")
+    print("\n    1. Folder layout (copy of your current folders, $HOME-relative)\n\n"
+          "    2. Windows-like keyboard shortcuts\n\n"
+          "    3. GNOME hang timeout\n\n")
+    thin_separator()
+    selected = input("Tweaks to apply, e.g. '1 3' (Enter to cancel): ").split()
+    tweaks = {}
+    if "1" in selected:
+        tweaks["layout"] = portable_dir_layout(read_user_dirs()[1])
+    if "2" in selected:
+        tweaks["shortcuts"] = True
+    if "3" in selected:
+        seconds = input("Hang timeout in seconds (0=disable): ").strip()
+        if seconds.isdigit():
+            tweaks["hang_timeout"] = int(seconds)
+        else:
+            print("Invalid input. Must be a number.")
+    if tweaks:
+        print(f"\nApplying to {len(users)} user(s)...\n")
+        results = batch_apply_user_tweaks([user["name"] for user in users], **tweaks)
+        failed = sum(1 for errors in results.values() if errors)
+        print(f"\n{len(results) - failed} succeeded, {failed} failed.\n")
+    else:
+        print("\nNo changes made.\n")
+    input("Press Enter to continue...")
+
+def shell_startup_menu():
+    os.system('clear')
+    print_title("Shell Startup Report")
+    print("Timing login shells and sourcing each fragment, please wait...\n")
+    before = time_login_shell()
+    rows = profile_shell_fragments()
+    if before is None or rows is None:
+        print("Could not run bash as the target user.\n")
+        input("Press Enter to continue...")
+        return
+    print(f"    Interactive login shell: {before:.1f} ms (median of {SHELL_TIMING_RUNS} runs)\n")
+    for row in sorted(rows, key=lambda r: r["ms"], reverse=True):
+        print(f"    {row['ms']:8.1f} ms  {row['file']}")
+    print(f"    {sum(row['ms'] for row in rows):8.1f} ms  total of fragments\n")
+    warnings = fragment_warnings(rows)
+    for warning in warnings:
+        print(f"    ! {warning}")
+    if warnings:
+        print("")
+    thin_separator()
+    legacy = [f for f in LEGACY_SHELL_FRAGMENTS if os.path.exists(f)]
+    if legacy and input("Consolidate this tool's fragments into one file? [y/N]: ").strip().lower() == "y":
+        for change in consolidate_shell_fragments():
+            print(f"    {change}")
+        after = time_login_shell()
+        if after is not None:
+            print(f"\n    Login shell: {before:.1f} ms before, {after:.1f} ms after ({after - before:+.1f} ms)\n")
+    input("Press Enter to continue...")
+
+def boot_performance_menu():
+    while True:
+        os.system('clear')
+        print_title("Boot Performance")
+        report = analyze_boot()
+        if report is None:
+            print("systemd-analyze is unavailable or the boot has not finished yet.\n")
+            input("Press Enter to continue...")
+            return
+        total = f"{report['total']:.1f}s" if report["total"] is not None else "unknown"
+        userspace = f"{report['userspace']:.1f}s" if report["userspace"] is not None else "unknown"
+        print(f"    Last boot: {total} total, {userspace} in userspace\n")
+        print("    Slowest units:")
+        for unit, seconds in report["blame"][:8]:
+            print(f"    {seconds:8.2f}s  {unit}")
+        print("\n    Units from this tool:")
+        tweaks = load_state("boot-tweaks", {})
+        units = [row["unit"] for row in report["attributed"] if row["unit"] in BOOT_MANAGED_UNITS]
+        units += [unit for unit in tweaks if unit not in units]
+        timings = {row["unit"]: row for row in report["attributed"]}
+        for row in report["attributed"]:
+            if row["unit"] not in BOOT_MANAGED_UNITS:
+                print(f"           {row['seconds']:8.2f}s  {row['unit']} ({row['source']})")
+        for i, unit in enumerate(units, 1):
+            row = timings.get(unit)
+            timing = f"{row['seconds']:8.2f}s" if row else "     n/a "
+            critical = ", on critical chain" if row and row["critical"] else ""
+            change = f" [{tweaks[unit]['mode']}]" if unit in tweaks else ""
+            print(f"        {i}. {timing}  {unit} ({BOOT_MANAGED_UNITS[unit]['enabled_by']}{critical}){change}")
+        if not units:
+            print("        None of the services this tool enables are started at boot.")
+        print("")
+        thin_separator()
+        print(f"Selection; Unit 1-{len(units)} To Change, Back To Main = B: ", end="")
+        choice = input().strip().upper()
+        if choice.isdigit() and 1 <= int(choice) <= len(units):
+            unit = units[int(choice) - 1]
+            if unit in tweaks:
+                if revert_boot_tweak(unit):
+                    print(f"\n{unit} starts at boot again.\n")
+            else:
+                sockets = BOOT_MANAGED_UNITS[unit]["sockets"]
+                if sockets:
+                    print(f"\n    S. Start on demand through {', '.join(sockets)}")
+                print(f"    D. Delay start until {BOOT_DELAY_SECONDS}s after boot, after the desktop")
+                if unit == "opensnitch.service":
+                    print("    NOTE: delaying the firewall leaves connections unfiltered until it starts")
+                if unit == "libvirtd.service":
+                    print("    NOTE: VMs set to autostart only start once libvirt is first used")
+                mode = input("\nChange: ").strip().upper()
+                if mode == "S" and sockets:
+                    done = switch_to_socket_activation(unit)
+                elif mode == "D":
+                    done = delay_unit_start(unit)
+                else:
+                    done = None
+                if done:
+                    print(f"\n{unit} updated; takes effect from the next boot. Select it again to revert.\n")
+                elif done is False:
+                    print("\nOperation failed.\n")
+            input("Press Enter to continue...")
+        elif choice == "B":
+            break
+        else:
+            print("Invalid choice. Press Enter to try again...")
+            input()
+
+def logging_menu():
+    while True:
+        os.system('clear')
+        print_title("Log Volume")
+        usage = record_journal_usage()
+        if usage is None:
+            print("    Journal size: unavailable")
+        else:
+            rate = f"{format_size(usage[1])}/s since last check" if usage[1] is not None else "rate shown from next visit"
+            print(f"    Journal size: {format_size(usage[0])} ({rate})")
+        journald = read_journald_settings()
+        limits = ", ".join(f"{key}={value}" for key, value in journald.items()) or "distribution defaults"
+        print(f"    Journal limits: {limits}")
+        filters = get_log_filters()
+        print(f"    Filtered programs: {', '.join(filters) or 'none'}\n")
+        print("    1. Filter out a noisy program (rsyslog)\n\n"
+              "    2. Stop filtering a program\n\n"
+              "    3. Set journal size and rate limits\n\n"
+              "    4. Revert journal limits to defaults\n\n"
+              "    5. Measure log write rate (60 seconds)\n\n")
+        thin_separator()
+        print("Selection; Menu Options 1-5, Back To Main = B: ", end="")
+        choice = input().strip().upper()
+        if choice in ("1", "2"):
+            program = input("Program name (as shown in syslog): ").strip()
+            if program:
+                done = add_log_filters([program]) if choice == "1" else remove_log_filters([program])
+                print("\nLog filters updated.\n" if done else "\nOperation failed.\n")
+            input("Press Enter to continue...")
+        elif choice == "3":
+            max_use = input(f"Maximum journal size (default {JOURNALD_DEFAULTS['SystemMaxUse']}): ").strip()
+            burst = input(f"Messages per service per 30s before rate limiting (default {JOURNALD_DEFAULTS['RateLimitBurst']}): ").strip()
+            volatile = input("Keep the journal in RAM only, lost on reboot (reduces SSD writes)? [y/N]: ").strip().lower() == "y"
+            if burst and not burst.isdigit():
+                print("\nInvalid input. Must be a number.\n")
+            elif set_journald_limits(max_use or JOURNALD_DEFAULTS["SystemMaxUse"],
+                                     burst or JOURNALD_DEFAULTS["RateLimitBurst"], volatile):
+                print("\nJournal limits applied.\n")
+            else:
+                print("\nOperation failed.\n")
+            input("Press Enter to continue...")
+        elif choice == "4":
+            if revert_journald_limits():
+                print("\nJournal limits reverted.\n")
+            input("Press Enter to continue...")
+        elif choice == "5":
+            print("\nMeasuring for 60 seconds...")
+            rate = measure_log_rate()
+            if rate is None:
+                print("\nCould not measure (journal unavailable or rotated during the measurement).\n")
+            else:
+                print(f"\nJournal is growing by {format_size(rate)}/s ({format_size(rate * 86400)} per day).\n")
+            input("Press Enter to continue...")
+        elif choice == "B":
+            break
+        else:
+            print("Invalid choice. Press Enter to try again...")
+            input()
+
 def user_folder_menu():
     while True:
         os.system('clear')
@@ -449,7 +1265,7 @@ def user_folder_menu():
         for i, key in enumerate(folder_keys, 1):
             print(f"    {i}. {key.replace('XDG_', '').replace('_DIR', '').title()} ({user_dirs[key]})\n")
         thin_separator()
-        print(f"Selection; Menu Options 1-{len(folder_keys)}, Set To Defaults = R, Back To Main = B: ", end="")
+        print(f"Selection; Menu Options 1-{len(folder_keys)}, Move Folder Data = M, Set To Defaults = R, Back To Main = B: ", end="")
         choice = input().strip().upper()
         if choice.isdigit() and 1 <= int(choice) <= len(folder_keys):
             selected_key = folder_keys[int(choice) - 1]
@@ -471,6 +1287,17 @@ def user_folder_menu():
             else:
                 print("\nNo changes made.\n")
             input("Press Enter to continue...")
+        elif choice == "M":
+            number = input(f"Folder to move (1-{len(folder_keys)}): ").strip()
+            if number.isdigit() and 1 <= int(number) <= len(folder_keys):
+                selected_key = folder_keys[int(number) - 1]
+                os.system('clear')
+                print_title(f"Move {selected_key.replace('XDG_', '').replace('_DIR', '').title()}")
+                print(f"Current: {user_dirs[selected_key]}\n")
+                new_path = input("Enter new path (contents are moved there), or Enter to cancel: ").strip()
+                if new_path and not relocate_user_dir(selected_key, new_path):
+                    print("\nOperation failed.\n")
+                input("Press Enter to continue...")
         elif choice == "R":
             os.system('clear')
             print_title("Reset to Default Folder Configurations")
@@ -4,54 +4,333 @@
 # Imports
 import subprocess
 import os
-from typing import Dict, Tuple, Optional
+from typing import Dict, List, Tuple, Optional
 import tempfile
 import shutil
+import pwd
+import json
+import time
+import socket
+import glob
+import atexit
+import fcntl
+import hashlib
+import concurrent.futures
+import fnmatch
+import zipfile
+import collections
+import statistics
+import random
+import mmap
+import struct
+import stat
+import csv
+import io
+import base64
+import urllib.parse
+import http.client
+import urllib.request
+from xml.sax.saxutils import escape, quoteattr
 
 # Get the original user when run with sudo
 SUDO_USER = os.getenv("SUDO_USER")
 HOME_DIR = os.path.expanduser(f"~{SUDO_USER}") if SUDO_USER else os.path.expanduser("~")
 
+# Probe watchdog
+PROBE_TIMEOUT = 3  # Seconds allowed for a status probe (menus)
+ACTION_TIMEOUT = 15  # Seconds allowed for a settings write
+_UNAVAILABLE: Dict[str, str] = {}  # Session cache of failed preconditions
+
+def get_target_user() -> str:
+    """Return the user the tweaks apply to (the sudo caller)"""
+    return os.getenv("SUDO_USER") or pwd.getpwuid(os.getuid()).pw_name
+
+def probe_unavailable(key: str) -> Optional[str]:
+    """Return the cached reason a probe is unavailable, or None"""
+    return _UNAVAILABLE.get(key)
+
+def mark_unavailable(key: str, reason: str) -> str:
+    """Cache an unavailable verdict for the rest of the session"""
+    _UNAVAILABLE[key] = reason
+    return reason
+
+def require_binary(name: str) -> Optional[str]:
+    """Return the binary path, or None (cached) when it is not on PATH"""
+    key = f"bin:{name}"
+    if key in _UNAVAILABLE:
+        return None
+    path = shutil.which(name)
+    if path is None:
+        mark_unavailable(key, f"{name} not found on PATH")
+    return path
+
+def session_bus_address(user: Optional[str] = None) -> Optional[str]:
+    """Return the user's D-Bus session address, or None when no bus socket exists"""
+    user = user or get_target_user()
+    key = f"bus:{user}"
+    if key in _UNAVAILABLE:
+        return None
+    try:
+        uid = pwd.getpwnam(user).pw_uid
+    except KeyError:
+        mark_unavailable(key, f"Unknown user: {user}")
+        return None
+    socket_path = f"/run/user/{uid}/bus"
+    if not os.path.exists(socket_path):
+        mark_unavailable(key, f"No D-Bus session for {user} ({socket_path} missing, not logged in?)")
+        return None
+    return f"unix:path={socket_path}"
+
+def run_probe(key: str, cmd: list, timeout: float = PROBE_TIMEOUT) -> Optional[str]:
+    """Run a read-only probe under a deadline; failures are cached for the session"""
+    if key in _UNAVAILABLE:
+        return None
+    try:
+        result = subprocess.run(cmd, capture_output=True, text=True, timeout=timeout)
+    except subprocess.TimeoutExpired:
+        mark_unavailable(key, f"{cmd[0]} timed out after {timeout}s")
+        return None
+    except OSError as e:
+        mark_unavailable(key, f"{cmd[0]} failed to start: {e}")
+        return None
+    if result.returncode != 0:
+        # Non-zero exit is a per-call failure, not a missing precondition
+        return None
+    return result.stdout.rstrip("\n")
+
+def gsettings_command(user: str, bus_addr: str, args: list) -> list:
+    """Build a gsettings command line that runs against the user's session bus"""
+    cmd = ["env", f"DBUS_SESSION_BUS_ADDRESS={bus_addr}", "gsettings"] + args
+    if os.getuid() == pwd.getpwnam(user).pw_uid:
+        return cmd
+    return ["sudo", "-u", user] + cmd
+
+def gsettings_get_many(queries: List[Tuple[str, str]], user: Optional[str] = None) -> List[Optional[str]]:
+    """Read several gsettings keys with a single process spawn (None per unreadable key)"""
+    user = user or get_target_user()
+    bus_addr = session_bus_address(user)
+    if bus_addr is None or require_binary("gsettings") is None:
+        return [None] * len(queries)
+    # One shell runs every get; a failed get prints an empty line to keep output aligned
+    script = 'while [ $# -gt 1 ]; do gsettings get "$1" "$2" 2>/dev/null || echo; shift 2; done'
+    args = [arg for query in queries for arg in query]
+    cmd = gsettings_command(user, bus_addr, [])[:-1] + ["sh", "-c", script, "sh"] + args
+    output = run_probe(f"gsettings:{user}", cmd)
+    if output is None:
+        return [None] * len(queries)
+    lines = output.split("\n")
+    lines += [""] * (len(queries) - len(lines))
+    return [line.strip() or None for line in lines[:len(queries)]]
+
+def gsettings_get(schema: str, key: str, user: Optional[str] = None) -> Optional[str]:
+    """Read a gsettings key, returning None if the session or tool is unavailable"""
+    return gsettings_get_many([(schema, key)], user)[0]
+
+def gsettings_set(schema: str, key: str, value: str, user: Optional[str] = None) -> None:
+    """Write a gsettings key; raises RuntimeError when the session is unavailable"""
+    gsettings_set_many([(schema, key, value)], user)
+
+def gsettings_offline_command(user: str, args: list) -> list:
+    """Build a gsettings command line for a user with no session, via a private bus and dconf-service"""
+    cmd = ["env", f"HOME={pwd.getpwnam(user).pw_dir}", "dbus-run-session", "--", "gsettings"] + args
+    if os.getuid() == pwd.getpwnam(user).pw_uid:
+        return cmd
+    return ["sudo", "-u", user] + cmd
+
+def gsettings_set_many(settings: List[Tuple[str, str, str]], user: Optional[str] = None,
+                       offline: bool = False) -> None:
+    """Write several gsettings keys with one spawn; offline=True writes the dconf database of a logged-out user"""
+    user = user or get_target_user()
+    bus_addr = session_bus_address(user)
+    if require_binary("gsettings") is None or (bus_addr is None and not offline):
+        raise RuntimeError(probe_unavailable(f"bus:{user}") or probe_unavailable("bin:gsettings"))
+    script = 'while [ $# -gt 2 ]; do gsettings set "$1" "$2" "$3" || exit 1; shift 3; done'
+    args = [arg for setting in settings for arg in setting]
+    if bus_addr is not None:
+        cmd = gsettings_command(user, bus_addr, [])[:-1]
+    else:
+        cmd = gsettings_offline_command(user, [])[:-1]
+    subprocess.run(cmd + ["sh", "-c", script, "sh"] + args, check=True, timeout=ACTION_TIMEOUT)
+
+# File helpers
+def write_config_file(path: str, content: str, mode: int = 0o644) -> None:
+    """Atomically write a generated config file (temp file + rename in the same directory)"""
+    directory = os.path.dirname(path) or "."
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".tweakinstall-")
+    try:
+        with os.fdopen(fd, "w") as f:
+            f.write(content)
+        os.chmod(tmp_path, mode)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+def remove_file(path: str) -> bool:
+    """Remove a file if present, returning True when something was removed"""
+    try:
+        os.remove(path)
+        return True
+    except FileNotFoundError:
+        return False
+
+STATE_DIR = "/var/lib/ubuntu25-tweakinstall"  # Saved original values and applied-profile records
+SYSTEMD_UNIT_DIR = "/etc/systemd/system"
+
+def read_text(path: str) -> Optional[str]:
+    """Read a small text file (sysfs/procfs attribute), returning None if unreadable"""
+    try:
+        with open(path, "r") as f:
+            return f.read().strip()
+    except OSError:
+        return None
+
+def state_dir_for(root: str = "/") -> Optional[str]:
+    """Return the state directory inside a fake root, or None (STATE_DIR) for the real system"""
+    if os.path.abspath(root) == "/":
+        return None
+    return os.path.join(root, STATE_DIR.lstrip("/"))
+
+def load_state(name: str, default=None, state_dir: Optional[str] = None):
+    """Load a JSON state record saved by a previous run"""
+    try:
+        with open(os.path.join(state_dir or STATE_DIR, f"{name}.json"), "r") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return default
+
+def save_state(name: str, data, state_dir: Optional[str] = None) -> None:
+    """Save a JSON state record (original values, applied profiles)"""
+    write_config_file(os.path.join(state_dir or STATE_DIR, f"{name}.json"), json.dumps(data, indent=2) + "\n", mode=0o600)
+
+def clear_state(name: str, state_dir: Optional[str] = None) -> None:
+    """Remove a JSON state record"""
+    remove_file(os.path.join(state_dir or STATE_DIR, f"{name}.json"))
+
+def install_systemd_unit(name: str, content: str, enable: bool = True) -> None:
+    """Write a generated systemd unit, reload systemd and optionally enable it"""
+    write_config_file(os.path.join(SYSTEMD_UNIT_DIR, name), content)
+    subprocess.run(["sudo", "systemctl", "daemon-reload"], check=True)
+    if enable:
+        subprocess.run(["sudo", "systemctl", "enable", name], check=True)
+
+def remove_systemd_unit(name: str) -> None:
+    """Disable and delete a generated systemd unit"""
+    subprocess.run(["sudo", "systemctl", "disable", "--now", name],
+                   stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    remove_file(os.path.join(SYSTEMD_UNIT_DIR, name))
+    subprocess.run(["sudo", "systemctl", "daemon-reload"], check=True)
+
+def chown_to_user(path: str, user: str) -> None:
+    """Hand a path created by root back to the target user"""
+    try:
+        info = pwd.getpwnam(user)
+        if os.getuid() == 0 and info.pw_uid != 0:
+            os.lchown(path, info.pw_uid, info.pw_gid)
+    except (KeyError, OSError):
+        pass
+
+FICLONE = 0x40049409  # ioctl: share extents with another file (btrfs, XFS reflink, bcachefs)
+
+def copy_file_data(fsrc, fdst, size: int) -> None:
+    """Copy file contents in-kernel with copy_file_range, falling back to a buffered copy"""
+    try:
+        remaining = size
+        while remaining > 0:
+            copied = os.copy_file_range(fsrc.fileno(), fdst.fileno(), min(remaining, 1 << 30))
+            if copied == 0:
+                break
+            remaining -= copied
+    except OSError:
+        fsrc.seek(0)
+        fdst.seek(0)
+        fdst.truncate()
+        shutil.copyfileobj(fsrc, fdst, 1 << 20)
+
+def clone_file(src: str, dst: str, hardlink_fallback: bool = False) -> str:
+    """Copy a file as a reflink when the filesystem allows, else hardlink (if allowed) or copy_file_range
+
+    Returns the method used: 'reflink', 'hardlink' or 'copy'."""
+    with open(src, "rb") as fsrc:
+        st = os.fstat(fsrc.fileno())
+        with open(dst, "wb") as fdst:
+            try:
+                fcntl.ioctl(fdst.fileno(), FICLONE, fsrc.fileno())
+                method = "reflink"
+            except OSError:
+                method = "copy"
+                if not hardlink_fallback:
+                    copy_file_data(fsrc, fdst, st.st_size)
+        if method == "copy" and hardlink_fallback:
+            os.remove(dst)
+            try:
+                os.link(src, dst)
+                return "hardlink"
+            except OSError:
+                with open(dst, "wb") as fdst:
+                    copy_file_data(fsrc, fdst, st.st_size)
+    os.chmod(dst, st.st_mode & 0o7777)
+    os.utime(dst, ns=(st.st_atime_ns, st.st_mtime_ns))
+    return method
+
 # Folder management
 USER_DIRS_FILE = os.path.join(HOME_DIR, ".config/user-dirs.dirs")
 
-DEFAULT_DIRS = {
-    "XDG_DESKTOP_DIR": f"{HOME_DIR}/Desktop",
-    "XDG_DOWNLOAD_DIR": f"{HOME_DIR}/Downloads",
-    "XDG_TEMPLATES_DIR": f"{HOME_DIR}/Templates",
-    "XDG_PUBLICSHARE_DIR": f"{HOME_DIR}/Public",
-    "XDG_DOCUMENTS_DIR": f"{HOME_DIR}/Documents",
-    "XDG_MUSIC_DIR": f"{HOME_DIR}/Music",
-    "XDG_PICTURES_DIR": f"{HOME_DIR}/Pictures",
-    "XDG_VIDEOS_DIR": f"{HOME_DIR}/Videos"
-}
+def default_user_dirs(home: str) -> Dict[str, str]:
+    """Return the standard XDG folder layout under a home directory"""
+    return {
+        "XDG_DESKTOP_DIR": f"{home}/Desktop",
+        "XDG_DOWNLOAD_DIR": f"{home}/Downloads",
+        "XDG_TEMPLATES_DIR": f"{home}/Templates",
+        "XDG_PUBLICSHARE_DIR": f"{home}/Public",
+        "XDG_DOCUMENTS_DIR": f"{home}/Documents",
+        "XDG_MUSIC_DIR": f"{home}/Music",
+        "XDG_PICTURES_DIR": f"{home}/Pictures",
+        "XDG_VIDEOS_DIR": f"{home}/Videos"
+    }
+
+DEFAULT_DIRS = default_user_dirs(HOME_DIR)
 
-def read_user_dirs() -> Tuple[str, Dict[str, str]]:
+def user_dirs_file(user: Optional[str] = None) -> str:
+    """Return the user-dirs.dirs path of a user (the invoking user by default)"""
+    if user is None:
+        return USER_DIRS_FILE
+    return os.path.join(pwd.getpwnam(user).pw_dir, ".config/user-dirs.dirs")
+
+def read_user_dirs(user: Optional[str] = None) -> Tuple[str, Dict[str, str]]:
     """Read user directory configurations"""
-    if not os.path.exists(USER_DIRS_FILE):
-        return "No custom folder configurations found. Using defaults.", DEFAULT_DIRS.copy()
+    path = user_dirs_file(user)
+    if not os.path.exists(path):
+        defaults = DEFAULT_DIRS if user is None else default_user_dirs(pwd.getpwnam(user).pw_dir)
+        return "No custom folder configurations found. Using defaults.", defaults.copy()
     
     user_dirs = {}
-    with open(USER_DIRS_FILE, "r") as file:
+    with open(path, "r") as file:
         for line in file:
             if line.startswith("XDG_") and "=" in line:
                 key, value = line.strip().split("=")
                 user_dirs[key] = value.strip('"')
     return "Custom folder configurations loaded.", user_dirs
 
-def save_user_dirs(updated_dirs: Dict[str, str]) -> str:
+def save_user_dirs(updated_dirs: Dict[str, str], user: Optional[str] = None) -> str:
     """Save updated directory configurations"""
+    path = user_dirs_file(user)
     lines = []
-    if os.path.exists(USER_DIRS_FILE):
-        with open(USER_DIRS_FILE, "r") as file:
+    if os.path.exists(path):
+        with open(path, "r") as file:
             lines = file.readlines()
     
-    with open(USER_DIRS_FILE, "w") as file:
-        for line in lines:
-            if not any(line.startswith(key) for key in updated_dirs):
-                file.write(line)
-        for key, value in updated_dirs.items():
-            file.write(f'{key}="{value}"\n')
+    content = "".join(line for line in lines if not any(line.startswith(key) for key in updated_dirs))
+    for key, value in updated_dirs.items():
+        content += f'{key}="{value}"\n'
+    owner = user or get_target_user()
+    config_dir_exists = os.path.isdir(os.path.dirname(path))
+    write_config_file(path, content)
+    if not config_dir_exists:
+        chown_to_user(os.path.dirname(path), owner)
+    chown_to_user(path, owner)
     return "User folder configurations saved."
 
 def apply_default_dirs() -> str:
@@ -61,11 +340,370 @@ def apply_default_dirs() -> str:
             file.write(f'{key}="{value}"\n')
     return "Default folder configurations applied."
 
+# Folder relocation
+RELOCATE_PART_SUFFIX = ".tweakinstall-part"  # In-flight copies; replaced only after verification
+RELOCATE_WORKERS = min(8, os.cpu_count() or 1)
+RELOCATE_MAX_PENDING = RELOCATE_WORKERS * 4  # Bounds queued copies so huge trees stream
+
+def expand_user_dir(value: str, home: str = HOME_DIR) -> str:
+    """Expand $HOME or ~ in a user-dirs.dirs value or typed path to an absolute path"""
+    for prefix in ("${HOME}", "$HOME", "~"):
+        if value == prefix or value.startswith(prefix + "/"):
+            value = home + value[len(prefix):]
+            break
+    return os.path.abspath(value)
+
+def iter_tree(top: str):
+    """Yield (entry, relative path) for everything under top, without building the tree in memory"""
+    stack = [""]
+    while stack:
+        rel_dir = stack.pop()
+        with os.scandir(os.path.join(top, rel_dir)) as entries:
+            for entry in entries:
+                rel = os.path.join(rel_dir, entry.name)
+                yield entry, rel
+                if entry.is_dir(follow_symlinks=False):
+                    stack.append(rel)
+
+def file_digest(path: str) -> str:
+    """Return the BLAKE2b digest of a file, read in 1 MiB chunks"""
+    digest = hashlib.blake2b()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def relocate_file(src: str, dst: str, user: str) -> Tuple[str, int]:
+    """Copy one file unless an identical copy is already in place; returns (method, bytes)"""
+    st = os.stat(src)
+    try:
+        done = os.stat(dst)
+        if done.st_size == st.st_size and done.st_mtime_ns == st.st_mtime_ns:
+            return "skipped", st.st_size
+    except FileNotFoundError:
+        pass
+    part = dst + RELOCATE_PART_SUFFIX
+    method = clone_file(src, part)
+    # A reflink shares the source extents, so only real copies need reading back
+    if method == "copy" and file_digest(src) != file_digest(part):
+        os.remove(part)
+        raise OSError(f"Checksum mismatch after copying {src}")
+    os.replace(part, dst)
+    chown_to_user(dst, user)
+    return method, st.st_size
+
+def same_filesystem(src: str, dest: str) -> bool:
+    """Check whether dest (or its nearest existing parent) is on the same filesystem as src"""
+    probe = dest
+    while not os.path.exists(probe):
+        probe = os.path.dirname(probe)
+    return os.stat(src).st_dev == os.stat(probe).st_dev
+
+def same_entry(path: str, target: str) -> bool:
+    """Check if target already holds what path holds: same symlink target, or a file of equal size and mtime"""
+    st, done = os.lstat(path), os.lstat(target)
+    if os.path.islink(path) or os.path.islink(target):
+        return os.path.islink(path) and os.path.islink(target) and os.readlink(path) == os.readlink(target)
+    return (os.path.isfile(path) and os.path.isfile(target)
+            and done.st_size == st.st_size and done.st_mtime_ns == st.st_mtime_ns)
+
+def relocation_conflicts(src: str, dest: str) -> List[str]:
+    """List paths under dest that merging src would overwrite; identical files from an earlier run do not count"""
+    conflicts = []
+    if not os.path.isdir(dest):
+        return conflicts
+    for entry, rel in iter_tree(src):
+        target = os.path.join(dest, rel)
+        if not os.path.lexists(target):
+            continue
+        if entry.is_dir(follow_symlinks=False):
+            if os.path.islink(target) or not os.path.isdir(target):
+                conflicts.append(target)
+        elif not same_entry(entry.path, target):
+            conflicts.append(target)
+    return conflicts
+
+def move_tree_contents(src: str, dest: str) -> None:
+    """Merge src into an existing dest on the same filesystem with renames, never overwriting different data"""
+    for name in os.listdir(src):
+        path, target = os.path.join(src, name), os.path.join(dest, name)
+        if os.path.isdir(target) and not os.path.islink(target) and os.path.isdir(path) and not os.path.islink(path):
+            move_tree_contents(path, target)
+        elif os.path.lexists(target) and not same_entry(path, target):
+            raise FileExistsError(f"{target} already exists")
+        else:
+            os.replace(path, target)
+    os.rmdir(src)
+
+def remove_copied_tree(src: str) -> List[str]:
+    """Remove a copied tree bottom-up, keeping the special files the copy skipped; returns those left behind"""
+    kept = []
+    for root, dirs, files in os.walk(src, topdown=False):
+        for name in files + [d for d in dirs if os.path.islink(os.path.join(root, d))]:
+            path = os.path.join(root, name)
+            mode = os.lstat(path).st_mode
+            if stat.S_ISREG(mode) or stat.S_ISLNK(mode):
+                os.remove(path)
+            else:
+                kept.append(path)
+        if not any(k.startswith(root + os.sep) for k in kept):
+            os.rmdir(root)
+    return kept
+
+def copy_tree_parallel(src: str, dest: str, user: str) -> Dict[str, int]:
+    """Copy src into dest with a bounded worker pool, printing progress as it goes"""
+    total_files = total_bytes = 0
+    for entry, _ in iter_tree(src):
+        if entry.is_file(follow_symlinks=False):
+            total_files += 1
+            total_bytes += entry.stat(follow_symlinks=False).st_size
+    counts = {"reflink": 0, "copy": 0, "skipped": 0, "special": 0, "files": 0, "bytes": 0}
+    start = time.monotonic()
+    shown = [0.0]
+
+    def collect(future) -> None:
+        method, size = future.result()
+        counts[method] += 1
+        counts["files"] += 1
+        counts["bytes"] += size
+        now = time.monotonic()
+        if now - shown[0] < 0.5 and counts["files"] != total_files:
+            return
+        shown[0] = now
+        elapsed = max(time.monotonic() - start, 0.001)
+        percent = counts["bytes"] * 100 // total_bytes if total_bytes else 100
+        print(f"\r    {counts['files']}/{total_files} files, {format_size(counts['bytes'])} of "
+              f"{format_size(total_bytes)} ({percent}%), {format_size(counts['bytes'] / elapsed)}/s   ",
+              end="", flush=True)
+
+    os.makedirs(dest, exist_ok=True)
+    chown_to_user(dest, user)
+    pending = set()
+    with concurrent.futures.ThreadPoolExecutor(max_workers=RELOCATE_WORKERS) as pool:
+        for entry, rel in iter_tree(src):
+            target = os.path.join(dest, rel)
+            if entry.is_symlink():
+                if not os.path.lexists(target):
+                    os.symlink(os.readlink(entry.path), target)
+                    chown_to_user(target, user)
+            elif entry.is_dir():
+                os.makedirs(target, exist_ok=True)
+                chown_to_user(target, user)
+            elif entry.is_file():
+                if len(pending) >= RELOCATE_MAX_PENDING:
+                    done, pending = concurrent.futures.wait(pending, return_when=concurrent.futures.FIRST_COMPLETED)
+                    for future in done:
+                        collect(future)
+                pending.add(pool.submit(relocate_file, entry.path, target, user))
+            else:
+                counts["special"] += 1  # Sockets, FIFOs and device nodes stay in the source
+        for future in concurrent.futures.as_completed(pending):
+            collect(future)
+    # Directory mtimes last, once nothing more is written into them
+    for entry, rel in iter_tree(src):
+        if entry.is_dir(follow_symlinks=False):
+            st = entry.stat(follow_symlinks=False)
+            os.utime(os.path.join(dest, rel), ns=(st.st_atime_ns, st.st_mtime_ns))
+    print("")
+    return counts
+
+def relocation_problem(key: str, src: str, dest: str, user_dirs: Dict[str, str],
+                       home: str = HOME_DIR) -> Optional[str]:
+    """Return why a folder must not be relocated from src to dest, or None when it is safe"""
+    home = os.path.abspath(home)
+    if src == dest:
+        return "Folder is already at that path."
+    if src == home:
+        return "This folder is disabled (set to the home directory itself); set a path for it instead of moving it."
+    if not src.startswith(home + os.sep):
+        return f"{src} is outside {home}; only folders inside the home directory are moved."
+    if dest == home:
+        return "Cannot move a folder onto the home directory itself."
+    if dest.startswith(src + os.sep) or src.startswith(dest + os.sep):
+        return "Cannot move a folder into itself or its parent."
+    for other_key, value in user_dirs.items():
+        other = expand_user_dir(value, home)
+        if other_key != key and other != home and (other == src or other.startswith(src + os.sep)):
+            return f"{src} also holds {other_key} ({other}); move that folder first."
+    return None
+
+def relocate_user_dir(key: str, new_path: str) -> bool:
+    """Move a user folder's contents to a new path, then point user-dirs.dirs at it"""
+    _, user_dirs = read_user_dirs()
+    src = expand_user_dir(user_dirs.get(key, DEFAULT_DIRS.get(key, "")))
+    dest = expand_user_dir(new_path)
+    problem = relocation_problem(key, src, dest, {**DEFAULT_DIRS, **user_dirs})
+    if problem:
+        print(problem)
+        return False
+    user = get_target_user()
+    start = time.monotonic()
+    try:
+        if os.path.isdir(src):
+            conflicts = relocation_conflicts(src, dest)
+            if conflicts:
+                print(f"{len(conflicts)} path(s) in {dest} differ from the folder being moved:")
+                for path in conflicts[:10]:
+                    print(f"    {path}")
+                print("Nothing was moved; rename or remove those first.")
+                return False
+            if same_filesystem(src, dest):
+                print(f"Moving {src} -> {dest} (same filesystem, rename)")
+                if os.path.isdir(dest):
+                    move_tree_contents(src, dest)
+                else:
+                    os.makedirs(os.path.dirname(dest), exist_ok=True)
+                    os.rename(src, dest)
+            else:
+                print(f"Copying {src} -> {dest} with {RELOCATE_WORKERS} workers")
+                counts = copy_tree_parallel(src, dest, user)
+                print(f"    {counts['reflink']} reflinked, {counts['copy']} copied and verified, "
+                      f"{counts['skipped']} already in place")
+                kept = remove_copied_tree(src)
+                if kept:
+                    print(f"    {len(kept)} socket/FIFO/device file(s) cannot be copied and were left in {src}")
+        else:
+            os.makedirs(dest, exist_ok=True)
+            chown_to_user(dest, user)
+    except (OSError, concurrent.futures.CancelledError) as e:
+        print(f"\nRelocation stopped: {e}")
+        print("Nothing was removed from the source; run the relocation again to resume.")
+        return False
+    save_user_dirs({key: dest})
+    print(f"Relocated in {time.monotonic() - start:.1f}s.")
+    return True
+
+# Package manager locking
+DPKG_LOCK_FILES = [
+    "/var/lib/dpkg/lock-frontend",
+    "/var/lib/dpkg/lock",
+    "/var/lib/apt/lists/lock",
+    "/var/cache/apt/archives/lock",
+]
+DPKG_LOCK_MAX_WAIT = 300  # Seconds to wait for another package manager before handing over to apt
+DPKG_LOCK_TIMEOUT = 120  # Passed to apt as DPkg::Lock::Timeout to cover races after the wait
+DPKG_LOCK_MAX_BACKOFF = 15
+APT_BACKGROUND_TIMERS = ["apt-daily.timer", "apt-daily-upgrade.timer"]
+_PAUSED_TIMERS: List[str] = []  # Timers stopped for this session, restarted at exit
+
+def lock_holder_pid(path: str) -> Optional[int]:
+    """Return the PID holding a POSIX lock on a file, -1 if held by an unknown owner, None if free"""
+    try:
+        fd = os.open(path, os.O_RDONLY)
+    except OSError:
+        return None
+    try:
+        # struct flock: l_type, l_whence, l_start, l_len, l_pid
+        query = struct.pack("hhqqi", fcntl.F_WRLCK, os.SEEK_SET, 0, 0, 0)
+        l_type, _, _, _, pid = struct.unpack("hhqqi", fcntl.fcntl(fd, fcntl.F_GETLK, query))
+    except OSError:
+        return None
+    finally:
+        os.close(fd)
+    if l_type == fcntl.F_UNLCK:
+        return None
+    # Open file description locks report no PID
+    return pid if pid > 0 else -1
+
+def processes_with_open_files(paths: List[str], proc: str = "/proc") -> Dict[int, str]:
+    """Scan /proc/*/fd for processes that have any of the paths open; returns {pid: path}"""
+    wanted = set(paths)
+    holders = {}
+    for fd_dir in glob.glob(os.path.join(proc, "[0-9]*", "fd")):
+        try:
+            for fd in os.listdir(fd_dir):
+                target = os.readlink(os.path.join(fd_dir, fd))
+                if target in wanted:
+                    holders[int(fd_dir.split("/")[-2])] = target
+                    break
+        except OSError:
+            continue
+    return holders
+
+def describe_process(pid: int) -> str:
+    """Return 'name (pid N): command line' for a process"""
+    name = read_text(f"/proc/{pid}/comm") or "unknown"
+    cmdline = (read_text(f"/proc/{pid}/cmdline") or "").replace("\0", " ").strip()
+    return f"{name} (pid {pid})" + (f": {cmdline[:80]}" if cmdline else "")
+
+def dpkg_lock_holders() -> List[str]:
+    """Describe the processes holding the dpkg/apt locks; [] when they are all free"""
+    pids = set()
+    unknown = False
+    for path in DPKG_LOCK_FILES:
+        pid = lock_holder_pid(path)
+        if pid == -1:
+            unknown = True
+        elif pid is not None:
+            pids.add(pid)
+    if unknown:
+        pids.update(processes_with_open_files(DPKG_LOCK_FILES))
+    return [describe_process(pid) for pid in sorted(pids)]
+
+def wait_for_dpkg_lock(max_wait: float = DPKG_LOCK_MAX_WAIT) -> bool:
+    """Wait with bounded exponential backoff until the dpkg/apt locks are free"""
+    deadline = time.monotonic() + max_wait
+    delay = 1.0
+    reported = None
+    while True:
+        holders = dpkg_lock_holders()
+        if not holders:
+            return True
+        if holders != reported:
+            print("Waiting for the package manager lock, held by:")
+            for holder in holders:
+                print(f"    {holder}")
+            reported = holders
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            print(f"Lock still held after {max_wait}s; apt will wait up to another {DPKG_LOCK_TIMEOUT}s.")
+            return False
+        time.sleep(min(delay, remaining))
+        delay = min(delay * 2, DPKG_LOCK_MAX_BACKOFF)
+
+def apt_run(cmd: List[str], **kwargs) -> subprocess.CompletedProcess:
+    """Run an apt/dpkg command with sudo once the package manager lock is free (subprocess.run semantics)"""
+    wait_for_dpkg_lock()
+    if cmd[0] in ("apt", "apt-get"):
+        cmd = [cmd[0], "-o", f"DPkg::Lock::Timeout={DPKG_LOCK_TIMEOUT}"] + cmd[1:]
+    return subprocess.run(["sudo"] + cmd, **kwargs)
+
+def apt_timers_paused() -> bool:
+    """Check if the background apt timers are paused for this session"""
+    return bool(_PAUSED_TIMERS)
+
+def pause_apt_timers() -> bool:
+    """Stop the apt-daily timers until this program exits, so no background run takes the lock"""
+    active = [timer for timer in APT_BACKGROUND_TIMERS
+              if subprocess.run(["systemctl", "is-active", "--quiet", timer]).returncode == 0]
+    try:
+        if active:
+            subprocess.run(["sudo", "systemctl", "stop"] + active, check=True)
+    except subprocess.CalledProcessError as e:
+        print(f"Failed to pause apt timers: {e}")
+        return False
+    if not _PAUSED_TIMERS:
+        atexit.register(resume_apt_timers)
+    _PAUSED_TIMERS.extend(t for t in active if t not in _PAUSED_TIMERS)
+    return True
+
+def resume_apt_timers() -> bool:
+    """Restart the apt-daily timers paused by pause_apt_timers"""
+    if not _PAUSED_TIMERS:
+        return True
+    try:
+        subprocess.run(["sudo", "systemctl", "start"] + _PAUSED_TIMERS, check=True)
+    except subprocess.CalledProcessError as e:
+        print(f"Failed to resume apt timers: {e}")
+        return False
+    _PAUSED_TIMERS.clear()
+    return True
+
 # System installation functions
 def update_system() -> bool:
     """Update package lists"""
     try:
-        subprocess.run(["sudo", "apt", "update", "-y"], check=True)
+        apt_run(["apt", "update", "-y"], check=True)
         return True
     except subprocess.CalledProcessError as e:
         print(f"Update failed: {e}")
@@ -74,8 +712,8 @@ def update_system() -> bool:
 def install_essential_tools() -> bool:
     """Install basic system tools"""
     try:
-        subprocess.run([
-            "sudo", "apt", "install", "-y",
+        apt_run([
+            "apt", "install", "-y",
             "software-properties-common",
             "vim", "nano", "curl", "wget",
             "git", "htop", "dkms", "build-essential"
@@ -88,7 +726,7 @@ def install_essential_tools() -> bool:
 def upgrade_system() -> bool:
     """Upgrade all packages"""
     try:
-        subprocess.run(["sudo", "apt", "upgrade", "-y", "--fix-missing"], check=True)
+        apt_run(["apt", "upgrade", "-y", "--fix-missing"], check=True)
         return True
     except subprocess.CalledProcessError as e:
         print(f"Upgrade failed: {e}")
@@ -102,22 +740,300 @@ def perform_basic_installation() -> bool:
         upgrade_system()
     ])
 
-def setup_unattended_upgrades() -> bool:
-    """Configure automatic security updates"""
+# Unattended upgrades; the Debian conffile 50unattended-upgrades is left untouched and overridden
+AUTO_UPGRADES_FILE = "/etc/apt/apt.conf.d/20auto-upgrades"
+UNATTENDED_OVERRIDE_FILE = "/etc/apt/apt.conf.d/52tweakinstall-unattended-upgrades"
+UNATTENDED_APT_CONFIG = "/etc/apt/tweakinstall-background.conf"  # Only read by the background apt services
+APT_DAILY_UNITS = {"apt-daily": "download", "apt-daily-upgrade": "upgrade"}
+
+UNATTENDED_DEFAULTS = {
+    "download_limit_kb": 0,  # Acquire::http::Dl-Limit for background downloads, 0 = unlimited
+    "window_start": "02:00",  # Downloads start at a random point inside the window
+    "window_hours": 3,
+    "nice": 19,
+    "io_idle": True,
+    "only_on_ac_power": True,
+    "skip_metered": True,
+    "auto_reboot": False,
+}
+
+def parse_maintenance_window(config: Dict) -> Tuple[int, int, int]:
+    """Return (hour, minute, hours) of the maintenance window, raising ValueError when out of range"""
+    try:
+        hour, minute = (int(part) for part in str(config["window_start"]).split(":"))
+    except ValueError:
+        raise ValueError(f"Window start must be HH:MM, got {config['window_start']!r}")
+    window = int(config["window_hours"])
+    if not (0 <= hour < 24 and 0 <= minute < 60):
+        raise ValueError(f"Window start must be between 00:00 and 23:59, got {config['window_start']!r}")
+    if not 1 <= window <= 23:
+        raise ValueError(f"Window length must be 1-23 hours, got {window}")
+    return hour, minute, window
+
+def unattended_upgrade_files(config: Dict, root: str = "/") -> Dict[str, str]:
+    """Return {path: content} for every file the unattended-upgrades setup writes"""
+    header = "// Generated by Ubuntu25-TweakInstall: unattended-upgrades\n"
+    hour, minute, window = parse_maintenance_window(config)
+    # APT_CONFIG replaces /etc/apt/apt.conf for the background runs, so settings kept there (a proxy) are pulled in
+    include = '#include "/etc/apt/apt.conf";\n' if os.path.isfile(os.path.join(root, "etc/apt/apt.conf")) else ""
+    files = {
+        AUTO_UPGRADES_FILE: header + 'APT::Periodic::Update-Package-Lists "1";\n'
+                                     'APT::Periodic::Unattended-Upgrade "1";\n',
+        UNATTENDED_OVERRIDE_FILE: header
+            + f'Unattended-Upgrade::OnlyOnACPower "{str(config["only_on_ac_power"]).lower()}";\n'
+            + f'Unattended-Upgrade::Skip-Updates-On-Metered-Connections "{str(config["skip_metered"]).lower()}";\n'
+            + f'Unattended-Upgrade::Automatic-Reboot "{str(config["auto_reboot"]).lower()}";\n',
+        # A separate APT_CONFIG file so the cap never slows interactive apt runs
+        UNATTENDED_APT_CONFIG: header + include + f'Acquire::http::Dl-Limit "{int(config["download_limit_kb"])}";\n',
+    }
+    for unit, role in APT_DAILY_UNITS.items():
+        if role == "download":
+            start, delay = f"{hour:02d}:{minute:02d}", f"{window}h"
+        else:
+            # Install once the download window has closed, with a shorter spread
+            start, delay = f"{(hour + window) % 24:02d}:{minute:02d}", "30min"
+        files[os.path.join(SYSTEMD_UNIT_DIR, f"{unit}.timer.d", "90-tweakinstall.conf")] = (
+            "# Generated by Ubuntu25-TweakInstall: maintenance window\n"
+            "[Timer]\n"
+            "OnCalendar=\n"
+            f"OnCalendar=*-*-* {start}\n"
+            f"RandomizedDelaySec={delay}\n")
+        service = ["# Generated by Ubuntu25-TweakInstall: background priority", "[Service]",
+                   f"Environment=APT_CONFIG={UNATTENDED_APT_CONFIG}", f"Nice={int(config['nice'])}"]
+        if config["io_idle"]:
+            service.append("IOSchedulingClass=idle")
+        if config["only_on_ac_power"]:
+            service[1:1] = ["[Unit]", "ConditionACPower=true"]
+        files[os.path.join(SYSTEMD_UNIT_DIR, f"{unit}.service.d", "90-tweakinstall.conf")] = "\n".join(service) + "\n"
+    return files
+
+def setup_unattended_upgrades(config: Optional[Dict] = None) -> bool:
+    """Configure automatic security updates from a config dict, without interactive prompts"""
+    config = {**UNATTENDED_DEFAULTS, **load_state("unattended-upgrades", {}), **(config or {})}
     try:
-        subprocess.run(["sudo", "apt", "install", "-y", "unattended-upgrades"], check=True)
-        subprocess.run(["sudo", "dpkg-reconfigure", "-plow", "unattended-upgrades"], check=True)
+        files = unattended_upgrade_files(config)
+        apt_run(["apt", "install", "-y", "unattended-upgrades"], check=True)
+        # Keep debconf in step so package upgrades do not regenerate 20auto-upgrades differently
+        subprocess.run(["sudo", "debconf-set-selections"], check=True, text=True,
+                       input="unattended-upgrades unattended-upgrades/enable_auto_updates boolean true\n")
+        for path, content in files.items():
+            write_config_file(path, content)
+        subprocess.run(["sudo", "systemctl", "daemon-reload"], check=True)
+        subprocess.run(["sudo", "systemctl", "restart"] + [f"{unit}.timer" for unit in APT_DAILY_UNITS], check=True)
+        save_state("unattended-upgrades", config)
         return True
-    except subprocess.CalledProcessError as e:
+    except (subprocess.CalledProcessError, OSError, ValueError) as e:
         print(f"Unattended upgrades setup failed: {e}")
         return False
 
+# Package sources
+UBUNTU_SOURCES_FILE = "etc/apt/sources.list.d/ubuntu.sources"  # Relative to root so fake trees can be used
+MIRROR_LIST_URL = "http://mirrors.ubuntu.com/mirrors.txt"  # Mirrors near the caller, by GeoIP
+DEFAULT_MIRRORS = ["http://archive.ubuntu.com/ubuntu/"]
+MIRROR_TIMEOUT = 5  # Seconds per request before a mirror is dropped
+MIRROR_LATENCY_SAMPLES = 3
+MIRROR_SAMPLE_BYTES = 512 * 1024  # Ranged read used to estimate throughput
+MIRROR_THROUGHPUT_CANDIDATES = 6  # Lowest-latency mirrors that get a throughput test
+APT_ACQUIRE_FILE = "/etc/apt/apt.conf.d/80tweakinstall-acquire"
+
+# Retries with short timeouts fail over quickly instead of stalling on one slow connection
+APT_ACQUIRE_SETTINGS = {
+    "Acquire::Queue-Mode": "host",
+    "Acquire::http::Pipeline-Depth": "10",
+    "Acquire::Retries": "5",
+    "Acquire::http::Timeout": "15",
+    "Acquire::https::Timeout": "15",
+}
+
+def release_codename(root: str = "/") -> Optional[str]:
+    """Return VERSION_CODENAME from os-release"""
+    for line in (read_text(os.path.join(root, "etc/os-release")) or "").splitlines():
+        if line.startswith("VERSION_CODENAME="):
+            return line.split("=", 1)[1].strip('"')
+    return None
+
+def dpkg_architecture() -> str:
+    """Return the dpkg architecture name of this machine"""
+    output = run_probe("dpkg-arch", ["dpkg", "--print-architecture"])
+    if output:
+        return output.strip()
+    return {"x86_64": "amd64", "aarch64": "arm64"}.get(os.uname().machine, os.uname().machine)
+
+def fetch_mirror_list(url: str = MIRROR_LIST_URL) -> List[str]:
+    """Download the list of nearby mirrors, returning [] when it cannot be fetched"""
+    try:
+        with urllib.request.urlopen(url, timeout=MIRROR_TIMEOUT) as response:
+            lines = response.read(1 << 20).decode(errors="replace").split()
+    except (OSError, ValueError):
+        return []
+    return [line.split("\t")[0] for line in lines if line.startswith(("http://", "https://"))]
+
+def normalise_mirror(url: str) -> str:
+    """Return a mirror URL with exactly one trailing slash"""
+    return url.strip().rstrip("/") + "/"
+
+def timed_range_request(url: str, length: int, timeout: float = MIRROR_TIMEOUT) -> Tuple[float, float, int]:
+    """Fetch the first bytes of a URL; returns (seconds to first byte, total seconds, bytes read)"""
+    request = urllib.request.Request(url, headers={"Range": f"bytes=0-{length - 1}",
+                                                   "User-Agent": "Ubuntu25-TweakInstall"})
+    start = time.perf_counter()
+    with urllib.request.urlopen(request, timeout=timeout) as response:
+        # A server that ignores Range sends the whole file; stop reading at the sample size
+        received = len(response.read(1))
+        first_byte = time.perf_counter() - start
+        while received < length:
+            chunk = response.read(min(65536, length - received))
+            if not chunk:
+                break
+            received += len(chunk)
+    return first_byte, time.perf_counter() - start, received
+
+def measure_mirror_latency(mirror: str, codename: str) -> Dict:
+    """Median time to first byte of the suite's Release file, over fresh connections"""
+    url = f"{mirror}dists/{codename}/Release"
+    samples = []
+    try:
+        for _ in range(MIRROR_LATENCY_SAMPLES):
+            samples.append(timed_range_request(url, 1)[0])
+    except (OSError, ValueError, http.client.HTTPException) as e:
+        return {"mirror": mirror, "latency": None, "throughput": None, "error": str(e)}
+    return {"mirror": mirror, "latency": statistics.median(samples), "throughput": None, "error": None}
+
+def measure_mirror_throughput(result: Dict, codename: str, arch: str) -> None:
+    """Add a throughput estimate (bytes/s) from a ranged read of the main Packages index"""
+    url = f"{result['mirror']}dists/{codename}/main/binary-{arch}/Packages.gz"
+    try:
+        first_byte, total, received = timed_range_request(url, MIRROR_SAMPLE_BYTES)
+        transfer = max(total - first_byte, 1e-6)
+        result["throughput"] = received / transfer
+    except (OSError, ValueError, http.client.HTTPException) as e:
+        result["error"] = str(e)
+
+def rank_mirrors(mirrors: List[str], codename: str, arch: str) -> List[Dict]:
+    """Rank mirrors: latency for all in parallel, then throughput one at a time for the closest"""
+    mirrors = list(dict.fromkeys(normalise_mirror(m) for m in mirrors))
+    with concurrent.futures.ThreadPoolExecutor(max_workers=8) as pool:
+        results = list(pool.map(lambda m: measure_mirror_latency(m, codename), mirrors))
+    reachable = sorted((r for r in results if r["latency"] is not None), key=lambda r: r["latency"])
+    # Sequential so the mirrors do not compete for the same downlink
+    for result in reachable[:MIRROR_THROUGHPUT_CANDIDATES]:
+        measure_mirror_throughput(result, codename, arch)
+    measured = [r for r in reachable if r["throughput"]]
+    measured.sort(key=lambda r: r["throughput"], reverse=True)
+    return measured + [r for r in results if r not in measured]
+
+def parse_deb822(text: str) -> List[Dict[str, str]]:
+    """Parse deb822 stanzas into {field: value} dicts (comments and continuation lines folded)"""
+    stanzas, current, field = [], {}, None
+    for line in text.splitlines():
+        if line.startswith("#"):
+            continue
+        if not line.strip():
+            if current:
+                stanzas.append(current)
+            current, field = {}, None
+        elif line[0] in " \t" and field:
+            current[field] += " " + line.strip()
+        elif ":" in line:
+            field, _, value = line.partition(":")
+            field = field.strip()
+            current[field] = value.strip()
+    if current:
+        stanzas.append(current)
+    return stanzas
+
+def current_archive_mirror(text: str) -> Optional[str]:
+    """Return the archive mirror in ubuntu.sources (the first stanza not limited to -security suites)"""
+    for stanza in parse_deb822(text):
+        suites = stanza.get("Suites", "").split()
+        if stanza.get("URIs") and suites and not all(s.endswith("-security") for s in suites):
+            return normalise_mirror(stanza["URIs"].split()[0])
+    return None
+
+def rewrite_sources_mirror(text: str, old: str, new: str) -> str:
+    """Replace a mirror in the URIs: of archive stanzas only, keeping -security stanzas, comments and layout"""
+    blocks, block = [], []
+    for line in text.splitlines(keepends=True):
+        block.append(line)
+        if not line.strip():
+            blocks.append(block)
+            block = []
+    blocks.append(block)
+    output = []
+    for block in blocks:
+        stanzas = parse_deb822("".join(block))
+        suites = stanzas[0].get("Suites", "").split() if stanzas else []
+        # Ports layouts serve -security from the same URI as the archive; those stanzas stay put
+        if not suites or all(s.endswith("-security") for s in suites):
+            output.extend(block)
+            continue
+        in_uris = False
+        for line in block:
+            if line.startswith("URIs:") or (in_uris and line[:1] in (" ", "\t") and line.strip()):
+                prefix = "URIs: " if line.startswith("URIs:") else line[:len(line) - len(line.lstrip())]
+                values = line[5:] if line.startswith("URIs:") else line
+                uris = [normalise_mirror(new) if normalise_mirror(u) == normalise_mirror(old) else u
+                        for u in values.split()]
+                line = prefix + " ".join(uris) + "\n"
+                in_uris = True
+            elif not line.startswith("#"):
+                in_uris = False
+            output.append(line)
+    return "".join(output)
+
+def apply_mirror(new_mirror: str, root: str = "/") -> bool:
+    """Point the archive stanzas of ubuntu.sources at a new mirror, keeping a backup of the original"""
+    path = os.path.join(root, UBUNTU_SOURCES_FILE)
+    try:
+        with open(path) as f:
+            text = f.read()
+    except OSError:
+        text = None
+    current = current_archive_mirror(text or "")
+    if text is None or current is None:
+        print(f"No deb822 archive source found in {path}.")
+        return False
+    backup = path + ".tweakinstall.bak"
+    if not os.path.exists(backup):
+        shutil.copy2(path, backup)
+    write_config_file(path, rewrite_sources_mirror(text, current, new_mirror))
+    print(f"Mirror changed: {current} -> {normalise_mirror(new_mirror)}")
+    return True
+
+def restore_sources(root: str = "/") -> bool:
+    """Restore ubuntu.sources from the backup made before the first mirror change"""
+    path = os.path.join(root, UBUNTU_SOURCES_FILE)
+    backup = path + ".tweakinstall.bak"
+    if not os.path.exists(backup):
+        print("No backup of the original sources found.")
+        return False
+    os.replace(backup, path)
+    return True
+
+def apt_acquire_content(settings: Dict[str, str] = APT_ACQUIRE_SETTINGS) -> str:
+    """Return the generated apt.conf.d file for download settings"""
+    lines = ["// Generated by Ubuntu25-TweakInstall: apt download settings"]
+    lines += [f'{key} "{value}";' for key, value in settings.items()]
+    return "\n".join(lines) + "\n"
+
+def toggle_apt_acquire_settings() -> Optional[bool]:
+    """Install or remove the apt download settings file"""
+    try:
+        if os.path.exists(APT_ACQUIRE_FILE):
+            remove_file(APT_ACQUIRE_FILE)
+            return False
+        write_config_file(APT_ACQUIRE_FILE, apt_acquire_content())
+        return True
+    except OSError as e:
+        print(f"Failed to update apt settings: {e}")
+        return None
+
 # Software management
 def install_kvm_packages() -> bool:
     """Install virtualization packages"""
     try:
-        subprocess.run([
-            "sudo", "apt", "install", "-y",
+        apt_run([
+            "apt", "install", "-y",
             "qemu-kvm", "libvirt-daemon-system",
             "virtinst", "virt-manager"
         ], check=True)
@@ -131,9 +1047,9 @@ def install_kvm_packages() -> bool:
 def setup_software_managers() -> bool:
     """Install package managers"""
     try:
-        subprocess.run(["sudo", "apt", "update"], check=True)
-        subprocess.run([
-            "sudo", "apt", "install", "-y",
+        apt_run(["apt", "update"], check=True)
+        apt_run([
+            "apt", "install", "-y",
             "gnome-software", "synaptic", "snapd"
         ], check=True)
         subprocess.run(["sudo", "systemctl", "enable", "--now", "snapd"])
@@ -173,8 +1089,8 @@ def install_tor() -> Optional[bool]:
             )
             
             # Install dependencies (per notation)
-            subprocess.run([
-                "sudo", "apt", "install", "-y", 
+            apt_run([
+                "apt", "install", "-y", 
                 "libgtk-3-0", "libnss3", "libasound2"
             ], check=True)
             
@@ -205,7 +1121,7 @@ def install_opensnitch() -> bool:
         # Check if already installed
         if is_opensnitch_installed():
             print("\nOpenSnitch is already installed. Uninstalling...")
-            subprocess.run(["sudo", "apt", "remove", "-y", "opensnitch", "python3-opensnitch-ui"], check=True)
+            apt_run(["apt", "remove", "-y", "opensnitch", "python3-opensnitch-ui"], check=True)
             # Remove autostart entry
             autostart_file = os.path.join(HOME_DIR, ".config/autostart/opensnitch-ui.desktop")
             if os.path.exists(autostart_file):
@@ -251,8 +1167,8 @@ def install_opensnitch() -> bool:
 
         # Install packages
         print("\nInstalling packages...")
-        subprocess.run([
-            "sudo", "apt", "install", "-y",
+        apt_run([
+            "apt", "install", "-y",
             opensnitch_pkg, ui_pkg
         ], check=True)
         
@@ -301,26 +1217,20 @@ def install_notepadqq():
         is_installed = is_notepadqq_installed()
         if is_installed:
             # Uninstall Notepadqq
-            subprocess.run(['apt-get', 'remove', '-y', 'notepadqq'], check=True)
-            subprocess.run(['add-apt-repository', '--remove', '-y', 'ppa:notepadqq-team/notepadqq'], check=True)
-            subprocess.run(['apt-get', 'update'], check=True)
+            apt_run(['apt-get', 'remove', '-y', 'notepadqq'], check=True)
+            apt_run(['add-apt-repository', '--remove', '-y', 'ppa:notepadqq-team/notepadqq'], check=True)
+            apt_run(['apt-get', 'update'], check=True)
             # Remove rsyslog filter
-            filter_path = '/etc/rsyslog.d/10-notepadqq.conf'
-            if os.path.exists(filter_path):
-                os.remove(filter_path)
-                subprocess.run(['systemctl', 'restart', 'rsyslog'], check=True)
+            remove_log_filters(NOTEPADQQ_LOG_PROGRAMS)
             print("Notepadqq uninstalled successfully.")
             return False
         else:
             # Install Notepadqq
-            subprocess.run(['add-apt-repository', '-y', 'ppa:notepadqq-team/notepadqq'], check=True)
-            subprocess.run(['apt-get', 'update'], check=True)
-            subprocess.run(['apt-get', 'install', '-y', 'notepadqq'], check=True)
+            apt_run(['add-apt-repository', '-y', 'ppa:notepadqq-team/notepadqq'], check=True)
+            apt_run(['apt-get', 'update'], check=True)
+            apt_run(['apt-get', 'install', '-y', 'notepadqq'], check=True)
             # Create rsyslog filter to suppress notepadqq logs
-            filter_content = ':programname, contains, "notepadqq" stop\n'
-            with open('/etc/rsyslog.d/10-notepadqq.conf', 'w') as f:
-                f.write(filter_content)
-            subprocess.run(['systemctl', 'restart', 'rsyslog'], check=True)
+            add_log_filters(NOTEPADQQ_LOG_PROGRAMS)
             print("Notepadqq installed successfully with rsyslog filter.")
             return True
     except subprocess.CalledProcessError as e:
@@ -343,13 +1253,13 @@ def install_wine_winetricks() -> Optional[bool]:
     try:
         if is_wine_installed():
             print("\nWine is already installed. Uninstalling Wine and Winetricks...")
-            subprocess.run(["sudo", "apt", "remove", "-y", "winehq-stable", "winetricks"], check=True)
+            apt_run(["apt", "remove", "-y", "winehq-stable", "winetricks"], check=True)
             subprocess.run(["sudo", "rm", "-f", "/etc/apt/sources.list.d/winehq.list"], check=True)
             subprocess.run(["sudo", "rm", "-f", "/etc/apt/sources.list.d/*wine*"], check=True)
             subprocess.run(["sudo", "rm", "-f", "/etc/apt/keyrings/winehq-archive.key"], check=True)
             subprocess.run(["sudo", "rm", "-f", "/usr/share/keyrings/winehq-archive.gpg"], check=True)
             subprocess.run(["sudo", "sed", "-i", "/winehq.org/d", "/etc/apt/sources.list"], check=True)
-            subprocess.run(["sudo", "apt", "update"], check=True)
+            apt_run(["apt", "update"], check=True)
             return False
         else:
             print("\nInstalling Wine and Winetricks...")
@@ -389,11 +1299,11 @@ def install_wine_winetricks() -> Optional[bool]:
             
             # Update package lists
             print("Updating package lists...")
-            subprocess.run(["sudo", "apt", "update"], check=True)
+            apt_run(["apt", "update"], check=True)
             
             # Install Wine and Winetricks
-            subprocess.run(["sudo", "apt", "install", "-y", "--install-recommends", "winehq-stable"], check=True)
-            subprocess.run(["sudo", "apt", "install", "-y", "winetricks"], check=True)
+            apt_run(["apt", "install", "-y", "--install-recommends", "winehq-stable"], check=True)
+            apt_run(["apt", "install", "-y", "winetricks"], check=True)
             print("Wine and Winetricks installed successfully.")
             return True
     except subprocess.CalledProcessError as e:
@@ -403,10 +1313,400 @@ def install_wine_winetricks() -> Optional[bool]:
         print(f"Unexpected error during Wine operation: {e}")
         return None
 
+# Wine prefix templates
+WINE_TEMPLATE_ROOT = os.path.join(HOME_DIR, ".cache/ubuntu25-tweakinstall/wine-templates")
+WINE_BUILD_TIMEOUT = 1800  # Seconds allowed for wineboot plus winetricks verbs
+
+# Parts of a prefix Wine never writes to after setup; safe to share as hardlinks
+WINE_READONLY_DIRS = (
+    "drive_c/windows/Fonts",
+    "drive_c/windows/mono",
+    "drive_c/windows/system32/gecko",
+    "drive_c/windows/syswow64/gecko",
+)
+
+def get_wine_version(status_file: str = "/var/lib/dpkg/status") -> Optional[str]:
+    """Return the installed winehq-stable version from the dpkg status file"""
+    return read_dpkg_status(["winehq-stable"], status_file).get("winehq-stable")
+
+def wine_template_name(version: str, verbs: List[str]) -> str:
+    """Return the template directory name for a Wine version and verb set"""
+    digest = hashlib.sha1(" ".join(sorted(set(verbs))).encode()).hexdigest()[:12]
+    return f"{version.replace(':', '_').replace('/', '_')}-{digest}"
+
+def list_wine_templates(root: str = WINE_TEMPLATE_ROOT) -> List[Dict]:
+    """Return the metadata of every completed template"""
+    templates = []
+    for meta_path in sorted(glob.glob(os.path.join(root, "*.json"))):
+        try:
+            with open(meta_path, "r") as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            continue
+        meta["path"] = meta_path[:-5]
+        if os.path.isdir(meta["path"]):
+            templates.append(meta)
+    return templates
+
+def invalidate_wine_templates(version: Optional[str], root: str = WINE_TEMPLATE_ROOT) -> int:
+    """Remove templates built for another Wine version (all of them when version is None)"""
+    removed = 0
+    for meta in list_wine_templates(root):
+        if version is None or meta.get("version") != version:
+            shutil.rmtree(meta["path"], ignore_errors=True)
+            remove_file(meta["path"] + ".json")
+            removed += 1
+    return removed
+
+def wine_user_command(user: str, prefix: str, args: List[str]) -> List[str]:
+    """Build a command running Wine tooling against a prefix as the target user"""
+    cmd = ["env", f"WINEPREFIX={prefix}", "WINEDEBUG=-all"] + args
+    if os.getuid() == pwd.getpwnam(user).pw_uid:
+        return cmd
+    return ["sudo", "-u", user] + cmd
+
+def build_wine_template(verbs: List[str], root: str = WINE_TEMPLATE_ROOT) -> Optional[str]:
+    """Build (or reuse) a fully initialised prefix for the installed Wine version and verb set"""
+    version = get_wine_version()
+    if not version:
+        print("Wine (winehq-stable) is not installed.")
+        return None
+    removed = invalidate_wine_templates(version, root)
+    if removed:
+        print(f"Removed {removed} template(s) built for another Wine version.")
+    verbs = sorted(set(verbs))
+    path = os.path.join(root, wine_template_name(version, verbs))
+    if os.path.isfile(path + ".json") and os.path.isdir(path):
+        print(f"Template already built: {path}")
+        return path
+    user = get_target_user()
+    building = path + ".building"
+    shutil.rmtree(building, ignore_errors=True)
+    created = root
+    while not os.path.isdir(created):
+        created = os.path.dirname(created)
+    os.makedirs(root, exist_ok=True)
+    for part in os.path.relpath(root, created).split(os.sep):
+        created = os.path.join(created, part)
+        chown_to_user(created, user)
+    start = time.monotonic()
+    try:
+        print(f"Initialising prefix for Wine {version}...")
+        subprocess.run(wine_user_command(user, building, ["wineboot", "--init"]),
+                       check=True, timeout=WINE_BUILD_TIMEOUT)
+        subprocess.run(wine_user_command(user, building, ["wineserver", "-w"]), check=True, timeout=WINE_BUILD_TIMEOUT)
+        if verbs:
+            print(f"Installing winetricks verbs: {' '.join(verbs)}")
+            subprocess.run(wine_user_command(user, building, ["winetricks", "-q"] + verbs),
+                           check=True, timeout=WINE_BUILD_TIMEOUT)
+            subprocess.run(wine_user_command(user, building, ["wineserver", "-w"]), check=True, timeout=WINE_BUILD_TIMEOUT)
+        # A directory without its metadata is left from an interrupted build and is replaced
+        shutil.rmtree(path, ignore_errors=True)
+        os.rename(building, path)
+        meta = {"version": version, "verbs": verbs, "built": int(time.time()),
+                "build_seconds": round(time.monotonic() - start, 1)}
+        write_config_file(path + ".json", json.dumps(meta, indent=2) + "\n")
+        chown_to_user(path + ".json", user)
+    except (subprocess.CalledProcessError, subprocess.TimeoutExpired, OSError) as e:
+        print(f"Failed to build Wine template: {e}")
+        shutil.rmtree(building, ignore_errors=True)
+        return None
+    print(f"Template built in {meta['build_seconds']}s: {path}")
+    return path
+
+def clone_wine_prefix(template: str, dest: str, user: Optional[str] = None) -> Optional[Dict[str, float]]:
+    """Clone a template into a new prefix; returns per-method file counts and elapsed seconds"""
+    if os.path.lexists(dest):
+        print(f"Destination already exists: {dest}")
+        return None
+    user = user or get_target_user()
+    partial = dest + ".tweakinstall-part"
+    shutil.rmtree(partial, ignore_errors=True)
+    counts = {"reflink": 0, "hardlink": 0, "copy": 0}
+    start = time.monotonic()
+    try:
+        os.makedirs(partial)
+        for dirpath, dirnames, filenames in os.walk(template):
+            rel = os.path.relpath(dirpath, template)
+            target_dir = os.path.normpath(os.path.join(partial, rel))
+            shared = any(rel == d or rel.startswith(d + "/") for d in WINE_READONLY_DIRS)
+            for name in dirnames + filenames:
+                src = os.path.join(dirpath, name)
+                dst = os.path.join(target_dir, name)
+                if os.path.islink(src):
+                    os.symlink(os.readlink(src), dst)
+                elif os.path.isdir(src):
+                    os.mkdir(dst, os.stat(src).st_mode & 0o7777)
+                else:
+                    counts[clone_file(src, dst, hardlink_fallback=shared)] += 1
+                chown_to_user(dst, user)
+        chown_to_user(partial, user)
+        os.rename(partial, dest)
+    except OSError as e:
+        print(f"Failed to clone Wine prefix: {e}")
+        shutil.rmtree(partial, ignore_errors=True)
+        return None
+    counts["seconds"] = round(time.monotonic() - start, 2)
+    return counts
+
+def create_wine_prefix(dest: str, verbs: List[str]) -> bool:
+    """Create a prefix from the matching template, building the template first if needed"""
+    template = build_wine_template(verbs)
+    if template is None:
+        return False
+    if dest.startswith("~"):
+        dest = HOME_DIR + dest[1:]
+    result = clone_wine_prefix(template, os.path.abspath(dest))
+    if result is None:
+        return False
+    print(f"\nPrefix created in {result['seconds']}s: {result['reflink']} reflinked, "
+          f"{result['hardlink']} hardlinked, {result['copy']} copied file(s).")
+    return True
+
+# Python toolchain
+PYTHON_DEV_PACKAGES = ["python3-dev", "python3-venv", "python3-pip", "python3-setuptools", "python3-wheel", "pipx"]
+PYTHON_CACHE_DIR = "/var/cache/ubuntu25-tweakinstall"
+WHEELHOUSE_DIR = os.path.join(PYTHON_CACHE_DIR, "wheelhouse")  # Plain directory of wheels; copy it to share offline
+WHEEL_UNPACK_DIR = os.path.join(PYTHON_CACHE_DIR, "wheels-unpacked")  # Link source for venv installs
+
+CONSOLE_SCRIPT_TEMPLATE = """\
+#!{python}
+# Generated by Ubuntu25-TweakInstall: console script for {name}
+import sys
+from {module} import {head}
+if __name__ == "__main__":
+    sys.exit({call}())
+"""
+
+def is_python_toolchain_installed() -> bool:
+    """Check if the Python development packages are installed"""
+    return len(read_dpkg_status(PYTHON_DEV_PACKAGES)) == len(PYTHON_DEV_PACKAGES)
+
+def install_python_packages() -> bool:
+    """Install Python development packages and create the shared wheelhouse"""
+    try:
+        apt_run(["apt", "install", "-y"] + PYTHON_DEV_PACKAGES, check=True)
+        os.makedirs(WHEELHOUSE_DIR, mode=0o755, exist_ok=True)
+        os.makedirs(WHEEL_UNPACK_DIR, mode=0o755, exist_ok=True)
+        print(f"Wheelhouse ready: {WHEELHOUSE_DIR}")
+        return True
+    except subprocess.CalledProcessError as e:
+        print(f"Python installation failed: {e}")
+        return False
+    except OSError as e:
+        print(f"Failed to create wheelhouse: {e}")
+        return False
+
+def list_wheelhouse(wheelhouse: str = WHEELHOUSE_DIR) -> List[str]:
+    """Return the wheel files in the wheelhouse"""
+    return sorted(glob.glob(os.path.join(wheelhouse, "*.whl")))
+
+def fill_wheelhouse(requirements: List[str], wheelhouse: str = WHEELHOUSE_DIR) -> bool:
+    """Download or build wheels for requirements and all their dependencies into the wheelhouse"""
+    try:
+        os.makedirs(wheelhouse, mode=0o755, exist_ok=True)
+        subprocess.run(["python3", "-m", "pip", "wheel", "--wheel-dir", wheelhouse,
+                        "--find-links", wheelhouse, "--"] + requirements, check=True)
+        return True
+    except subprocess.CalledProcessError as e:
+        print(f"Failed to fill wheelhouse: {e}")
+        return False
+
+def resolve_from_wheelhouse(requirements: List[str], wheelhouse: str = WHEELHOUSE_DIR) -> Optional[List[str]]:
+    """Resolve requirements offline against the wheelhouse; returns wheel paths, or None on failure"""
+    # --dry-run --report resolves without installing, so the system Python is never touched
+    result = subprocess.run(["python3", "-m", "pip", "install", "--dry-run", "--quiet", "--ignore-installed",
+                             "--no-index", "--find-links", wheelhouse, "--report", "-", "--"] + requirements,
+                            capture_output=True, text=True)
+    if result.returncode != 0:
+        print(result.stderr.strip())
+        return None
+    try:
+        report = json.loads(result.stdout)
+    except ValueError:
+        print("pip returned an unreadable install report.")
+        return None
+    wheels = []
+    for item in report.get("install", []):
+        url = item.get("download_info", {}).get("url", "")
+        if not url.startswith("file://") or not url.endswith(".whl"):
+            print(f"Not available as a wheel in the wheelhouse: {item.get('metadata', {}).get('name', url)}")
+            return None
+        wheels.append(urllib.parse.unquote(url[7:]))
+    return wheels
+
+def unpack_wheel(wheel: str, unpack_dir: str = WHEEL_UNPACK_DIR) -> str:
+    """Unpack a wheel once into the shared cache and return its directory"""
+    target = os.path.join(unpack_dir, os.path.basename(wheel)[:-4])
+    if os.path.isdir(target):
+        return target
+    building = target + ".building"
+    shutil.rmtree(building, ignore_errors=True)
+    with zipfile.ZipFile(wheel) as archive:
+        archive.extractall(building)
+        for info in archive.infolist():
+            mode = (info.external_attr >> 16) & 0o777
+            if mode & 0o111:
+                os.chmod(os.path.join(building, info.filename), 0o755)
+    try:
+        os.rename(building, target)
+    except OSError:
+        # Another run finished unpacking the same wheel first
+        shutil.rmtree(building, ignore_errors=True)
+        if not os.path.isdir(target):
+            raise
+    return target
+
+def read_entry_points(dist_info: str) -> List[Tuple[str, str]]:
+    """Return (script name, 'module:attr') pairs from a dist-info entry_points.txt"""
+    scripts = []
+    section = ""
+    for line in (read_text(os.path.join(dist_info, "entry_points.txt")) or "").splitlines():
+        line = line.strip()
+        if line.startswith("["):
+            section = line.strip("[]")
+        elif "=" in line and section in ("console_scripts", "gui_scripts"):
+            name, target = (part.strip() for part in line.split("=", 1))
+            scripts.append((name, target.split("[")[0].strip()))
+    return scripts
+
+def read_wheel_record(dist_info: str) -> Dict[str, Tuple[str, str]]:
+    """Return {path: (hash, size)} from a dist-info RECORD"""
+    rows = csv.reader((read_text(os.path.join(dist_info, "RECORD")) or "").splitlines())
+    return {row[0]: (row[1], row[2]) for row in rows if len(row) == 3}
+
+def record_hash(data: bytes) -> Tuple[str, str]:
+    """Return the RECORD (hash, size) fields for file content"""
+    digest = base64.urlsafe_b64encode(hashlib.sha256(data).digest()).rstrip(b"=").decode()
+    return f"sha256={digest}", str(len(data))
+
+def rewrite_script_shebang(data: bytes, python: str) -> bytes:
+    """Point a wheel script's '#!python' placeholder at the venv interpreter, keeping its arguments"""
+    if not data.startswith(b"#!python"):
+        return data
+    first, newline, rest = data.partition(b"\n")
+    args = first[2:].split(None, 1)[1:]
+    return b" ".join([b"#!" + python.encode()] + args) + newline + rest
+
+def link_wheel_into_venv(unpacked: str, venv: str, site_packages: str) -> Dict[str, int]:
+    """Install an unpacked wheel into a venv by linking files from the cache; returns method counts"""
+    counts = {"reflink": 0, "hardlink": 0, "copy": 0}
+    bin_dir = os.path.join(venv, "bin")
+    python = os.path.join(bin_dir, "python")
+    dist_infos = glob.glob(os.path.join(unpacked, "*.dist-info"))
+    wheel_record = {}
+    for dist_info in dist_infos:
+        wheel_record.update(read_wheel_record(dist_info))
+    record = {}  # Installed path relative to site-packages -> (hash, size)
+    for dirpath, _, filenames in os.walk(unpacked):
+        rel = os.path.relpath(dirpath, unpacked)
+        parts = rel.split(os.sep)
+        # <name>.data/{purelib,platlib,scripts}/... map into the venv; headers and data are skipped
+        if parts[0].endswith(".data"):
+            if len(parts) < 2 or parts[1] not in ("purelib", "platlib", "scripts"):
+                continue
+            base = bin_dir if parts[1] == "scripts" else site_packages
+            target_dir = os.path.join(base, *parts[2:])
+        else:
+            target_dir = os.path.normpath(os.path.join(site_packages, rel))
+        os.makedirs(target_dir, exist_ok=True)
+        for name in filenames:
+            src = os.path.join(dirpath, name)
+            target = os.path.join(target_dir, name)
+            if os.path.lexists(target):
+                os.remove(target)
+            entry = wheel_record.get(os.path.relpath(src, unpacked), ("", ""))
+            if parts[0].endswith(".data") and parts[1] == "scripts":
+                # Scripts are copied, not linked: their '#!python' placeholder is venv-specific
+                with open(src, "rb") as f:
+                    data = rewrite_script_shebang(f.read(), python)
+                with open(target, "wb") as f:
+                    f.write(data)
+                os.chmod(target, 0o755)
+                counts["copy"] += 1
+                entry = record_hash(data)
+            else:
+                counts[clone_file(src, target, hardlink_fallback=True)] += 1
+            record[os.path.relpath(target, site_packages)] = entry
+    for dist_info in dist_infos:
+        installed = os.path.join(site_packages, os.path.basename(dist_info))
+        # New files replace the links, so the shared cache copy is never modified
+        generated = {os.path.join(installed, "INSTALLER"): ("ubuntu25-tweakinstall\n", 0o644)}
+        for name, target in read_entry_points(dist_info):
+            module, _, attr = target.partition(":")
+            attr = attr or "main"
+            generated[os.path.join(bin_dir, name)] = (CONSOLE_SCRIPT_TEMPLATE.format(
+                python=python, name=name, module=module, head=attr.split(".")[0], call=attr), 0o755)
+        for path, (content, mode) in generated.items():
+            write_config_file(path, content, mode)
+            record[os.path.relpath(path, site_packages)] = record_hash(content.encode())
+        # RECORD lists installed locations so 'pip uninstall' also removes the scripts in bin/
+        record_path = os.path.join(installed, "RECORD")
+        record[os.path.relpath(record_path, site_packages)] = ("", "")
+        rows = io.StringIO()
+        csv.writer(rows, lineterminator="\n").writerows([path, *entry] for path, entry in sorted(record.items()))
+        write_config_file(record_path, rows.getvalue())
+    return counts
+
+def create_python_env(path: str, requirements: List[str], user: Optional[str] = None) -> Optional[Dict]:
+    """Create a venv with requirements linked from the wheelhouse cache; returns counts and timing"""
+    user = user or get_target_user()
+    start = time.monotonic()
+    wheels = resolve_from_wheelhouse(requirements) if requirements else []
+    if wheels is None:
+        print("Add the missing packages to the wheelhouse first (needs network once).")
+        return None
+    try:
+        subprocess.run(["python3", "-m", "venv", "--without-pip", path], check=True)
+        site_packages = glob.glob(os.path.join(path, "lib", "python3*", "site-packages"))[0]
+        counts = {"reflink": 0, "hardlink": 0, "copy": 0}
+        for wheel in wheels:
+            for method, count in link_wheel_into_venv(unpack_wheel(wheel), path, site_packages).items():
+                counts[method] += count
+    except (subprocess.CalledProcessError, OSError, IndexError, zipfile.BadZipFile) as e:
+        print(f"Failed to create environment: {e}")
+        return None
+    # Linked files stay root-owned and read-only to the user so the shared cache cannot be altered
+    for dirpath, dirnames, filenames in os.walk(path):
+        chown_to_user(dirpath, user)
+        for name in filenames:
+            file_path = os.path.join(dirpath, name)
+            if os.lstat(file_path).st_nlink == 1:
+                chown_to_user(file_path, user)
+    counts["packages"] = len(wheels)
+    counts["seconds"] = round(time.monotonic() - start, 2)
+    return counts
+
 # Hardware optimization
+CUDA_VERSION = "12-5"  # Current stable
+
+# Component presets; {v} is replaced with CUDA_VERSION. The trimmed presets skip Recommends,
+# "full" keeps apt's default so it pulls in the same set as the original toolkit install
+CUDA_PRESETS = {
+    "runtime": {
+        "description": "Runtime only (cudart, cuBLAS)",
+        "packages": ["cuda-cudart-{v}", "libcublas-{v}"],
+        "recommends": False,
+    },
+    "compile": {
+        "description": "Compile (runtime, cuBLAS, nvcc, NVRTC and headers)",
+        "packages": ["cuda-cudart-dev-{v}", "libcublas-dev-{v}", "cuda-nvcc-{v}", "cuda-nvrtc-dev-{v}"],
+        "recommends": False,
+    },
+    "full": {
+        "description": "Full toolkit (cuda-toolkit meta-package)",
+        "packages": ["cuda-toolkit-{v}", "cuda-nvcc-{v}", "cuda-nvrtc-dev-{v}"],
+        "recommends": True,
+    },
+}
+
 def is_cuda_installed() -> bool:
-    """Check if CUDA Toolkit is properly installed"""
+    """Check if CUDA Toolkit (or a runtime-only component set) is properly installed"""
     try:
+        # Runtime-only installs have no nvcc, so check the package database too
+        if read_dpkg_status([f"cuda-cudart-{CUDA_VERSION}"]):
+            return True
+
         # Check nvcc existence and validity
         nvcc_check = subprocess.run(["which", "nvcc"], capture_output=True, text=True)
         if nvcc_check.returncode != 0:
@@ -419,7 +1719,69 @@ def is_cuda_installed() -> bool:
     except Exception:
         return False
 
-def install_cuda_toolkit() -> Optional[bool]:
+def cuda_preset_packages(preset: str, version: str = CUDA_VERSION) -> List[str]:
+    """Return the top-level packages for a CUDA component preset"""
+    return [name.format(v=version) for name in CUDA_PRESETS[preset]["packages"]]
+
+def cuda_install_options(preset: str) -> List[str]:
+    """Return the apt options a preset installs with"""
+    return [] if CUDA_PRESETS[preset]["recommends"] else ["--no-install-recommends"]
+
+def parse_apt_simulation(output: str) -> List[Tuple[str, str]]:
+    """Parse `apt-get install -s` output into (package, version) pairs to be installed"""
+    packages = []
+    for line in output.splitlines():
+        if not line.startswith("Inst "):
+            continue
+        # "Inst name (1.2-1 repo [amd64])" or "Inst name [old] (1.2-1 repo [amd64])"
+        fields = line.split()
+        version = line.split("(", 1)[1].split()[0] if "(" in line else ""
+        packages.append((fields[1], version))
+    return packages
+
+def parse_apt_records(output: str) -> Dict[Tuple[str, str], Tuple[int, int]]:
+    """Parse `apt-cache show` records into {(package, version): (download bytes, installed bytes)}"""
+    records = {}
+    for stanza in output.split("\n\n"):
+        fields = {}
+        for line in stanza.splitlines():
+            key, sep, value = line.partition(": ")
+            if sep and not line.startswith(" "):
+                fields[key] = value.strip()
+        if "Package" in fields and "Version" in fields:
+            download = int(fields.get("Size", "0") or 0)
+            installed = int(fields.get("Installed-Size", "0") or 0) * 1024  # Installed-Size is KiB
+            records.setdefault((fields["Package"], fields["Version"]), (download, installed))
+    return records
+
+def resolve_cuda_packages(preset: str, apt_options: Optional[List[str]] = None) -> Tuple[List[Tuple[str, str]], int, int]:
+    """Resolve the exact package set for a preset; returns (packages, download bytes, installed bytes)"""
+    options = apt_options or []
+    simulation = subprocess.run(
+        ["apt-get", "install", "-s"] + cuda_install_options(preset) + options + cuda_preset_packages(preset),
+        capture_output=True, text=True, check=True
+    )
+    packages = parse_apt_simulation(simulation.stdout)
+    if not packages:
+        return packages, 0, 0
+    records = parse_apt_records(subprocess.run(
+        ["apt-cache", "show"] + options + [f"{name}={version}" for name, version in packages],
+        capture_output=True, text=True, check=True
+    ).stdout)
+    download = sum(records.get(package, (0, 0))[0] for package in packages)
+    installed = sum(records.get(package, (0, 0))[1] for package in packages)
+    return packages, download, installed
+
+def format_size(num_bytes: float) -> str:
+    """Format a byte count for display"""
+    if num_bytes < 1024:
+        return f"{int(num_bytes)} B"
+    for unit in ("KB", "MB", "GB"):
+        num_bytes /= 1024
+        if num_bytes < 1024 or unit == "GB":
+            return f"{num_bytes:.1f} {unit}"
+
+def install_cuda_toolkit(preset: str = "full") -> Optional[bool]:
     """Install/uninstall CUDA Toolkit for Ubuntu 25.04 using Ubuntu 24.04 repo"""
     try:
         # Pre-flight checks
@@ -429,11 +1791,11 @@ def install_cuda_toolkit() -> Optional[bool]:
             
         if is_cuda_installed():
             print("\nUninstalling CUDA Toolkit...")
-            subprocess.run([
-                "sudo", "apt", "purge", "-y", 
-                "cuda-toolkit*", "cuda-*", "nvidia-cuda-toolkit"
+            apt_run([
+                "apt", "purge", "-y", 
+                "cuda-toolkit*", "cuda-*", "libcublas-*", "nvidia-cuda-toolkit"
             ], check=True)
-            subprocess.run(["sudo", "apt", "autoremove", "-y"], check=True)
+            apt_run(["apt", "autoremove", "-y"], check=True)
             subprocess.run(["sudo", "rm", "/etc/apt/sources.list.d/cuda*.list"], check=True)
             subprocess.run(["sudo", "rm", "-f", "/etc/apt/trusted.gpg.d/cuda*.gpg"], check=True)
             # Clean environment variables
@@ -442,35 +1804,44 @@ def install_cuda_toolkit() -> Optional[bool]:
             # Remove symlinks
             subprocess.run(["sudo", "rm", "-f", "/usr/local/cuda"], check=True)
             subprocess.run(["sudo", "rm", "-f", "/usr/local/cuda-12.5"], check=True)
-            subprocess.run(["sudo", "apt", "update"])
+            write_shell_env()
+            apt_run(["apt", "update"])
             return False
             
         # Installation process
-        print("\nInstalling CUDA Toolkit for Ubuntu 25.04 using Ubuntu 24.04 repository...")
+        print(f"\nInstalling CUDA ({CUDA_PRESETS[preset]['description']}) for Ubuntu 25.04 using Ubuntu 24.04 repository...")
         
         # 1. Install prerequisites
-        subprocess.run([
-            "sudo", "apt", "install", "-y", 
+        apt_run([
+            "apt", "install", "-y", 
             "software-properties-common", "wget"
         ], check=True)
         
         # 2. Add CUDA repository (Ubuntu 24.04 repo for 25.04 compatibility)
-        cuda_version = "12-5"  # Current stable
+        cuda_version = CUDA_VERSION
         keyring_deb = "cuda-keyring_1.1-1_all.deb"
         
         # Use Ubuntu 24.04 repository
         repo_url = "https://developer.download.nvidia.com/compute/cuda/repos/ubuntu2404/x86_64/cuda-keyring_1.1-1_all.deb"
         
         subprocess.run(["wget", repo_url], check=True)
-        subprocess.run(["sudo", "dpkg", "-i", keyring_deb], check=True)
+        apt_run(["dpkg", "-i", keyring_deb], check=True)
         os.remove(keyring_deb)
         
-        # 3. Install CUDA
-        subprocess.run(["sudo", "apt", "update"], check=True)
-        install_result = subprocess.run([
-            "sudo", "apt", "install", "-y", 
-            f"cuda-toolkit-{cuda_version}"
-        ], capture_output=True, text=True)
+        # 3. Resolve the component set and confirm sizes before installing
+        apt_run(["apt", "update"], check=True)
+        packages, download, installed = resolve_cuda_packages(preset)
+        print(f"\n{len(packages)} packages to install:")
+        for name, version in packages:
+            print(f"    {name} {version}")
+        print(f"\nDownload size: {format_size(download)}, installed size: {format_size(installed)}")
+        if input("Proceed with installation? [y/N]: ").strip().lower() != "y":
+            print("Installation cancelled.")
+            return None
+
+        install_result = apt_run([
+            "apt", "install", "-y"
+        ] + cuda_install_options(preset) + cuda_preset_packages(preset), capture_output=True, text=True)
         
         if install_result.returncode != 0:
             if "Secure Boot" in install_result.stderr:
@@ -479,6 +1850,8 @@ def install_cuda_toolkit() -> Optional[bool]:
                 print("1. Reboot and enter BIOS")
                 print("2. Enroll MOK when prompted")
                 print("3. Complete installation after reboot")
+            else:
+                print(install_result.stderr)
             return None
             
         # 4. Post-install configuration
@@ -486,28 +1859,24 @@ def install_cuda_toolkit() -> Optional[bool]:
         if not os.path.exists("/usr/local/cuda"):
             subprocess.run(["sudo", "ln", "-s", f"/usr/local/cuda-{cuda_version.replace('-','.')}", "/usr/local/cuda"], check=True)
         
-        # Add to system-wide profile
-        with open("/etc/profile.d/cuda.sh", "w") as f:
-            f.write("#!/bin/sh\n")
-            f.write("export PATH=/usr/local/cuda/bin:$PATH\n")
-            f.write("export LD_LIBRARY_PATH=/usr/local/cuda/lib64:$LD_LIBRARY_PATH\n")
-        subprocess.run(["sudo", "chmod", "+x", "/etc/profile.d/cuda.sh"])
-        
-        # Install missing components
-        subprocess.run([
-            "sudo", "apt", "install", "-y",
-            f"cuda-nvcc-{cuda_version}", 
-            f"cuda-nvrtc-dev-{cuda_version}"
-        ], check=True)
+        # Add to the consolidated system-wide profile fragment
+        remove_file("/etc/profile.d/cuda.sh")
+        write_shell_env()
         
         # 5. Verify installation
+        if preset == "runtime":
+            if read_dpkg_status(cuda_preset_packages(preset)):
+                print("\nCUDA runtime components successfully installed")
+                return True
+            print("\nERROR: CUDA runtime packages not found after installation")
+            return None
         try:
             # Check using absolute path to avoid PATH issues
             nvcc_check = subprocess.run(["/usr/local/cuda/bin/nvcc", "--version"], 
                                       capture_output=True, text=True, check=True)
             if "release" in nvcc_check.stdout:
                 print("\nCUDA Toolkit successfully installed")
-                print("Run 'source /etc/profile.d/cuda.sh' or reboot to apply paths")
+                print(f"Run 'source {SHELL_ENV_FILE}' or reboot to apply paths")
                 return True
             print("\nWARNING: nvcc found but version check failed")
             return None
@@ -535,7 +1904,7 @@ def install_cuda_toolkit() -> Optional[bool]:
 def amd_cpu_setup() -> bool:
     """Configure AMD CPU microcode"""
     try:
-        subprocess.run(["sudo", "apt", "install", "-y", "amd64-microcode"], check=True)
+        apt_run(["apt", "install", "-y", "amd64-microcode"], check=True)
         return True
     except subprocess.CalledProcessError as e:
         print(f"AMD CPU setup failed: {e}")
@@ -544,17 +1913,203 @@ def amd_cpu_setup() -> bool:
 def intel_cpu_setup() -> bool:
     """Configure Intel CPU microcode"""
     try:
-        subprocess.run(["sudo", "apt", "install", "-y", "intel-microcode"], check=True)
+        apt_run(["apt", "install", "-y", "intel-microcode"], check=True)
         return True
     except subprocess.CalledProcessError as e:
         print(f"Intel CPU setup failed: {e}")
         return False
 
+# CPU frequency and power tuning
+CPU_SYSFS = "sys/devices/system/cpu"
+CPU_PROFILE_SCRIPT = "/usr/local/sbin/tweakinstall-cpu-profile"
+CPU_PROFILE_UNIT = "tweakinstall-cpu-profile.service"
+CPU_LATENCY_IDLE_LIMIT_US = 20  # Idle states slower to exit than this are disabled by "latency"
+
+CPU_PROFILES = {
+    "throughput": {
+        "description": "All-core sustained performance (performance governor, boost on)",
+        "governors": ["performance"],
+        "epp": ["performance"],
+        "boost": True,
+        "limit_idle": False,
+    },
+    "latency": {
+        "description": "Lowest wakeup latency (throughput plus deep idle states disabled)",
+        "governors": ["performance"],
+        "epp": ["performance"],
+        "boost": True,
+        "limit_idle": True,
+    },
+    "balanced": {
+        "description": "Responsive but power aware (schedutil/powersave, balance_performance EPP)",
+        "governors": ["schedutil", "powersave"],
+        "epp": ["balance_performance", "default"],
+        "boost": True,
+        "limit_idle": False,
+    },
+}
+
+def cpu_policy_dirs(root: str = "/") -> List[str]:
+    """Return the cpufreq policy directories"""
+    return sorted(glob.glob(os.path.join(root, CPU_SYSFS, "cpufreq", "policy*")),
+                  key=lambda path: int(path.rsplit("policy", 1)[1]))
+
+def cpu_boost_path(root: str = "/") -> Tuple[Optional[str], bool]:
+    """Return (boost control path, inverted) - intel_pstate exposes no_turbo instead of boost"""
+    base = os.path.join(root, CPU_SYSFS)
+    if os.path.exists(os.path.join(base, "intel_pstate", "no_turbo")):
+        return os.path.join(base, "intel_pstate", "no_turbo"), True
+    if os.path.exists(os.path.join(base, "cpufreq", "boost")):
+        return os.path.join(base, "cpufreq", "boost"), False
+    return None, False
+
+def read_cpu_tuning_state(root: str = "/") -> Dict:
+    """Read CPU topology and frequency driver state from sysfs"""
+    base = os.path.join(root, CPU_SYSFS)
+    policies = cpu_policy_dirs(root)
+    first = policies[0] if policies else ""
+    governors = sorted({read_text(os.path.join(p, "scaling_governor")) or "" for p in policies} - {""})
+    epps = sorted({read_text(os.path.join(p, "energy_performance_preference")) or "" for p in policies} - {""})
+    boost_path, inverted = cpu_boost_path(root)
+    boost = read_text(boost_path) if boost_path else None
+
+    mode = None
+    for driver_dir in ("amd_pstate", "intel_pstate"):
+        status = read_text(os.path.join(base, driver_dir, "status"))
+        if status:
+            mode = f"{driver_dir} {status}"
+    return {
+        "online": read_text(os.path.join(base, "online")),
+        "policies": len(policies),
+        "driver": read_text(os.path.join(first, "scaling_driver")) if first else None,
+        "mode": mode,
+        "governors": governors,
+        "available_governors": (read_text(os.path.join(first, "scaling_available_governors")) or "").split(),
+        "epp": epps,
+        "available_epp": (read_text(os.path.join(first, "energy_performance_available_preferences")) or "").split(),
+        "boost": None if boost is None else (boost == "0") == inverted,
+        "profile": load_state("cpu-profile", {}, state_dir_for(root)).get("profile"),
+    }
+
+def plan_cpu_profile(profile: str, root: str = "/") -> List[Tuple[str, str]]:
+    """Return the ordered (sysfs path, value) writes that apply a CPU profile on this host"""
+    settings = CPU_PROFILES[profile]
+    state = read_cpu_tuning_state(root)
+    writes = []
+    governor = next((g for g in settings["governors"] if g in state["available_governors"]), None)
+    epp = next((e for e in settings["epp"] if e in state["available_epp"]), None)
+    # Governor first: EPP writes are rejected while a different governor pins the preference
+    for policy in cpu_policy_dirs(root):
+        if governor:
+            writes.append((os.path.join(policy, "scaling_governor"), governor))
+        if epp and os.path.exists(os.path.join(policy, "energy_performance_preference")):
+            writes.append((os.path.join(policy, "energy_performance_preference"), epp))
+    boost_path, inverted = cpu_boost_path(root)
+    if boost_path:
+        writes.append((boost_path, "0" if settings["boost"] == inverted else "1"))
+    if settings["limit_idle"]:
+        for state_dir in sorted(glob.glob(os.path.join(root, CPU_SYSFS, "cpu[0-9]*", "cpuidle", "state[0-9]*"))):
+            latency = read_text(os.path.join(state_dir, "latency"))
+            if latency and latency.isdigit() and int(latency) > CPU_LATENCY_IDLE_LIMIT_US:
+                writes.append((os.path.join(state_dir, "disable"), "1"))
+    return writes
+
+def cpu_restore_writes(original: Dict[str, str], writes: List[Tuple[str, str]]) -> List[Tuple[str, str]]:
+    """Return writes putting back saved originals of paths a new plan leaves alone"""
+    planned = {path for path, _ in writes}
+    return [(path, value) for path, value in original.items() if path not in planned]
+
+def write_sysfs_values(writes: List[Tuple[str, str]]) -> List[str]:
+    """Write sysfs values, returning error messages for writes the kernel rejected"""
+    errors = []
+    for path, value in writes:
+        try:
+            with open(path, "w") as f:
+                f.write(value)
+        except OSError as e:
+            errors.append(f"{path}: {e.strerror}")
+    return errors
+
+def cpu_profile_script(profile: str, writes: List[Tuple[str, str]], root: str = "/") -> str:
+    """Generate the boot-time script that re-applies a CPU profile"""
+    lines = ["#!/bin/sh", f"# Generated by Ubuntu25-TweakInstall: CPU profile '{profile}'"]
+    for path, value in writes:
+        target = "/" + os.path.relpath(path, root)
+        lines.append(f'[ -w "{target}" ] && echo {value} > "{target}"')
+    lines.append("exit 0")
+    return "\n".join(lines) + "\n"
+
+def apply_cpu_profile(profile: str, root: str = "/") -> bool:
+    """Apply a named CPU profile now and persist it with a generated systemd unit"""
+    try:
+        writes = plan_cpu_profile(profile, root)
+        if not writes:
+            print("No tunable CPU frequency controls found.")
+            return False
+        # Remember the pre-tweak values once, so revert restores the real defaults
+        original = load_state("cpu-profile", {}, state_dir_for(root)).get("original", {})
+        # Settings the previous profile changed but this one leaves alone (e.g. latency's idle
+        # states when switching to throughput) go back to their pre-tweak values first
+        restore = cpu_restore_writes(original, writes)
+        for path, _ in writes:
+            if path not in original and read_text(path) is not None:
+                original[path] = read_text(path)
+        errors = write_sysfs_values(restore + writes)
+        for error in errors:
+            print(f"    Rejected: {error}")
+        write_config_file(CPU_PROFILE_SCRIPT, cpu_profile_script(profile, writes, root), mode=0o755)
+        install_systemd_unit(CPU_PROFILE_UNIT, f"""[Unit]
+Description=Ubuntu25-TweakInstall CPU profile ({profile})
+After=sysinit.target
+
+[Service]
+Type=oneshot
+ExecStart={CPU_PROFILE_SCRIPT}
+
+[Install]
+WantedBy=multi-user.target
+""")
+        save_state("cpu-profile", {"profile": profile, "original": original}, state_dir_for(root))
+        if shutil.which("powerprofilesctl"):
+            print("NOTE: power-profiles-daemon may override governor/EPP when the power mode changes.")
+        return not errors
+    except (subprocess.CalledProcessError, OSError) as e:
+        print(f"CPU profile failed: {e}")
+        return False
+
+def revert_cpu_profile() -> bool:
+    """Restore the saved pre-tweak CPU settings and remove the boot unit"""
+    try:
+        saved = load_state("cpu-profile")
+        if not saved:
+            print("No CPU profile applied.")
+            return False
+        errors = write_sysfs_values(list(saved["original"].items()))
+        for error in errors:
+            print(f"    Rejected: {error}")
+        remove_systemd_unit(CPU_PROFILE_UNIT)
+        remove_file(CPU_PROFILE_SCRIPT)
+        clear_state("cpu-profile")
+        return True
+    except (subprocess.CalledProcessError, OSError) as e:
+        print(f"CPU profile revert failed: {e}")
+        return False
+
+def cpu_tuning_status_line(root: str = "/") -> str:
+    """One-line summary of the CPU frequency state for menus"""
+    state = read_cpu_tuning_state(root)
+    if not state["driver"]:
+        return "CPU frequency scaling not available"
+    boost = {True: "on", False: "off", None: "n/a"}[state["boost"]]
+    return (f"Profile: {state['profile'] or 'none'} | Driver: {state['driver']}"
+            f"{' (' + state['mode'] + ')' if state['mode'] else ''} | Governor: {','.join(state['governors']) or 'n/a'}"
+            f" | EPP: {','.join(state['epp']) or 'n/a'} | Boost: {boost}")
+
 def amdgpu_non_rocm_setup() -> bool:
     """Configure AMD GPU (non-ROCm)"""
     try:
-        subprocess.run([
-            "sudo", "apt", "install", "-y",
+        apt_run([
+            "apt", "install", "-y",
             "xserver-xorg-video-amdgpu",
             "vulkan-tools", "mesa-vulkan-drivers"
         ], check=True)
@@ -574,8 +2129,8 @@ def amdgpu_rocm_setup() -> bool:
             "sudo gpg --dearmor -o /etc/apt/trusted.gpg.d/rocm.gpg",
             shell=True, check=True
         )
-        subprocess.run(["sudo", "apt", "update"], check=True)
-        subprocess.run(["sudo", "apt", "install", "-y", "rocm-dkms"], check=True)
+        apt_run(["apt", "update"], check=True)
+        apt_run(["apt", "install", "-y", "rocm-dkms"], check=True)
         subprocess.run([
             "sudo", "usermod", "-a", "-G",
             "video,render", os.getenv("SUDO_USER", os.getlogin())
@@ -588,16 +2143,16 @@ def amdgpu_rocm_setup() -> bool:
 def nvidia_gpu_setup() -> bool:
     """Configure NVIDIA GPU drivers"""
     try:
-        subprocess.run([
-            "sudo", "add-apt-repository", "-y",
+        apt_run([
+            "add-apt-repository", "-y",
             "ppa:graphics-drivers/ppa"
         ], check=True)
-        driver = subprocess.getoutput(
-            "ubuntu-drivers devices | grep -oP 'driver : \\K\\S+' | head -1"
+        driver = parse_ubuntu_drivers(
+            run_probe("ubuntu-drivers", ["ubuntu-drivers", "devices"], timeout=60) or ""
         ) or "nvidia-driver-550"
         
-        subprocess.run([
-            "sudo", "apt", "install", "-y",
+        apt_run([
+            "apt", "install", "-y",
             driver, "dkms"
         ], check=True)
         print("\nWARNING: Secure Boot key enrollment required after reboot!")
@@ -614,9 +2169,9 @@ def arm64_firmware_setup() -> bool:
             "s/restricted$/restricted multiverse/",
             "/etc/apt/sources.list"
         ], check=True)
-        subprocess.run(["sudo", "apt", "update"], check=True)
-        subprocess.run([
-            "sudo", "apt", "install", "-y",
+        apt_run(["apt", "update"], check=True)
+        apt_run([
+            "apt", "install", "-y",
             "qcom-firmware-extract"
         ], check=True)
         return True
@@ -627,8 +2182,8 @@ def arm64_firmware_setup() -> bool:
 def intel_gpu_setup() -> bool:
     """Configure Intel GPU drivers"""
     try:
-        subprocess.run([
-            "sudo", "apt", "install", "-y",
+        apt_run([
+            "apt", "install", "-y",
             "intel-media-va-driver-non-free"
         ], check=True)
         return True
@@ -636,23 +2191,1553 @@ def intel_gpu_setup() -> bool:
         print(f"Intel GPU setup failed: {e}")
         return False
 
-# System tweaks
-def check_sudo_nopasswd() -> bool:
-    """Check if sudo password prompt is disabled"""
-    if not os.path.exists("/etc/sudoers.d/nopasswd"):
-        return False
-    
-    user = os.getenv("SUDO_USER", os.getlogin())
-    with open("/etc/sudoers.d/nopasswd", "r") as f:
-        return f"{user} ALL=(ALL) NOPASSWD: ALL" in f.read()
+# DKMS build acceleration
+DKMS_FRAMEWORK_CONF = "/etc/dkms/framework.conf.d/90-tweakinstall.conf"
+DKMS_WRAPPER = "/usr/local/sbin/dkms"  # Ahead of /usr/sbin in root's PATH
+DKMS_CCACHE_DIR = "/var/cache/ccache-dkms"
+DKMS_BUILD_LOG = "/var/log/tweakinstall-dkms-builds.log"
+DKMS_TREE = "/var/lib/dkms"
 
-def toggle_sudo_nopasswd() -> bool:
-    """Toggle sudo password requirement"""
+def is_dkms_acceleration_enabled() -> bool:
+    """Check if the ccache/parallel DKMS configuration is in place"""
+    return os.path.exists(DKMS_WRAPPER) and os.path.exists(DKMS_FRAMEWORK_CONF)
+
+def dkms_wrapper_script() -> str:
+    """Generate the dkms wrapper that routes compilers through ccache and logs build times"""
+    return f"""#!/bin/sh
+# Generated by Ubuntu25-TweakInstall: ccache + build timing wrapper for dkms
+export PATH="/usr/lib/ccache:$PATH"
+export CCACHE_DIR="{DKMS_CCACHE_DIR}"
+start=$(date +%s)
+/usr/sbin/dkms "$@"
+status=$?
+echo "$(date -Is) $(( $(date +%s) - start ))s exit=$status dkms $*" >> "{DKMS_BUILD_LOG}"
+exit $status
+"""
+
+def toggle_dkms_acceleration() -> Optional[bool]:
+    """Enable or disable parallel, ccache-backed DKMS module builds"""
     try:
-        user = os.getenv("SUDO_USER", os.getlogin())
-        if check_sudo_nopasswd():
-            subprocess.run(["sudo", "rm", "/etc/sudoers.d/nopasswd"], check=True)
-            print("WARNING: Sudo password protection ENABLED")
+        if is_dkms_acceleration_enabled():
+            print("\nRemoving DKMS build acceleration...")
+            remove_file(DKMS_WRAPPER)
+            remove_file(DKMS_FRAMEWORK_CONF)
+            shutil.rmtree(DKMS_CCACHE_DIR, ignore_errors=True)
+            return False
+
+        print("\nConfiguring DKMS build acceleration...")
+        apt_run(["apt", "install", "-y", "ccache", "dkms"], check=True)
+        # Refresh /usr/lib/ccache symlinks for every installed gcc version
+        subprocess.run(["sudo", "update-ccache-symlinks"])
+
+        jobs = os.cpu_count() or 1
+        os.makedirs(DKMS_CCACHE_DIR, mode=0o755, exist_ok=True)
+        write_config_file(os.path.join(DKMS_CCACHE_DIR, "ccache.conf"),
+                          "max_size = 5G\nsloppiness = time_macros\n")
+        write_config_file(DKMS_FRAMEWORK_CONF,
+                          f"# Generated by Ubuntu25-TweakInstall\nparallel_jobs={jobs}\n")
+        write_config_file(DKMS_WRAPPER, dkms_wrapper_script(), mode=0o755)
+        print(f"DKMS configured for {jobs} parallel jobs, ccache in {DKMS_CCACHE_DIR}")
+        return True
+    except (subprocess.CalledProcessError, OSError) as e:
+        print(f"DKMS acceleration setup failed: {e}")
+        return None
+
+def parse_dkms_elapsed(make_log: str) -> Optional[int]:
+    """Return build seconds from a DKMS make.log ('# elapsed time: HH:MM:SS' trailer)"""
+    for line in reversed(make_log.splitlines()):
+        if line.startswith("# elapsed time:"):
+            try:
+                hours, minutes, seconds = line.split(":", 1)[1].strip().split(":")
+                return int(hours) * 3600 + int(minutes) * 60 + int(seconds)
+            except ValueError:
+                return None
+    return None
+
+def get_dkms_build_times(dkms_tree: str = DKMS_TREE) -> List[Tuple[str, str, str, int]]:
+    """Return (module, version, kernel, seconds) for every DKMS build log found"""
+    results = []
+    # Per-kernel logs: <module>/<version>/<kernel>/<arch>/log/make.log
+    for path in sorted(glob.glob(os.path.join(dkms_tree, "*", "*", "*", "*", "log", "make.log"))):
+        parts = os.path.relpath(path, dkms_tree).split(os.sep)
+        try:
+            with open(path, "r", errors="replace") as f:
+                seconds = parse_dkms_elapsed(f.read())
+        except OSError:
+            continue
+        if seconds is not None:
+            results.append((parts[0], parts[1], parts[2], seconds))
+    return results
+
+def show_dkms_build_times() -> None:
+    """Print per-module DKMS build times and the recent wrapper log"""
+    times = get_dkms_build_times()
+    if not times:
+        print("No DKMS build logs with timing information found.")
+    for module, version, kernel, seconds in times:
+        print(f"    {module} {version} ({kernel}): {seconds}s")
+    if os.path.exists(DKMS_BUILD_LOG):
+        with open(DKMS_BUILD_LOG, "r") as f:
+            recent = f.readlines()[-5:]
+        print("\nRecent dkms runs:")
+        for line in recent:
+            print(f"    {line.rstrip()}")
+
+# Storage tuning
+IO_UDEV_RULES = "/etc/udev/rules.d/60-tweakinstall-iosched.rules"
+IO_SKIP_PREFIXES = ("loop", "ram", "zram", "dm-", "md", "sr", "nbd", "fd")
+
+# Device class -> (scheduler, read_ahead_kb)
+IO_POLICY = {
+    "nvme": ("none", 128),
+    "ssd": ("mq-deadline", 256),
+    "hdd": ("bfq", 1024),
+}
+
+# udev KERNEL globs (also valid fnmatch patterns) -> device classes the rules tune them as.
+# Both the planner and the generated rules are built from this table so they cannot drift apart.
+IO_DEVICE_PATTERNS = {
+    "nvme[0-9]*n[0-9]*": ("nvme",),
+    "sd[a-z]*": ("ssd", "hdd"),
+    "mmcblk[0-9]*": ("ssd",),
+    "vd[a-z]*": ("ssd", "hdd"),
+    "xvd[a-z]*": ("ssd", "hdd"),
+}
+IO_CLASS_COMMENTS = {
+    "nvme": "NVMe: no scheduler, the device queues are deep enough",
+    "ssd": "SATA/SAS/eMMC/virtio SSD",
+    "hdd": "Rotational disks",
+}
+
+def io_device_class(name: str, rotational: bool) -> str:
+    """Return the IO_POLICY class the udev rules give a disk, or 'other' if no rule matches it"""
+    for pattern, classes in IO_DEVICE_PATTERNS.items():
+        if fnmatch.fnmatchcase(name, pattern):
+            if "nvme" in classes:
+                return "nvme"
+            kind = "hdd" if rotational else "ssd"
+            return kind if kind in classes else "other"
+    return "other"
+
+def list_block_devices(root: str = "/") -> List[Dict]:
+    """Enumerate physical block devices and their queue settings from /sys/block"""
+    devices = []
+    for path in sorted(glob.glob(os.path.join(root, "sys/block/*"))):
+        name = os.path.basename(path)
+        if name.startswith(IO_SKIP_PREFIXES):
+            continue
+        queue = os.path.join(path, "queue")
+        schedulers = (read_text(os.path.join(queue, "scheduler")) or "").split()
+        rotational = read_text(os.path.join(queue, "rotational")) == "1"
+        devices.append({
+            "name": name,
+            "kind": io_device_class(name, rotational),
+            "scheduler": next((s.strip("[]") for s in schedulers if s.startswith("[")), "none"),
+            "available": [s.strip("[]") for s in schedulers],
+            "nr_requests": read_text(os.path.join(queue, "nr_requests")),
+            "read_ahead_kb": read_text(os.path.join(queue, "read_ahead_kb")),
+        })
+    return devices
+
+def plan_io_tuning(root: str = "/") -> List[Dict]:
+    """Return per-device target scheduler and read-ahead for the disks the udev rules match"""
+    plan = []
+    for device in list_block_devices(root):
+        if device["kind"] not in IO_POLICY:
+            continue
+        scheduler, read_ahead = IO_POLICY[device["kind"]]
+        plan.append(dict(device, target_scheduler=scheduler, target_read_ahead_kb=str(read_ahead)))
+    return plan
+
+def io_udev_rules() -> str:
+    """Generate the udev rules that apply the scheduler policy to current and future disks"""
+    lines = ["# Generated by Ubuntu25-TweakInstall: I/O scheduler and read-ahead per device class"]
+    for kind, (scheduler, read_ahead) in IO_POLICY.items():
+        kernel = "|".join(pattern for pattern, classes in IO_DEVICE_PATTERNS.items() if kind in classes)
+        rotational = {"ssd": ', ATTR{queue/rotational}=="0"', "hdd": ', ATTR{queue/rotational}=="1"'}.get(kind, "")
+        lines.append(f"# {IO_CLASS_COMMENTS[kind]}")
+        lines.append(f'ACTION=="add|change", KERNEL=="{kernel}", ENV{{DEVTYPE}}=="disk"{rotational}, '
+                     f'ATTR{{queue/scheduler}}="{scheduler}", ATTR{{queue/read_ahead_kb}}="{read_ahead}"')
+    return "\n".join(lines) + "\n"
+
+def is_io_tuning_applied() -> bool:
+    """Check if the I/O scheduler udev rules are installed"""
+    return os.path.exists(IO_UDEV_RULES)
+
+def reload_block_udev_rules() -> None:
+    """Reload udev rules and re-trigger block devices"""
+    subprocess.run(["sudo", "udevadm", "control", "--reload-rules"], check=True)
+    subprocess.run(["sudo", "udevadm", "trigger", "--action=change", "--subsystem-match=block"], check=True)
+    subprocess.run(["sudo", "udevadm", "settle"])
+
+def apply_io_tuning() -> Optional[List[Tuple[Dict, Dict]]]:
+    """Install the udev rules and return (before, after) settings per device"""
+    try:
+        before = list_block_devices()
+        if not load_state("io-tuning"):
+            save_state("io-tuning", {d["name"]: {"scheduler": d["scheduler"], "read_ahead_kb": d["read_ahead_kb"]}
+                                     for d in before})
+        write_config_file(IO_UDEV_RULES, io_udev_rules())
+        reload_block_udev_rules()
+        after = {device["name"]: device for device in list_block_devices()}
+        return [(device, after.get(device["name"], device)) for device in before]
+    except (subprocess.CalledProcessError, OSError) as e:
+        print(f"I/O tuning failed: {e}")
+        return None
+
+def revert_io_tuning() -> bool:
+    """Remove the udev rules and restore the saved per-device settings"""
+    try:
+        remove_file(IO_UDEV_RULES)
+        subprocess.run(["sudo", "udevadm", "control", "--reload-rules"], check=True)
+        writes = []
+        for name, settings in load_state("io-tuning", {}).items():
+            queue = os.path.join("/sys/block", name, "queue")
+            writes.append((os.path.join(queue, "scheduler"), settings["scheduler"]))
+            if settings["read_ahead_kb"] is not None:
+                writes.append((os.path.join(queue, "read_ahead_kb"), settings["read_ahead_kb"]))
+        for error in write_sysfs_values(writes):
+            print(f"    Could not restore {error}")
+        clear_state("io-tuning")
+        return True
+    except (subprocess.CalledProcessError, OSError) as e:
+        print(f"I/O tuning revert failed: {e}")
+        return False
+
+FSTAB_FILE = "etc/fstab"  # Relative to root so fake trees can be used
+TMPFS_MIN_RAM_KB = 8 * 1024 * 1024  # Only move /tmp to RAM on machines with 8 GiB or more
+NOATIME_FILESYSTEMS = ("ext4", "btrfs", "xfs", "f2fs")
+
+def parse_fstab(text: str) -> List[Dict]:
+    """Parse fstab into entries; comments and blank lines are kept verbatim"""
+    entries = []
+    for line in text.splitlines():
+        fields = line.split()
+        if not fields or fields[0].startswith("#") or len(fields) < 4:
+            entries.append({"raw": line})
+            continue
+        fields += ["0", "0"][len(fields) - 4:] if len(fields) < 6 else []
+        entries.append({
+            "raw": line,
+            "spec": fields[0], "file": fields[1], "vfstype": fields[2],
+            "mntops": fields[3].split(","), "freq": fields[4], "passno": fields[5],
+            "changed": False,
+        })
+    return entries
+
+def format_fstab(entries: List[Dict]) -> str:
+    """Render fstab entries, rewriting only the lines that changed"""
+    lines = []
+    for entry in entries:
+        if "spec" in entry and entry["changed"]:
+            lines.append("\t".join([entry["spec"], entry["file"], entry["vfstype"], ",".join(entry["mntops"]),
+                                    entry["freq"], entry["passno"]]))
+        else:
+            lines.append(entry["raw"])
+    return "\n".join(lines) + "\n"
+
+def read_mounts(root: str = "/") -> Dict[str, Tuple[str, List[str]]]:
+    """Read /proc/mounts into {mountpoint: (fstype, options)}"""
+    mounts = {}
+    for line in (read_text(os.path.join(root, "proc/mounts")) or "").splitlines():
+        fields = line.split()
+        if len(fields) >= 4:
+            mounts[fields[1]] = (fields[2], fields[3].split(","))
+    return mounts
+
+def propose_fstab_changes(entries: List[Dict], mounts: Dict[str, Tuple[str, List[str]]],
+                          mem_total_kb: int) -> Tuple[List[Dict], List[str], bool]:
+    """Return (updated entries, change descriptions, whether fstrim.timer should replace discard)"""
+    changes = []
+    use_fstrim = False
+    for entry in entries:
+        if "spec" not in entry or entry["vfstype"] not in NOATIME_FILESYSTEMS:
+            continue
+        options = list(entry["mntops"])
+        notes = []
+        if "noatime" not in options:
+            options = [o for o in options if o not in ("atime", "relatime", "strictatime")] + ["noatime"]
+            notes.append("noatime")
+        if entry["vfstype"] in ("ext4", "xfs") and "lazytime" not in options:
+            options.append("lazytime")
+            notes.append("lazytime")
+        if entry["vfstype"] == "ext4" and not any(o.startswith("commit=") for o in options):
+            options.append("commit=60")
+            notes.append("commit=60")
+        if entry["vfstype"] == "btrfs" and not any(o.startswith(("compress=", "compress-force=")) for o in options):
+            options.append("compress=zstd:1")
+            notes.append("compress=zstd:1")
+        if "discard" in options:
+            options.remove("discard")
+            notes.append("discard removed (fstrim.timer)")
+            use_fstrim = True
+        if notes:
+            if options and options[0] == "defaults" and len(options) > 1:
+                options = options[1:]
+            entry.update(mntops=options, changed=True)
+            changes.append(f"{entry['file']}: {', '.join(notes)}")
+
+    has_tmp = any(entry.get("file") == "/tmp" for entry in entries)
+    if not has_tmp and mounts.get("/tmp", ("",))[0] != "tmpfs" and mem_total_kb >= TMPFS_MIN_RAM_KB:
+        entries.append({"raw": "", "spec": "tmpfs", "file": "/tmp", "vfstype": "tmpfs",
+                        "mntops": ["defaults", "noatime", "nosuid", "nodev", "mode=1777", "size=25%"],
+                        "freq": "0", "passno": "0", "changed": True})
+        changes.append("/tmp: tmpfs (25% of RAM)")
+    return entries, changes, use_fstrim
+
+def plan_fstab_optimization(root: str = "/") -> Tuple[str, str, List[str], bool]:
+    """Return (current fstab, proposed fstab, change descriptions, use fstrim.timer)"""
+    with open(os.path.join(root, FSTAB_FILE), "r") as f:
+        current = f.read()
+    entries, changes, use_fstrim = propose_fstab_changes(
+        parse_fstab(current), read_mounts(root), read_meminfo(root).get("MemTotal", 0))
+    return current, format_fstab(entries), changes, use_fstrim
+
+def install_fstab(content: str, root: str = "/") -> Optional[str]:
+    """Validate a candidate fstab with findmnt --verify and swap it in atomically; returns an error or None"""
+    path = os.path.join(root, FSTAB_FILE)
+    candidate = path + ".tweakinstall.new"
+    write_config_file(candidate, content)
+    verify = subprocess.run(["findmnt", "--verify", "--tab-file", candidate], capture_output=True, text=True)
+    if verify.returncode != 0:
+        remove_file(candidate)
+        return (verify.stdout + verify.stderr).strip() or "findmnt --verify failed"
+    backup = path + ".tweakinstall.bak"
+    # Only the first apply saves a backup, so it always holds the original fstab
+    if not os.path.exists(backup):
+        shutil.copy2(path, backup)
+    os.replace(candidate, path)
+    return None
+
+def apply_fstab_optimization() -> bool:
+    """Apply the proposed mount options and enable periodic TRIM"""
+    try:
+        current, proposed, changes, use_fstrim = plan_fstab_optimization()
+        if not changes:
+            print("fstab is already optimized.")
+            return True
+        error = install_fstab(proposed)
+        if error:
+            print(f"Proposed fstab failed validation, nothing changed:\n{error}")
+            return False
+        subprocess.run(["sudo", "systemctl", "daemon-reload"], check=True)
+        subprocess.run(["sudo", "systemctl", "enable", "--now", "fstrim.timer"], check=True)
+        print("Mount options take effect at next boot (or after remounting).")
+        return True
+    except (subprocess.CalledProcessError, OSError) as e:
+        print(f"fstab optimization failed: {e}")
+        return False
+
+def rollback_fstab() -> bool:
+    """Restore the fstab saved before the last optimization"""
+    try:
+        backup = os.path.join("/", FSTAB_FILE) + ".tweakinstall.bak"
+        if not os.path.exists(backup):
+            print("No fstab backup found.")
+            return False
+        with open(backup, "r") as f:
+            error = install_fstab(f.read())
+        if error:
+            print(f"Backup fstab failed validation:\n{error}")
+            return False
+        remove_file(backup)
+        subprocess.run(["sudo", "systemctl", "daemon-reload"], check=True)
+        return True
+    except (subprocess.CalledProcessError, OSError) as e:
+        print(f"fstab rollback failed: {e}")
+        return False
+
+# Performance monitor
+MONITOR_INTERVAL = 1.0  # Seconds between samples
+MONITOR_HISTORY = 30  # Samples kept per ring buffer (one sparkline cell each)
+SPARK_CHARS = " ▁▂▃▄▅▆▇█"
+PSI_RESOURCES = ("cpu", "memory", "io")
+
+def open_monitor_fd(path: str) -> Optional[int]:
+    """Open a procfs/sysfs file once for repeated pread sampling"""
+    try:
+        return os.open(path, os.O_RDONLY | os.O_CLOEXEC)
+    except OSError:
+        return None
+
+def pread_text(fd: Optional[int], size: int = 65536) -> str:
+    """Re-read a procfs/sysfs file from offset 0 without reopening it"""
+    if fd is None:
+        return ""
+    try:
+        return os.pread(fd, size, 0).decode(errors="replace")
+    except OSError:
+        return ""
+
+def parse_proc_stat(text: str) -> Dict[str, Tuple[int, int]]:
+    """Return {cpuN: (busy jiffies, total jiffies)} from /proc/stat, 'cpu' being the aggregate"""
+    times = {}
+    for line in text.splitlines():
+        if not line.startswith("cpu"):
+            break
+        fields = line.split()
+        values = [int(v) for v in fields[1:9]]
+        idle = values[3] + values[4]  # idle + iowait
+        times[fields[0]] = (sum(values) - idle, sum(values))
+    return times
+
+def parse_psi_total(text: str) -> Optional[int]:
+    """Return the cumulative 'some' stall time in microseconds from a PSI file"""
+    for line in text.splitlines():
+        if line.startswith("some "):
+            for field in line.split():
+                if field.startswith("total="):
+                    return int(field[6:])
+    return None
+
+def parse_diskstats(text: str, devices: List[str]) -> Dict[str, Tuple[int, int, int]]:
+    """Return {device: (sectors read, sectors written, ms busy)} for the listed devices"""
+    stats = {}
+    for line in text.splitlines():
+        fields = line.split()
+        if len(fields) >= 13 and fields[2] in devices:
+            stats[fields[2]] = (int(fields[5]), int(fields[9]), int(fields[12]))
+    return stats
+
+def list_hwmon_sensors(root: str = "/") -> List[Tuple[str, str]]:
+    """Return (label, temp*_input path) for each temperature sensor"""
+    sensors = []
+    for hwmon in sorted(glob.glob(os.path.join(root, "sys/class/hwmon/hwmon*"))):
+        chip = read_text(os.path.join(hwmon, "name")) or os.path.basename(hwmon)
+        for temp_input in sorted(glob.glob(os.path.join(hwmon, "temp*_input"))):
+            label = read_text(temp_input.replace("_input", "_label"))
+            sensors.append((f"{chip} {label}" if label else chip, temp_input))
+    return sensors
+
+def open_monitor(root: str = "/") -> Dict:
+    """Open every file the monitor samples and set up its ring buffers"""
+    cpus = sorted((os.path.basename(p) for p in glob.glob(os.path.join(root, CPU_SYSFS, "cpu[0-9]*"))),
+                  key=lambda name: int(name[3:]))
+    devices = [device["name"] for device in list_block_devices(root)]
+    monitor = {
+        "cpus": cpus,
+        "devices": devices,
+        "stat": open_monitor_fd(os.path.join(root, "proc/stat")),
+        "meminfo": open_monitor_fd(os.path.join(root, "proc/meminfo")),
+        "diskstats": open_monitor_fd(os.path.join(root, "proc/diskstats")),
+        "psi": {name: open_monitor_fd(os.path.join(root, "proc/pressure", name)) for name in PSI_RESOURCES},
+        "freq": {cpu: open_monitor_fd(os.path.join(root, CPU_SYSFS, cpu, "cpufreq/scaling_cur_freq")) for cpu in cpus},
+        "temps": [(label, open_monitor_fd(path)) for label, path in list_hwmon_sensors(root)],
+        "history": {},
+        "previous": None,
+        "overhead": 0.0,
+    }
+    return monitor
+
+def close_monitor(monitor: Dict) -> None:
+    """Close every file descriptor the monitor holds"""
+    fds = [monitor["stat"], monitor["meminfo"], monitor["diskstats"]]
+    fds += list(monitor["psi"].values()) + list(monitor["freq"].values()) + [fd for _, fd in monitor["temps"]]
+    for fd in fds:
+        if fd is not None:
+            os.close(fd)
+
+def record_sample(monitor: Dict, key: str, value: float) -> None:
+    """Append a value to a fixed-size ring buffer"""
+    monitor["history"].setdefault(key, collections.deque(maxlen=MONITOR_HISTORY)).append(value)
+
+def sample_monitor(monitor: Dict) -> Optional[Dict]:
+    """Take one sample; returns rates since the previous one (None on the first call)"""
+    cpu_start = time.process_time()
+    now = time.monotonic()
+    raw = {
+        "time": now,
+        "stat": parse_proc_stat(pread_text(monitor["stat"])),
+        "psi": {name: parse_psi_total(pread_text(fd, 4096)) for name, fd in monitor["psi"].items()},
+        "disks": parse_diskstats(pread_text(monitor["diskstats"], 1 << 20), monitor["devices"]),
+    }
+    previous, monitor["previous"] = monitor["previous"], raw
+    if previous is None:
+        return None
+    elapsed = now - previous["time"]
+    sample = {"cpu": {}, "freq": {}, "psi": {}, "disks": {}, "temps": []}
+    for name, (busy, total) in raw["stat"].items():
+        old_busy, old_total = previous["stat"].get(name, (busy, total))
+        sample["cpu"][name] = 100.0 * (busy - old_busy) / (total - old_total) if total > old_total else 0.0
+        record_sample(monitor, name, sample["cpu"][name])
+    for cpu, fd in monitor["freq"].items():
+        khz = pread_text(fd, 32).strip()
+        if khz.isdigit():
+            sample["freq"][cpu] = int(khz) / 1e6
+    meminfo = parse_meminfo(pread_text(monitor["meminfo"]))
+    if meminfo.get("MemTotal"):
+        sample["mem"] = 100.0 * (1 - meminfo.get("MemAvailable", 0) / meminfo["MemTotal"])
+        record_sample(monitor, "mem", sample["mem"])
+        if meminfo.get("SwapTotal"):
+            sample["swap"] = 100.0 * (1 - meminfo.get("SwapFree", 0) / meminfo["SwapTotal"])
+    for name, total in raw["psi"].items():
+        old = previous["psi"].get(name)
+        if total is not None and old is not None:
+            # Stall microseconds per second of wall time, as a percentage
+            sample["psi"][name] = min(100.0, (total - old) / (elapsed * 1e4))
+            record_sample(monitor, f"psi:{name}", sample["psi"][name])
+    for device, (read, written, busy_ms) in raw["disks"].items():
+        old = previous["disks"].get(device)
+        if old is None:
+            continue
+        sample["disks"][device] = {
+            "read": (read - old[0]) * 512 / elapsed,
+            "write": (written - old[1]) * 512 / elapsed,
+            "util": min(100.0, (busy_ms - old[2]) / (elapsed * 10)),
+        }
+        record_sample(monitor, f"disk:{device}", sample["disks"][device]["util"])
+    for label, fd in monitor["temps"]:
+        value = pread_text(fd, 32).strip()
+        if value.lstrip("-").isdigit():
+            sample["temps"].append((label, int(value) / 1000))
+    monitor["overhead"] = 100.0 * (time.process_time() - cpu_start) / elapsed
+    return sample
+
+def sparkline(values, maximum: float = 100.0) -> str:
+    """Render values (0..maximum) as a fixed-width block sparkline"""
+    cells = [SPARK_CHARS[min(len(SPARK_CHARS) - 1, int(v / maximum * (len(SPARK_CHARS) - 1) + 0.5))]
+             for v in values]
+    return "".join(cells).rjust(MONITOR_HISTORY)
+
+def render_monitor(monitor: Dict, sample: Dict) -> str:
+    """Format a sample as a screen of per-core, memory, pressure, disk and sensor lines"""
+    history = monitor["history"]
+    lines = [f"    {'CPU':<11}{sample['cpu'].get('cpu', 0):5.1f}%  {sparkline(history.get('cpu', []))}", ""]
+    for cpu in monitor["cpus"]:
+        freq = sample["freq"].get(cpu)
+        freq_text = f"{freq:5.2f} GHz" if freq else ""
+        lines.append(f"    {cpu:<11}{sample['cpu'].get(cpu, 0):5.1f}%  {sparkline(history.get(cpu, []))}  {freq_text}")
+    lines.append("")
+    if "mem" in sample:
+        swap = f"  swap {sample['swap']:.1f}%" if "swap" in sample else ""
+        lines.append(f"    {'Memory':<11}{sample['mem']:5.1f}%  {sparkline(history['mem'])}{swap}")
+    for name in PSI_RESOURCES:
+        if name in sample["psi"]:
+            lines.append(f"    {'PSI ' + name:<11}{sample['psi'][name]:5.1f}%  {sparkline(history[f'psi:{name}'])}")
+    lines.append("")
+    for device, stats in sample["disks"].items():
+        lines.append(f"    {device:<11}{stats['util']:5.1f}%  {sparkline(history[f'disk:{device}'])}  "
+                     f"R {format_size(stats['read'])}/s  W {format_size(stats['write'])}/s")
+    if sample["temps"]:
+        lines.append("")
+        lines.append("    " + "  ".join(f"{label} {temp:.0f}C" for label, temp in sample["temps"]))
+    lines.append("")
+    lines.append(f"    Monitor overhead: {monitor['overhead']:.2f}% of one core")
+    return "\n".join(lines)
+
+# Kernel command line
+GRUB_DEFAULT_FILE = "etc/default/grub"  # Relative to root so fake trees can be used
+GRUB_CMDLINE_KEY = "GRUB_CMDLINE_LINUX_DEFAULT"
+_GRUB_PENDING = {"pending": False}  # update-grub runs once per session, after the last edit
+
+KERNEL_PARAM_SETS = {
+    "amd-pstate": {
+        "description": "AMD P-State driver in active (EPP) mode",
+        "params": {"amd_pstate": "active"},
+    },
+    "preempt-full": {
+        "description": "Full kernel preemption for low desktop/audio latency",
+        "params": {"preempt": "full"},
+    },
+    "mitigations-off": {
+        "description": "Disable CPU vulnerability mitigations (faster, LESS SECURE)",
+        "params": {"mitigations": "off"},
+    },
+    "mitigations-nosmt": {
+        "description": "Full mitigations and SMT disabled (most secure, slower)",
+        "params": {"mitigations": "auto,nosmt"},
+    },
+    "thp-madvise": {
+        "description": "Transparent hugepages only where requested (madvise)",
+        "params": {"transparent_hugepage": "madvise"},
+    },
+    "thp-always": {
+        "description": "Transparent hugepages always on",
+        "params": {"transparent_hugepage": "always"},
+    },
+    "nvidia-modeset": {
+        "description": "NVIDIA DRM kernel modesetting (Wayland, PRIME)",
+        "params": {"nvidia-drm.modeset": "1"},
+    },
+    "hugepages-1g": {
+        "description": "Reserve 1 GiB hugepages at boot (count prompted)",
+        "params": {"default_hugepagesz": "1G", "hugepagesz": "1G", "hugepages": "4"},
+    },
+    "iommu-passthrough": {
+        "description": "IOMMU enabled in passthrough mode (VFIO/KVM)",
+        "params": {"intel_iommu": "on", "iommu": "pt"},
+    },
+}
+
+def kernel_param_key(token: str) -> str:
+    """Return the normalised name of a kernel parameter ('-' and '_' are equivalent)"""
+    return token.split("=", 1)[0].replace("-", "_")
+
+def parse_grub_cmdline(text: str, key: str = GRUB_CMDLINE_KEY) -> List[str]:
+    """Return the parameter tokens of a GRUB_CMDLINE_* assignment in /etc/default/grub"""
+    for line in text.splitlines():
+        if line.startswith(f"{key}="):
+            value = line.split("=", 1)[1].strip()
+            if len(value) >= 2 and value[0] == value[-1] and value[0] in "\"'":
+                value = value[1:-1]
+            return value.split()
+    return []
+
+def set_grub_cmdline(text: str, tokens: List[str], key: str = GRUB_CMDLINE_KEY) -> str:
+    """Return /etc/default/grub content with the GRUB_CMDLINE_* assignment replaced"""
+    assignment = f'{key}="{" ".join(tokens)}"'
+    lines = text.splitlines()
+    for i, line in enumerate(lines):
+        if line.startswith(f"{key}="):
+            lines[i] = assignment
+            break
+    else:
+        lines.append(assignment)
+    return "\n".join(lines) + "\n"
+
+def read_grub_file(root: str = "/") -> str:
+    """Read /etc/default/grub"""
+    with open(os.path.join(root, GRUB_DEFAULT_FILE), "r") as f:
+        return f.read()
+
+def write_grub_file(content: str, root: str = "/") -> None:
+    """Atomically replace /etc/default/grub, keeping a one-time backup of the original"""
+    path = os.path.join(root, GRUB_DEFAULT_FILE)
+    backup = path + ".tweakinstall.bak"
+    if not os.path.exists(backup):
+        shutil.copy2(path, backup)
+    write_config_file(path, content)
+    if root == "/" and not _GRUB_PENDING["pending"]:
+        _GRUB_PENDING["pending"] = True
+        atexit.register(regenerate_grub_config)
+
+def applied_param_sets(provenance: Optional[Dict] = None, root: str = "/") -> List[str]:
+    """Return the parameter sets currently applied by this tool"""
+    provenance = provenance if provenance is not None else load_state("kernel-params", {}, state_dir_for(root))
+    return sorted({entry["set"] for entry in provenance.values()})
+
+def apply_kernel_param_set(name: str, values: Optional[Dict[str, str]] = None, root: str = "/") -> bool:
+    """Idempotently add a parameter set to the default kernel command line, recording provenance"""
+    try:
+        params = dict(KERNEL_PARAM_SETS[name]["params"], **(values or {}))
+        content = read_grub_file(root)
+        tokens = parse_grub_cmdline(content)
+        provenance = load_state("kernel-params", {}, state_dir_for(root))
+        for param, value in params.items():
+            key = kernel_param_key(param)
+            existing = [token for token in tokens if kernel_param_key(token) == key]
+            if key not in provenance:
+                # Remember what the user had so removing the set restores it
+                provenance[key] = {"previous": existing[0] if existing else None}
+            tokens = [token for token in tokens if kernel_param_key(token) != key]
+            tokens.append(f"{param}={value}")
+            provenance[key].update({"set": name, "token": f"{param}={value}"})
+        write_grub_file(set_grub_cmdline(content, tokens), root)
+        save_state("kernel-params", provenance, state_dir_for(root))
+        return True
+    except (OSError, KeyError) as e:
+        print(f"Kernel parameter update failed: {e}")
+        return False
+
+def remove_kernel_param_set(name: str, root: str = "/") -> bool:
+    """Remove the parameters a set added, restoring any value they replaced"""
+    try:
+        content = read_grub_file(root)
+        tokens = parse_grub_cmdline(content)
+        provenance = load_state("kernel-params", {}, state_dir_for(root))
+        for key in [key for key, entry in provenance.items() if entry["set"] == name]:
+            entry = provenance.pop(key)
+            tokens = [token for token in tokens if kernel_param_key(token) != key]
+            if entry["previous"]:
+                tokens.append(entry["previous"])
+        write_grub_file(set_grub_cmdline(content, tokens), root)
+        save_state("kernel-params", provenance, state_dir_for(root))
+        return True
+    except OSError as e:
+        print(f"Kernel parameter update failed: {e}")
+        return False
+
+def regenerate_grub_config() -> bool:
+    """Run update-grub once if the command line changed during this session"""
+    if not _GRUB_PENDING["pending"]:
+        return True
+    try:
+        print("\nRegenerating GRUB configuration...")
+        subprocess.run(["sudo", "update-grub"], check=True)
+        _GRUB_PENDING["pending"] = False
+        return True
+    except (subprocess.CalledProcessError, OSError) as e:
+        print(f"update-grub failed: {e}")
+        return False
+
+def normalise_kernel_token(token: str) -> str:
+    """Return a parameter token with its name normalised, for comparisons"""
+    name, sep, value = token.partition("=")
+    return kernel_param_key(name) + sep + value
+
+def kernel_param_diff(root: str = "/") -> List[Tuple[str, str]]:
+    """Compare configured parameters with /proc/cmdline; returns (token, 'reboot to apply'/'reboot to remove')"""
+    content = read_grub_file(root)
+    configured = parse_grub_cmdline(content, "GRUB_CMDLINE_LINUX") + parse_grub_cmdline(content)
+    running = (read_text(os.path.join(root, "proc/cmdline")) or "").split()
+    running_set = {normalise_kernel_token(token) for token in running}
+    configured_set = {normalise_kernel_token(token) for token in configured}
+    diff = [(token, "reboot to apply") for token in configured
+            if normalise_kernel_token(token) not in running_set]
+    # Only managed keys are reported as pending removal; the kernel adds its own (BOOT_IMAGE, root=...)
+    managed = set(load_state("kernel-params", {}, state_dir_for(root)))
+    diff += [(token, "reboot to remove") for token in running
+             if kernel_param_key(token) in managed and normalise_kernel_token(token) not in configured_set]
+    return diff
+
+# Sysctl helpers
+SYSCTL_DIR = "/etc/sysctl.d"
+
+def sysctl_path(key: str, root: str = "/") -> str:
+    """Return the /proc/sys path for a sysctl key"""
+    return os.path.join(root, "proc/sys", key.replace(".", "/"))
+
+def read_sysctl(key: str, root: str = "/") -> Optional[str]:
+    """Read a live sysctl value (whitespace normalised), or None if the key does not exist"""
+    value = read_text(sysctl_path(key, root))
+    return " ".join(value.split()) if value is not None else None
+
+def sysctl_file_content(values: Dict[str, str], title: str) -> str:
+    """Generate a sysctl.d drop-in"""
+    lines = [f"# Generated by Ubuntu25-TweakInstall: {title}"]
+    lines += [f"{key} = {value}" for key, value in values.items()]
+    return "\n".join(lines) + "\n"
+
+def parse_sysctl_errors(stderr: str) -> Dict[str, str]:
+    """Map sysctl keys to the error lines 'sysctl --system' printed for them"""
+    errors = {}
+    for line in stderr.splitlines():
+        key = None
+        if "/proc/sys/" in line:
+            # sysctl: cannot stat /proc/sys/net/foo: No such file or directory
+            key = line.split("/proc/sys/", 1)[1].split(":", 1)[0].replace("/", ".")
+        else:
+            # sysctl: setting key "net.ipv4.tcp_congestion_control": No such file or directory
+            for quote in ('"', "'"):
+                parts = line.split(quote)
+                if len(parts) >= 3:
+                    key = parts[1]
+                    break
+        if key:
+            errors[key.strip()] = line.strip()
+    return errors
+
+def reload_sysctl(keys: Optional[List[str]] = None) -> Dict[str, str]:
+    """Apply every sysctl.d file with a single sysctl --system; returns {key: error} for the given keys
+
+    sysctl exits non-zero when any key in any file fails (including files this tool did not
+    write), so only errors for the caller's own keys are reported."""
+    result = subprocess.run(["sudo", "sysctl", "--system"], stdout=subprocess.DEVNULL,
+                            stderr=subprocess.PIPE, text=True)
+    errors = parse_sysctl_errors(result.stderr)
+    return {key: errors[key] for key in (keys or []) if key in errors}
+
+def restore_sysctl_values(values: Dict[str, str], root: str = "/") -> List[str]:
+    """Write saved live values back, returning keys that could not be restored"""
+    failed = []
+    for key, value in values.items():
+        try:
+            with open(sysctl_path(key, root), "w") as f:
+                f.write(value)
+        except OSError:
+            failed.append(key)
+    return failed
+
+# Sysctl performance profiles
+SYSCTL_PROFILES = {
+    "network": {
+        "description": "Network throughput (BBR + fq, larger socket buffers)",
+        "values": {
+            "net.core.default_qdisc": "fq",
+            "net.ipv4.tcp_congestion_control": "bbr",
+            "net.core.rmem_max": "67108864",
+            "net.core.wmem_max": "67108864",
+            "net.ipv4.tcp_rmem": "4096 131072 67108864",
+            "net.ipv4.tcp_wmem": "4096 65536 67108864",
+            "net.core.netdev_max_backlog": "16384",
+            "net.ipv4.tcp_mtu_probing": "1",
+        },
+    },
+    "desktop": {
+        "description": "Desktop interactivity (smaller writeback bursts, keep dentry cache)",
+        "values": {
+            "vm.dirty_background_ratio": "5",
+            "vm.dirty_ratio": "10",
+            "vm.dirty_writeback_centisecs": "1500",
+            "vm.dirty_expire_centisecs": "3000",
+            "vm.vfs_cache_pressure": "50",
+        },
+    },
+    "developer": {
+        "description": "Developer (more inotify watches and open files)",
+        "values": {
+            "fs.inotify.max_user_watches": "524288",
+            "fs.inotify.max_user_instances": "1024",
+            "fs.file-max": "2097152",
+        },
+    },
+}
+
+def sysctl_profile_file(name: str, root: str = "/") -> str:
+    """Return the sysctl.d file that holds a profile"""
+    return os.path.join(root, SYSCTL_DIR.lstrip("/"), f"60-tweakinstall-{name}.conf")
+
+def is_sysctl_profile_applied(name: str, root: str = "/") -> bool:
+    """Check if a sysctl profile file is installed"""
+    return os.path.exists(sysctl_profile_file(name, root))
+
+def diff_sysctl_profile(name: str, root: str = "/") -> List[Tuple[str, Optional[str], str]]:
+    """Return (key, live value, profile value) for every key whose live value differs"""
+    diff = []
+    for key, target in SYSCTL_PROFILES[name]["values"].items():
+        live = read_sysctl(key, root)
+        if live != " ".join(target.split()):
+            diff.append((key, live, target))
+    return diff
+
+def apply_sysctl_profile(name: str, root: str = "/") -> bool:
+    """Write a profile's sysctl.d file, remember live values and apply with one sysctl --system"""
+    try:
+        profile = SYSCTL_PROFILES[name]
+        saved = load_state("sysctl-profiles", {}, state_dir_for(root))
+        if name not in saved:
+            saved[name] = {key: read_sysctl(key, root) for key in profile["values"]
+                           if read_sysctl(key, root) is not None}
+        write_config_file(sysctl_profile_file(name, root),
+                          sysctl_file_content(profile["values"], f"sysctl profile '{name}'"))
+        save_state("sysctl-profiles", saved, state_dir_for(root))
+        if root == "/":
+            errors = reload_sysctl(list(profile["values"]))
+            for error in errors.values():
+                print(f"    Rejected: {error}")
+            return not errors
+        return True
+    except (subprocess.CalledProcessError, OSError) as e:
+        print(f"Sysctl profile failed: {e}")
+        return False
+
+def revert_sysctl_profile(name: str, root: str = "/") -> bool:
+    """Remove a profile's sysctl.d file and restore the values that were live before it"""
+    try:
+        saved = load_state("sysctl-profiles", {}, state_dir_for(root))
+        remove_file(sysctl_profile_file(name, root))
+        for key in restore_sysctl_values(saved.pop(name, {}), root):
+            print(f"    Could not restore {key}")
+        save_state("sysctl-profiles", saved, state_dir_for(root))
+        return True
+    except OSError as e:
+        print(f"Sysctl profile revert failed: {e}")
+        return False
+
+# Memory and swap (zram)
+ZRAM_GENERATOR_CONF = "/etc/systemd/zram-generator.conf"
+ZRAM_SYSCTL_FILE = os.path.join(SYSCTL_DIR, "99-tweakinstall-zram.conf")
+ZRAM_SETUP_UNIT = "systemd-zram-setup@zram0.service"
+ZRAM_SWAP_UNIT = "dev-zram0.swap"
+ZRAM_DEVICE = "/dev/zram0"
+
+# size_ratio is applied to MemTotal; size_cap_mb bounds it for large machines
+ZRAM_PROFILES = {
+    "desktop": {
+        "description": "Desktop (half of RAM, zstd for best ratio)",
+        "size_ratio": 0.5, "size_cap_mb": 8192, "algorithm": "zstd", "swappiness": "180",
+    },
+    "build": {
+        "description": "Large builds (RAM-sized, lz4 for fastest compression)",
+        "size_ratio": 1.0, "size_cap_mb": 32768, "algorithm": "lz4", "swappiness": "180",
+    },
+    "vm": {
+        "description": "Virtual machines (half of RAM, zstd, less eager swapping)",
+        "size_ratio": 0.5, "size_cap_mb": 16384, "algorithm": "zstd", "swappiness": "100",
+    },
+}
+
+def parse_meminfo(text: str) -> Dict[str, int]:
+    """Parse /proc/meminfo content into {field: kB}"""
+    meminfo = {}
+    for line in text.splitlines():
+        key, _, value = line.partition(":")
+        fields = value.split()
+        if fields and fields[0].isdigit():
+            meminfo[key] = int(fields[0])
+    return meminfo
+
+def read_meminfo(root: str = "/") -> Dict[str, int]:
+    """Read /proc/meminfo into {field: kB}"""
+    return parse_meminfo(read_text(os.path.join(root, "proc/meminfo")) or "")
+
+def plan_zram(profile: str, root: str = "/") -> Dict:
+    """Size zram and choose swap sysctls for a workload profile from /proc/meminfo"""
+    settings = ZRAM_PROFILES[profile]
+    mem_mb = read_meminfo(root).get("MemTotal", 0) // 1024
+    size_mb = min(int(mem_mb * settings["size_ratio"]), settings["size_cap_mb"])
+    return {
+        "profile": profile,
+        "size_mb": size_mb,
+        "algorithm": settings["algorithm"],
+        "sysctl": {
+            "vm.swappiness": settings["swappiness"],
+            "vm.page-cluster": "0",  # zram reads are random access; readahead only wastes CPU
+            "vm.watermark_boost_factor": "0",
+            "vm.watermark_scale_factor": "125",
+        },
+    }
+
+def zram_generator_content(plan: Dict) -> str:
+    """Generate /etc/systemd/zram-generator.conf"""
+    return f"""# Generated by Ubuntu25-TweakInstall: zram profile '{plan['profile']}'
+[zram0]
+zram-size = {plan['size_mb']}
+compression-algorithm = {plan['algorithm']}
+swap-priority = 100
+fs-type = swap
+"""
+
+def read_zram_stats(root: str = "/") -> List[Dict]:
+    """Read per-device zram usage from /sys/block/zram*/mm_stat"""
+    stats = []
+    for device in sorted(glob.glob(os.path.join(root, "sys/block/zram*"))):
+        mm_stat = (read_text(os.path.join(device, "mm_stat")) or "").split()
+        if len(mm_stat) < 3:
+            continue
+        original, compressed, used = (int(value) for value in mm_stat[:3])
+        algorithm = read_text(os.path.join(device, "comp_algorithm")) or ""
+        selected = next((a.strip("[]") for a in algorithm.split() if a.startswith("[")), algorithm)
+        stats.append({
+            "device": os.path.basename(device),
+            "disksize": int(read_text(os.path.join(device, "disksize")) or 0),
+            "algorithm": selected,
+            "original": original,
+            "compressed": compressed,
+            "used": used,
+            "ratio": original / compressed if compressed else 0.0,
+            "saved": max(original - used, 0),
+        })
+    return stats
+
+def zram_swap_active(root: str = "/") -> bool:
+    """Check if /proc/swaps lists the zram device"""
+    lines = (read_text(os.path.join(root, "proc/swaps")) or "").splitlines()[1:]
+    return any(line.split()[0] == ZRAM_DEVICE for line in lines if line.split())
+
+def is_zram_configured() -> bool:
+    """Check if the zram tweak is applied"""
+    return os.path.exists(ZRAM_GENERATOR_CONF) and load_state("zram") is not None
+
+def apply_zram(profile: str) -> bool:
+    """Configure zram swap and its sysctls for a workload profile"""
+    try:
+        plan = plan_zram(profile)
+        if plan["size_mb"] <= 0:
+            print("Could not read MemTotal from /proc/meminfo.")
+            return False
+        if read_dpkg_status(["zram-config"]):
+            print("NOTE: zram-config package is installed and will conflict; removing it.")
+            apt_run(["apt", "remove", "-y", "zram-config"], check=True)
+        apt_run(["apt", "install", "-y", "systemd-zram-generator"], check=True)
+
+        saved = load_state("zram", {})
+        original = saved.get("original") or {key: read_sysctl(key) for key in plan["sysctl"] if read_sysctl(key) is not None}
+        write_config_file(ZRAM_GENERATOR_CONF, zram_generator_content(plan))
+        write_config_file(ZRAM_SYSCTL_FILE, sysctl_file_content(plan["sysctl"], f"zram profile '{profile}'"))
+        save_state("zram", {"profile": profile, "original": original})
+
+        subprocess.run(["sudo", "systemctl", "daemon-reload"], check=True)
+        subprocess.run(["sudo", "systemctl", "restart", ZRAM_SETUP_UNIT], check=True)
+        # The setup unit only creates the device; the generated swap unit activates it
+        subprocess.run(["sudo", "systemctl", "start", ZRAM_SWAP_UNIT], check=True)
+        if not zram_swap_active():
+            print(f"{ZRAM_DEVICE} is not listed in /proc/swaps after starting {ZRAM_SWAP_UNIT}.")
+            return False
+        errors = reload_sysctl(list(plan["sysctl"]))
+        for error in errors.values():
+            print(f"    Rejected: {error}")
+        print(f"zram0: {plan['size_mb']} MiB, {plan['algorithm']}, swap priority 100")
+        return not errors
+    except (subprocess.CalledProcessError, OSError) as e:
+        print(f"zram setup failed: {e}")
+        return False
+
+def revert_zram() -> bool:
+    """Remove the zram device, its config and restore the original swap sysctls"""
+    try:
+        saved = load_state("zram", {})
+        subprocess.run(["sudo", "systemctl", "stop", ZRAM_SWAP_UNIT])
+        subprocess.run(["sudo", "systemctl", "stop", ZRAM_SETUP_UNIT])
+        remove_file(ZRAM_GENERATOR_CONF)
+        remove_file(ZRAM_SYSCTL_FILE)
+        subprocess.run(["sudo", "systemctl", "daemon-reload"], check=True)
+        for key in restore_sysctl_values(saved.get("original", {})):
+            print(f"    Could not restore {key}")
+        clear_state("zram")
+        return True
+    except (subprocess.CalledProcessError, OSError) as e:
+        print(f"zram revert failed: {e}")
+        return False
+
+# KVM performance tuning
+KVM_TEMPLATE_DIR = os.path.join(STATE_DIR, "kvm")
+KVM_HUGEPAGES_FILE = os.path.join(SYSCTL_DIR, "60-tweakinstall-kvm-hugepages.conf")
+KVM_NAME_CHARS = set("ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789_.-")
+
+def valid_kvm_name(name: str) -> bool:
+    """Check a guest name is safe as a libvirt name and a template file name ([A-Za-z0-9_.-], no leading dot)"""
+    return bool(name) and not name.startswith(".") and set(name) <= KVM_NAME_CHARS
+
+def parse_cpu_list(text: str) -> List[int]:
+    """Expand a kernel CPU list such as '0-3,8,10-11'"""
+    cpus = []
+    for part in text.strip().split(","):
+        if "-" in part:
+            start, end = part.split("-", 1)
+            cpus.extend(range(int(start), int(end) + 1))
+        elif part:
+            cpus.append(int(part))
+    return cpus
+
+def read_cpu_topology(root: str = "/") -> List[List[int]]:
+    """Return physical cores as sorted lists of sibling CPU ids, ordered by package and core"""
+    cores = {}
+    for path in glob.glob(os.path.join(root, CPU_SYSFS, "cpu[0-9]*", "topology")):
+        siblings = read_text(os.path.join(path, "thread_siblings_list"))
+        package = read_text(os.path.join(path, "physical_package_id")) or "0"
+        if siblings:
+            cpus = tuple(parse_cpu_list(siblings))
+            cores[cpus] = (int(package), cpus[0])
+    return [list(cpus) for cpus, _ in sorted(cores.items(), key=lambda item: item[1])]
+
+def plan_vcpu_pinning(vcpus: int, cores: List[List[int]]) -> Tuple[List[int], List[int], int]:
+    """Pin vCPUs to whole host cores, keeping the first core for the host, emulator and I/O thread
+
+    Returns (host cpu per vCPU, emulator/iothread cpus, threads per core)."""
+    if vcpus < 1:
+        raise ValueError("A guest needs at least one vCPU")
+    if len(cores) < 2:
+        raise ValueError("At least two physical cores are needed for pinning")
+    threads = len(cores[0])
+    housekeeping = cores[0]
+    pins = [cpu for core in cores[1:] for cpu in core]
+    if vcpus > len(pins):
+        raise ValueError(f"Only {len(pins)} host CPUs are available for guests after reserving core 0")
+    # Whole cores keep SMT siblings together so the guest topology matches the host;
+    # odd vCPU counts fall back to a one-thread-per-core guest topology
+    if vcpus % threads:
+        threads = 1
+    return pins[:vcpus], housekeeping, threads
+
+def check_kvm_host(root: str = "/") -> Dict:
+    """Check KVM acceleration, IOMMU, nested virtualization and hugepage reservations"""
+    nested = None
+    for module in ("kvm_intel", "kvm_amd"):
+        value = read_text(os.path.join(root, "sys/module", module, "parameters/nested"))
+        if value is not None:
+            nested = value in ("Y", "1")
+    iommu_groups = os.path.join(root, "sys/kernel/iommu_groups")
+    meminfo = read_meminfo(root)
+    return {
+        "kvm": os.path.exists(os.path.join(root, "dev/kvm")),
+        "iommu": os.path.isdir(iommu_groups) and bool(os.listdir(iommu_groups)),
+        "nested": nested,
+        "hugepages_total": meminfo.get("HugePages_Total", 0),
+        "hugepages_free": meminfo.get("HugePages_Free", 0),
+        "hugepage_size_kb": meminfo.get("Hugepagesize", 2048),
+    }
+
+def plan_kvm_hugepages(guests: Dict[str, int], page_kb: int) -> int:
+    """Return the hugepages needed to back every planned guest ({name: memory MiB}), each rounded up"""
+    return sum(-(-memory_mib * 1024 // page_kb) for memory_mib in guests.values())
+
+def reserve_kvm_hugepages(name: str, memory_mib: int, hugepages: bool = True) -> Optional[int]:
+    """Record a guest's hugepage backing and reserve pages for all planned guests now and at boot
+
+    Returns pages actually allocated."""
+    guests = load_state("kvm-hugepages", {})
+    if hugepages:
+        guests[name] = memory_mib
+    elif guests.pop(name, None) is None:
+        return None  # Not backed before either; leave the reservation alone
+    try:
+        page_kb = check_kvm_host()["hugepage_size_kb"]
+        pages = plan_kvm_hugepages(guests, page_kb)
+        if guests:
+            write_config_file(KVM_HUGEPAGES_FILE, sysctl_file_content(
+                {"vm.nr_hugepages": str(pages)}, f"hugepages for {len(guests)} guest(s), {sum(guests.values())} MiB"))
+        else:
+            remove_file(KVM_HUGEPAGES_FILE)
+        with open(sysctl_path("vm.nr_hugepages"), "w") as f:
+            f.write(str(pages))
+        allocated = int(read_sysctl("vm.nr_hugepages") or 0)
+        save_state("kvm-hugepages", guests)
+        if allocated < pages:
+            print(f"Only {allocated}/{pages} hugepages could be allocated now (fragmented memory); "
+                  "the full reservation applies at next boot.")
+        return allocated
+    except OSError as e:
+        print(f"Hugepage reservation failed: {e}")
+        return None
+
+def generate_domain_xml(name: str, memory_mib: int, vcpus: int, cores: List[List[int]],
+                        disk_path: str = "", hugepages: bool = True) -> str:
+    """Generate a libvirt domain with pinning, iothreads, virtio multiqueue and Hyper-V enlightenments"""
+    pins, housekeeping, threads = plan_vcpu_pinning(vcpus, cores)
+    vcpus = len(pins)
+    housekeeping_set = ",".join(str(cpu) for cpu in housekeeping)
+    vcpupins = "\n".join(f"    <vcpupin vcpu='{i}' cpuset='{cpu}'/>" for i, cpu in enumerate(pins))
+    memory_backing = "  <memoryBacking>\n    <hugepages/>\n  </memoryBacking>\n" if hugepages else ""
+    disk = ""
+    if disk_path:
+        disk = f"""    <disk type='file' device='disk'>
+      <driver name='qemu' type='{"qcow2" if disk_path.endswith(".qcow2") else "raw"}' cache='none' io='native' discard='unmap'/>
+      <source file={quoteattr(disk_path)}/>
+      <target dev='sda' bus='scsi'/>
+    </disk>
+"""
+    return f"""<!-- Generated by Ubuntu25-TweakInstall: tuned template for {escape(name)} -->
+<domain type='kvm'>
+  <name>{escape(name)}</name>
+  <memory unit='MiB'>{memory_mib}</memory>
+  <currentMemory unit='MiB'>{memory_mib}</currentMemory>
+{memory_backing}  <vcpu placement='static'>{vcpus}</vcpu>
+  <iothreads>1</iothreads>
+  <cputune>
+{vcpupins}
+    <emulatorpin cpuset='{housekeeping_set}'/>
+    <iothreadpin iothread='1' cpuset='{housekeeping_set}'/>
+  </cputune>
+  <os>
+    <type arch='x86_64' machine='q35'>hvm</type>
+  </os>
+  <features>
+    <acpi/>
+    <apic/>
+    <hyperv mode='custom'>
+      <relaxed state='on'/>
+      <vapic state='on'/>
+      <spinlocks state='on' retries='8191'/>
+      <vpindex state='on'/>
+      <runtime state='on'/>
+      <synic state='on'/>
+      <stimer state='on'/>
+      <reset state='on'/>
+      <frequencies state='on'/>
+      <tlbflush state='on'/>
+      <ipi state='on'/>
+    </hyperv>
+  </features>
+  <cpu mode='host-passthrough' check='none' migratable='on'>
+    <topology sockets='1' dies='1' cores='{vcpus // threads}' threads='{threads}'/>
+  </cpu>
+  <clock offset='localtime'>
+    <timer name='rtc' tickpolicy='catchup'/>
+    <timer name='pit' tickpolicy='delay'/>
+    <timer name='hpet' present='no'/>
+    <timer name='hypervclock' present='yes'/>
+  </clock>
+  <devices>
+    <controller type='scsi' index='0' model='virtio-scsi'>
+      <driver queues='{vcpus}' iothread='1'/>
+    </controller>
+{disk}    <interface type='network'>
+      <source network='default'/>
+      <model type='virtio'/>
+      <driver name='vhost' queues='{vcpus}'/>
+    </interface>
+  </devices>
+</domain>
+"""
+
+def validate_domain_xml(path: str) -> Tuple[Optional[bool], str]:
+    """Validate a domain XML file with virt-xml-validate (None when the tool is missing)"""
+    if require_binary("virt-xml-validate") is None:
+        return None, "virt-xml-validate not found (install libvirt-clients)"
+    result = subprocess.run(["virt-xml-validate", path, "domain"], capture_output=True, text=True,
+                            timeout=ACTION_TIMEOUT)
+    return result.returncode == 0, (result.stdout + result.stderr).strip()
+
+def create_kvm_template(name: str, memory_mib: int, vcpus: int, disk_path: str = "",
+                        hugepages: bool = True) -> Optional[str]:
+    """Write a tuned domain template and validate it; returns the file path"""
+    if not valid_kvm_name(name):
+        print("Guest names may only use letters, digits, '_', '.' and '-', and cannot start with '.'.")
+        return None
+    if memory_mib < 1 or vcpus < 1:
+        print("Guest memory and vCPUs must be at least 1.")
+        return None
+    try:
+        content = generate_domain_xml(name, memory_mib, vcpus, read_cpu_topology(), disk_path, hugepages)
+        path = os.path.join(KVM_TEMPLATE_DIR, f"{name}.xml")
+        write_config_file(path, content)
+        valid, output = validate_domain_xml(path)
+        if valid is False:
+            print(f"Validation failed:\n{output}")
+            return None
+        print(output)
+        return path
+    except (ValueError, OSError, subprocess.TimeoutExpired) as e:
+        print(f"KVM template failed: {e}")
+        return None
+
+# Boot analysis
+BOOT_DELAY_SECONDS = 30  # Delayed units start this long after boot, once the desktop is up
+BOOT_DROPIN_NAME = "90-tweakinstall-delay.conf"
+
+# Services this tool enables, with the sockets that can start them on demand
+BOOT_MANAGED_UNITS = {
+    "snapd.service": {"enabled_by": "Software managers (snapd)", "sockets": ["snapd.socket"]},
+    "libvirtd.service": {"enabled_by": "Virtualization packages (libvirt)",
+                         "sockets": ["libvirtd.socket", "libvirtd-ro.socket", "libvirtd-admin.socket"]},
+    "opensnitch.service": {"enabled_by": "OpenSnitch firewall", "sockets": []},
+}
+
+TIME_UNITS = {"h": 3600.0, "min": 60.0, "s": 1.0, "ms": 1e-3, "us": 1e-6, "µs": 1e-6}
+
+def parse_time_span(text: str) -> Optional[float]:
+    """Parse a systemd time span such as '1min 2.345s' or '345ms' into seconds"""
+    total = 0.0
+    for token in text.split():
+        number = token.rstrip("hminsuµ")
+        unit = token[len(number):]
+        if unit not in TIME_UNITS:
+            return None
+        try:
+            total += float(number) * TIME_UNITS[unit]
+        except ValueError:
+            return None
+    return total if text.strip() else None
+
+def parse_blame(output: str) -> List[Tuple[str, float]]:
+    """Parse 'systemd-analyze blame' into [(unit, seconds)], slowest first"""
+    rows = []
+    for line in output.splitlines():
+        fields = line.split()
+        if len(fields) < 2:
+            continue
+        seconds = parse_time_span(" ".join(fields[:-1]))
+        if seconds is not None:
+            rows.append((fields[-1], seconds))
+    return rows
+
+def strip_tree_glyphs(line: str) -> str:
+    """Strip the tree drawing in front of a unit name, in both the UTF-8 and the ASCII glyph sets"""
+    text = line.lstrip(" │")
+    while text.startswith("| "):
+        text = text[1:].lstrip(" │")
+    # The unit itself may start with '-' (-.mount), so only a whole branch glyph is removed
+    if text[:2] in ("└─", "├─", "`-", "|-"):
+        text = text[2:]
+    return text
+
+def parse_critical_chain(output: str) -> List[Dict]:
+    """Parse 'systemd-analyze critical-chain' into [{unit, at, took}] from the top of the tree"""
+    chain = []
+    for line in output.splitlines():
+        line = strip_tree_glyphs(line)
+        if " @" not in line:
+            continue
+        unit, _, timing = line.partition(" @")
+        at, _, took = timing.partition(" +")
+        chain.append({"unit": unit.strip(), "at": parse_time_span(at), "took": parse_time_span(took) if took else 0.0})
+    return chain
+
+def parse_boot_time(output: str) -> Dict[str, Optional[float]]:
+    """Parse 'systemd-analyze time' into the total and per-phase (firmware, loader, kernel, initrd, userspace) seconds"""
+    times = {"total": None, "userspace": None}
+    for line in output.splitlines():
+        if "=" in line and line.startswith("Startup finished"):
+            times["total"] = parse_time_span(line.rsplit("=", 1)[1])
+            for part in line.rsplit("=", 1)[0].split(" in ", 1)[1].split("+"):
+                span, _, phase = part.strip().rpartition(" (")
+                if phase.endswith(")"):
+                    times[phase[:-1]] = parse_time_span(span)
+    return times
+
+def attribute_boot_delays(blame: List[Tuple[str, float]], chain: List[Dict]) -> List[Dict]:
+    """Pick out units this tool enabled or generated, noting whether they hold up the critical chain"""
+    on_chain = {entry["unit"] for entry in chain}
+    rows = []
+    for unit, seconds in blame:
+        if unit in BOOT_MANAGED_UNITS:
+            source = BOOT_MANAGED_UNITS[unit]["enabled_by"]
+        elif unit.startswith("tweakinstall-") or unit.startswith("systemd-zram-setup"):
+            source = "Ubuntu25-TweakInstall generated unit"
+        else:
+            continue
+        rows.append({"unit": unit, "seconds": seconds, "critical": unit in on_chain, "source": source})
+    return rows
+
+def analyze_boot() -> Optional[Dict]:
+    """Run systemd-analyze and return the parsed boot report, or None when it is unavailable"""
+    if require_binary("systemd-analyze") is None:
+        return None
+    time_output = run_probe("systemd-analyze", ["systemd-analyze", "time"], timeout=30)
+    if time_output is None:
+        # Fails while the boot is still in progress
+        return None
+    blame = parse_blame(run_probe("systemd-analyze", ["systemd-analyze", "blame", "--no-pager"], timeout=30) or "")
+    chain = parse_critical_chain(run_probe("systemd-analyze", ["systemd-analyze", "critical-chain", "--no-pager"],
+                                           timeout=30) or "")
+    report = parse_boot_time(time_output)
+    report.update({"blame": blame, "chain": chain, "attributed": attribute_boot_delays(blame, chain)})
+    return report
+
+def unit_enabled_state(unit: str) -> Optional[str]:
+    """Return 'systemctl is-enabled' for a unit (enabled, disabled, static...), or None if unknown"""
+    try:
+        result = subprocess.run(["systemctl", "is-enabled", unit], capture_output=True, text=True,
+                                timeout=PROBE_TIMEOUT)
+    except (subprocess.TimeoutExpired, OSError):
+        return None
+    return result.stdout.strip() or None
+
+def delay_timer_name(unit: str) -> str:
+    """Return the generated timer that starts a delayed unit"""
+    return f"tweakinstall-delay-{unit.rsplit('.', 1)[0]}.timer"
+
+def switch_to_socket_activation(unit: str) -> bool:
+    """Stop starting a service at boot and let its sockets start it on first use"""
+    sockets = BOOT_MANAGED_UNITS.get(unit, {}).get("sockets", [])
+    if not sockets:
+        print(f"{unit} has no activation socket; use a delayed start instead.")
+        return False
+    tweaks = load_state("boot-tweaks", {})
+    try:
+        enabled_before = [s for s in sockets if unit_enabled_state(s) == "enabled"]
+        # Disable first: a service's Also= lists its sockets, so disabling it afterwards would switch them off again
+        subprocess.run(["sudo", "systemctl", "disable", unit], check=True)
+        subprocess.run(["sudo", "systemctl", "enable"] + sockets, check=True)
+        not_enabled = [s for s in sockets if unit_enabled_state(s) != "enabled"]
+        if not_enabled:
+            print(f"Sockets did not stay enabled ({', '.join(not_enabled)}); re-enabling {unit}.")
+            subprocess.run(["sudo", "systemctl", "enable", unit], check=True)
+            return False
+        tweaks[unit] = {"mode": "socket", "sockets_enabled": [s for s in sockets if s not in enabled_before]}
+        save_state("boot-tweaks", tweaks)
+        return True
+    except subprocess.CalledProcessError as e:
+        print(f"Failed to switch {unit} to socket activation: {e}")
+        return False
+
+def delay_unit_start(unit: str, seconds: int = BOOT_DELAY_SECONDS) -> bool:
+    """Start a service from a timer after boot, ordered after graphical.target"""
+    timer = delay_timer_name(unit)
+    # The unit must leave multi-user.target.wants: that target is ordered after
+    # its wants, so After=graphical.target alone would form an ordering cycle
+    timer_content = (
+        "# Generated by Ubuntu25-TweakInstall: delayed start\n"
+        "[Unit]\n"
+        f"Description=Delayed start of {unit}\n\n"
+        "[Timer]\n"
+        f"OnBootSec={seconds}s\n"
+        f"Unit={unit}\n\n"
+        "[Install]\n"
+        "WantedBy=timers.target\n"
+    )
+    dropin = ("# Generated by Ubuntu25-TweakInstall: start after the desktop is up\n"
+              "[Unit]\n"
+              "After=graphical.target\n")
+    tweaks = load_state("boot-tweaks", {})
+    try:
+        subprocess.run(["sudo", "systemctl", "disable", unit], check=True)
+        write_config_file(os.path.join(SYSTEMD_UNIT_DIR, f"{unit}.d", BOOT_DROPIN_NAME), dropin)
+        install_systemd_unit(timer, timer_content)
+        tweaks[unit] = {"mode": "delay", "timer": timer}
+        save_state("boot-tweaks", tweaks)
+        return True
+    except (subprocess.CalledProcessError, OSError) as e:
+        print(f"Failed to delay {unit}: {e}")
+        return False
+
+def revert_boot_tweak(unit: str) -> bool:
+    """Restore a unit to starting at boot"""
+    tweaks = load_state("boot-tweaks", {})
+    tweak = tweaks.get(unit)
+    if tweak is None:
+        print(f"No boot change recorded for {unit}.")
+        return False
+    try:
+        if tweak["mode"] == "delay":
+            remove_systemd_unit(tweak["timer"])
+            remove_file(os.path.join(SYSTEMD_UNIT_DIR, f"{unit}.d", BOOT_DROPIN_NAME))
+            subprocess.run(["sudo", "systemctl", "daemon-reload"], check=True)
+        elif tweak.get("sockets_enabled"):
+            subprocess.run(["sudo", "systemctl", "disable"] + tweak["sockets_enabled"], check=True)
+        subprocess.run(["sudo", "systemctl", "enable", unit], check=True)
+    except subprocess.CalledProcessError as e:
+        print(f"Failed to restore {unit}: {e}")
+        return False
+    del tweaks[unit]
+    save_state("boot-tweaks", tweaks)
+    return True
+
+# Logging
+RSYSLOG_FILTER_FILE = "/etc/rsyslog.d/10-tweakinstall-filters.conf"
+LEGACY_RSYSLOG_FILTERS = {"/etc/rsyslog.d/10-notepadqq.conf": "notepadqq"}
+JOURNALD_DROPIN = "/etc/systemd/journald.conf.d/90-tweakinstall.conf"
+JOURNALD_DEFAULTS = {"SystemMaxUse": "500M", "RateLimitBurst": "1000"}
+SIZE_SUFFIXES = {"B": 1, "K": 1024, "M": 1024 ** 2, "G": 1024 ** 3, "T": 1024 ** 4}
+LOG_PROGRAM_CHARS = set("ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789_.-")
+NOTEPADQQ_LOG_PROGRAMS = ["notepadqq", "notepadqq-bin"]  # Launcher script and the binary it runs
+
+def valid_log_program(program: str) -> bool:
+    """Check a syslog program name is safe to put in an rsyslog filter ([A-Za-z0-9_.-])"""
+    return bool(program) and set(program) <= LOG_PROGRAM_CHARS
+
+def rsyslog_filter_content(programs: List[str]) -> str:
+    """Return the rsyslog filter file that discards messages from noisy programs"""
+    lines = ["# Generated by Ubuntu25-TweakInstall: messages from these programs are discarded"]
+    # isequal, not contains: a short name would otherwise match (and drop) most of syslog
+    lines += [f':programname, isequal, "{program}" stop' for program in programs if valid_log_program(program)]
+    return "\n".join(lines) + "\n"
+
+def get_log_filters() -> List[str]:
+    """Return the programs whose messages rsyslog discards, including legacy per-program files"""
+    programs = load_state("log-filters", [])
+    for path, program in LEGACY_RSYSLOG_FILTERS.items():
+        if os.path.exists(path) and program not in programs:
+            programs.append(program)
+    return programs
+
+def reload_log_service(service: str) -> None:
+    """Apply a logging config change with a reload where the service supports one"""
+    # rsyslog re-reads its config only on restart; syslog.socket holds messages meanwhile
+    subprocess.run(["sudo", "systemctl", "try-reload-or-restart", service], check=True)
+
+def write_log_filters(programs: List[str]) -> bool:
+    """Write (or remove) the shared filter file, fold in legacy files and reload rsyslog"""
+    try:
+        if programs:
+            write_config_file(RSYSLOG_FILTER_FILE, rsyslog_filter_content(programs))
+        else:
+            remove_file(RSYSLOG_FILTER_FILE)
+        for path in LEGACY_RSYSLOG_FILTERS:
+            remove_file(path)
+        save_state("log-filters", programs)
+        reload_log_service("rsyslog")
+        return True
+    except (subprocess.CalledProcessError, OSError) as e:
+        print(f"Failed to update log filters: {e}")
+        return False
+
+def add_log_filters(names: List[str]) -> bool:
+    """Discard rsyslog messages from programs with exactly these names"""
+    invalid = [name for name in names if not valid_log_program(name)]
+    if invalid:
+        print(f"Program names may only use letters, digits, '_', '.' and '-': {', '.join(invalid)}")
+        return False
+    programs = get_log_filters()
+    programs += [name for name in names if name not in programs]
+    return write_log_filters(programs)
+
+def remove_log_filters(names: List[str]) -> bool:
+    """Stop discarding rsyslog messages from programs"""
+    return write_log_filters([p for p in get_log_filters() if p not in names])
+
+def read_journald_settings(path: str = JOURNALD_DROPIN) -> Dict[str, str]:
+    """Return the [Journal] settings from this tool's journald drop-in"""
+    settings = {}
+    for line in (read_text(path) or "").splitlines():
+        key, sep, value = line.partition("=")
+        if sep and not line.startswith("#"):
+            settings[key.strip()] = value.strip()
+    return settings
+
+def set_journald_limits(max_use: str = JOURNALD_DEFAULTS["SystemMaxUse"],
+                        rate_limit_burst: str = JOURNALD_DEFAULTS["RateLimitBurst"],
+                        volatile: bool = False) -> bool:
+    """Cap journal size and message bursts, optionally keeping the journal in RAM only"""
+    lines = ["# Generated by Ubuntu25-TweakInstall: journal size and rate limits", "[Journal]",
+             f"SystemMaxUse={max_use}", f"RateLimitBurst={rate_limit_burst}"]
+    if volatile:
+        # No journal writes to disk at all; logs are lost on reboot
+        lines += ["Storage=volatile", f"RuntimeMaxUse={max_use}"]
+    try:
+        write_config_file(JOURNALD_DROPIN, "\n".join(lines) + "\n")
+        reload_log_service("systemd-journald")
+        return True
+    except (subprocess.CalledProcessError, OSError) as e:
+        print(f"Failed to apply journald limits: {e}")
+        return False
+
+def revert_journald_limits() -> bool:
+    """Remove the journald drop-in and return to the distribution defaults"""
+    try:
+        if remove_file(JOURNALD_DROPIN):
+            reload_log_service("systemd-journald")
+        return True
+    except subprocess.CalledProcessError as e:
+        print(f"Failed to reload journald: {e}")
+        return False
+
+def parse_size(text: str) -> Optional[int]:
+    """Parse a size such as '1.2G' or '512.0M' (binary units) into bytes"""
+    text = text.strip().upper().rstrip("B") or "0"
+    suffix = text[-1] if text[-1] in SIZE_SUFFIXES else "B"
+    try:
+        return int(float(text.rstrip("KMGT")) * SIZE_SUFFIXES[suffix])
+    except ValueError:
+        return None
+
+def parse_journal_disk_usage(output: str) -> Optional[int]:
+    """Parse 'journalctl --disk-usage' output into bytes"""
+    marker = " take up "
+    if marker not in output:
+        return None
+    return parse_size(output.split(marker, 1)[1].split()[0])
+
+def journal_disk_usage() -> Optional[int]:
+    """Return the bytes used by archived and active journal files"""
+    output = run_probe("journalctl", ["journalctl", "--disk-usage"], timeout=ACTION_TIMEOUT)
+    return parse_journal_disk_usage(output) if output else None
+
+def record_journal_usage() -> Optional[Tuple[int, Optional[float]]]:
+    """Record the journal size and return (bytes, bytes/s since the previous record)"""
+    usage = journal_disk_usage()
+    if usage is None:
+        return None
+    previous = load_state("log-usage")
+    now = time.time()
+    save_state("log-usage", {"time": now, "bytes": usage})
+    if not previous or usage < previous["bytes"] or now <= previous["time"]:
+        # Rotation or vacuuming shrank the journal; no usable delta
+        return usage, None
+    return usage, (usage - previous["bytes"]) / (now - previous["time"])
+
+def measure_log_rate(seconds: int = 60) -> Optional[float]:
+    """Measure the journal growth rate in bytes/s over a fixed window"""
+    start = journal_disk_usage()
+    if start is None:
+        return None
+    time.sleep(seconds)
+    end = journal_disk_usage()
+    if end is None or end < start:
+        return None
+    return (end - start) / seconds
+
+# System tweaks
+def check_sudo_nopasswd() -> Optional[bool]:
+    """Check if sudo password prompt is disabled (None when the 0440 sudoers file cannot be read)"""
+    if not os.path.exists("/etc/sudoers.d/nopasswd"):
+        return False
+    
+    user = get_target_user()
+    try:
+        with open("/etc/sudoers.d/nopasswd", "r") as f:
+            return f"{user} ALL=(ALL) NOPASSWD: ALL" in f.read()
+    except OSError:
+        return None
+
+def toggle_sudo_nopasswd() -> bool:
+    """Toggle sudo password requirement"""
+    try:
+        user = os.getenv("SUDO_USER", os.getlogin())
+        if check_sudo_nopasswd():
+            subprocess.run(["sudo", "rm", "/etc/sudoers.d/nopasswd"], check=True)
+            print("WARNING: Sudo password protection ENABLED")
         else:
             # Use secure temp file
             with tempfile.NamedTemporaryFile(mode="w", delete=False) as f:
@@ -672,7 +3757,7 @@ def check_auto_login() -> bool:
     if not os.path.exists("/etc/gdm3/custom.conf"):
         return False
     
-    user = os.getenv("SUDO_USER", os.getlogin())
+    user = get_target_user()
     with open("/etc/gdm3/custom.conf", "r") as f:
         return f"AutomaticLogin={user}" in f.read()
 
@@ -697,139 +3782,916 @@ def toggle_auto_login() -> bool:
         print(f"Auto-login toggle failed: {e}")
         return False
 
-def check_windows_commands() -> bool:
-    """Check if Windows-like commands are installed"""
-    return os.path.exists("/etc/profile.d/windows_commands.sh")
-
-def implement_windows_commands() -> bool:
-    """Install Windows-like command aliases"""
-    try:
-        with open("/tmp/windows_commands.sh", "w") as f:
-            f.write("""\
-function dir() { ls -l "$@"; }
-function copy() { cp -i "$@"; }
-function move() { mv -i "$@"; }
-function del() { rm -i "$@"; }
-function md() { mkdir -p "$@"; }
-function rd() { rmdir "$@"; }
-function cls() { clear; }
-function type() { cat "$@"; }
-function where() { which "$@"; }
-function echo() { printf "%s\\n" "$*"; }
-function shutdown() { sudo shutdown -h now; }
-function restart() { sudo shutdown -r now; }
-""")
-        subprocess.run([
-            "sudo", "mv", "/tmp/windows_commands.sh",
-            "/etc/profile.d/windows_commands.sh"
-        ], check=True)
-        subprocess.run([
-            "sudo", "chmod", "+x",
-            "/etc/profile.d/windows_commands.sh"
-        ], check=True)
+WINCMD_PATH = "/usr/local/bin/wincmd"
+LEGACY_WINDOWS_COMMANDS = "/etc/profile.d/windows_commands.sh"
+# echo and type stay native: both are shell builtins, which a PATH executable can never (and must not) replace.
+# dir and shutdown are real Linux commands, so they get a win prefix instead of shadowing them
+WINDOWS_COMMANDS = ("windir", "copy", "move", "del", "md", "rd", "cls", "where", "winshutdown", "restart")
+RETIRED_WINDOWS_COMMANDS = ("dir", "shutdown")  # Links made by earlier versions, removed on install
+SYSTEM_BIN_DIRS = ["/usr/local/sbin", "/usr/local/bin", "/usr/sbin", "/usr/bin", "/sbin", "/bin", "/snap/bin"]
+
+WINCMD_SCRIPT = """\
+#!/bin/sh
+# Generated by Ubuntu25-TweakInstall: multi-call dispatcher for Windows-like commands
+# Invoked through symlinks in /usr/local/bin; translates /switches to Linux options,
+# anything else (including -options) is passed through unchanged
+name=$(basename "$0")
+case "$name" in
+windir)
+    format="-l"; extra=""
+    for arg in "$@"; do
+        shift
+        case "$arg" in
+        /[sS]) extra="$extra -R" ;;
+        /[aA]*) extra="$extra -a" ;;
+        /[bB]) format="-1" ;;
+        /[wW]) format="-C" ;;
+        *) set -- "$@" "$arg" ;;
+        esac
+    done
+    exec ls $format $extra "$@" ;;
+copy|move)
+    prompt="-i"
+    for arg in "$@"; do
+        shift
+        case "$arg" in
+        /[yY]) prompt="" ;;
+        /-[yY]) prompt="-i" ;;
+        /[vV]) ;;
+        *) set -- "$@" "$arg" ;;
+        esac
+    done
+    [ "$name" = copy ] && exec cp $prompt "$@"
+    exec mv $prompt "$@" ;;
+del)
+    prompt="-i"; extra=""
+    for arg in "$@"; do
+        shift
+        case "$arg" in
+        /[qQ]) prompt="" ;;
+        /[sS]) extra="$extra -r" ;;
+        /[fF]) extra="$extra -f" ;;
+        /[pP]) prompt="-i" ;;
+        *) set -- "$@" "$arg" ;;
+        esac
+    done
+    exec rm $prompt $extra "$@" ;;
+md)
+    exec mkdir -p "$@" ;;
+rd)
+    tree=""; prompt="-I"
+    for arg in "$@"; do
+        shift
+        case "$arg" in
+        /[sS]) tree=1 ;;
+        /[qQ]) prompt="" ;;
+        *) set -- "$@" "$arg" ;;
+        esac
+    done
+    [ -n "$tree" ] && exec rm -r $prompt "$@"
+    exec rmdir "$@" ;;
+cls)
+    exec clear ;;
+where)
+    exec which -a "$@" ;;
+winshutdown|restart)
+    action=""; when=""; switches=""; expect_time=""
+    [ "$name" = restart ] && action="-r"
+    for arg in "$@"; do
+        shift
+        if [ -n "$expect_time" ]; then
+            expect_time=""
+            [ "$arg" -gt 0 ] 2>/dev/null && when="+$(( (arg + 59) / 60 ))"
+            continue
+        fi
+        case "$arg" in
+        /[rR]) action="-r"; switches=1 ;;
+        /[sS]) action="-h"; switches=1 ;;
+        /[aA]) exec sudo /usr/sbin/shutdown -c ;;
+        /[tT]) expect_time=1; switches=1 ;;
+        *) set -- "$@" "$arg" ;;
+        esac
+    done
+    if [ -n "$switches" ] || [ $# -eq 0 ]; then
+        exec sudo /usr/sbin/shutdown ${action:--h} "${when:-now}" "$@"
+    fi
+    exec sudo /usr/sbin/shutdown $action "$@" ;;
+*)
+    echo "wincmd: unknown command name '$name'" >&2
+    exit 1 ;;
+esac
+"""
+
+def windows_command_conflict(name: str, bin_dir: str = "/usr/local/bin",
+                             search_dirs: Optional[List[str]] = None) -> Optional[str]:
+    """Return the existing program a Windows-like command name would clash with, or None if the name is free"""
+    wincmd = os.path.realpath(os.path.join(bin_dir, os.path.basename(WINCMD_PATH)))
+    link = os.path.join(bin_dir, name)
+    if os.path.lexists(link) and os.path.realpath(link) != wincmd:
+        return link
+    if search_dirs is None:
+        search_dirs = os.environ.get("PATH", "").split(os.pathsep) + SYSTEM_BIN_DIRS
+    for directory in dict.fromkeys(search_dirs):
+        if not directory or os.path.realpath(directory) == os.path.realpath(bin_dir):
+            continue
+        candidate = os.path.join(directory, name)
+        if os.path.isfile(candidate) and os.access(candidate, os.X_OK):
+            return candidate
+    return None
+
+def links_to_wincmd(link: str, bin_dir: str) -> bool:
+    """Check if a path is a symlink to the dispatcher in bin_dir"""
+    wincmd = os.path.realpath(os.path.join(bin_dir, os.path.basename(WINCMD_PATH)))
+    return os.path.islink(link) and os.path.realpath(link) == wincmd
+
+def check_windows_commands(bin_dir: str = "/usr/local/bin",
+                           search_dirs: Optional[List[str]] = None) -> bool:
+    """Check if the dispatcher is installed with a link for every name that does not clash with a real program"""
+    if not os.path.isfile(os.path.join(bin_dir, os.path.basename(WINCMD_PATH))):
+        return False
+    if any(links_to_wincmd(os.path.join(bin_dir, name), bin_dir) for name in RETIRED_WINDOWS_COMMANDS):
+        return False
+    return all(links_to_wincmd(os.path.join(bin_dir, name), bin_dir)
+               or windows_command_conflict(name, bin_dir, search_dirs)
+               for name in WINDOWS_COMMANDS)
+
+def implement_windows_commands(bin_dir: str = "/usr/local/bin",
+                               search_dirs: Optional[List[str]] = None) -> bool:
+    """Install the Windows-like command dispatcher and replace the legacy profile.d functions"""
+    wincmd = os.path.join(bin_dir, os.path.basename(WINCMD_PATH))
+    try:
+        write_config_file(wincmd, WINCMD_SCRIPT, 0o755)
+        for name in RETIRED_WINDOWS_COMMANDS:
+            link = os.path.join(bin_dir, name)
+            if links_to_wincmd(link, bin_dir):
+                os.remove(link)
+                print(f"Removed {link}, which shadowed the system command")
+        for name in WINDOWS_COMMANDS:
+            link = os.path.join(bin_dir, name)
+            if links_to_wincmd(link, bin_dir):
+                continue
+            conflict = windows_command_conflict(name, bin_dir, search_dirs)
+            if conflict:
+                print(f"Skipping {name}: {conflict} is already installed")
+                continue
+            os.symlink(os.path.basename(wincmd), link)
+        if remove_file(LEGACY_WINDOWS_COMMANDS):
+            print(f"Removed legacy shell functions: {LEGACY_WINDOWS_COMMANDS}")
+            print("Open a new terminal to drop the old functions from your session.")
         return True
-    except subprocess.CalledProcessError as e:
+    except OSError as e:
         print(f"Windows commands setup failed: {e}")
         return False
 
+MEDIA_KEYS_SCHEMA = "org.gnome.settings-daemon.plugins.media-keys"
+CUSTOM_KEYBINDING_SCHEMA = "org.gnome.settings-daemon.plugins.media-keys.custom-keybinding"
+CUSTOM_KEYBINDING_PATH = "/org/gnome/settings-daemon/plugins/media-keys/custom-keybindings/custom0/"
+
 def check_windows_shortcuts() -> bool:
     """Check if Windows-like shortcuts (Super+E for Nautilus) are configured"""
-    try:
-        user = os.getenv("SUDO_USER", os.getlogin())
-        uid = subprocess.check_output(["id", "-u", user]).decode().strip()
-        bus_addr = f"unix:path=/run/user/{uid}/bus"
-        
-        # Check if Super+E is bound to Nautilus
-        output = subprocess.check_output([
-            "sudo", "-u", user, f"DBUS_SESSION_BUS_ADDRESS={bus_addr}",
-            "gsettings", "get",
-            "org.gnome.settings-daemon.plugins.media-keys.custom-keybinding:/org/gnome/settings-daemon/plugins/media-keys/custom-keybindings/custom0/",
-            "binding"
-        ], text=True).strip()
-        
-        return output == "'<Super>e'"
-    except:
-        return False
+    output = gsettings_get(f"{CUSTOM_KEYBINDING_SCHEMA}:{CUSTOM_KEYBINDING_PATH}", "binding")
+    return output == "'<Super>e'"
+
+def windows_shortcut_settings() -> List[Tuple[str, str, str]]:
+    """Return the gsettings writes for Super+E opening Nautilus"""
+    custom_schema = f"{CUSTOM_KEYBINDING_SCHEMA}:{CUSTOM_KEYBINDING_PATH}"
+    return [
+        (MEDIA_KEYS_SCHEMA, "custom-keybindings", f"['{CUSTOM_KEYBINDING_PATH}']"),
+        (custom_schema, "name", "'File Explorer'"),
+        (custom_schema, "command", "'nautilus --new-window'"),
+        (custom_schema, "binding", "'<Super>e'"),
+    ]
 
-def set_windows_shortcuts() -> bool:
+def set_windows_shortcuts(user: Optional[str] = None, offline: bool = False) -> bool:
     """Configure Windows-like keyboard shortcuts (Super+E for Nautilus)"""
     try:
-        user = os.getenv("SUDO_USER", os.getlogin())
-        uid = subprocess.check_output(["id", "-u", user]).decode().strip()
-        bus_addr = f"unix:path=/run/user/{uid}/bus"
-        
         # Create shortcuts directory if not exists
-        shortcuts_dir = f"{HOME_DIR}/.local/share/applications"
+        home = pwd.getpwnam(user).pw_dir if user else HOME_DIR
+        shortcuts_dir = f"{home}/.local/share/applications"
         os.makedirs(shortcuts_dir, exist_ok=True)
+        chown_to_user(shortcuts_dir, user or get_target_user())
         
-        # Configure keyboard shortcuts
-        subprocess.run([
-            "sudo", "-u", user, f"DBUS_SESSION_BUS_ADDRESS={bus_addr}",
-            "gsettings", "set", "org.gnome.settings-daemon.plugins.media-keys",
-            "custom-keybindings", "['/org/gnome/settings-daemon/plugins/media-keys/custom-keybindings/custom0/']"
-        ], check=True)
-        
-        # Set Super+E shortcut for Nautilus
-        base_path = "org.gnome.settings-daemon.plugins.media-keys.custom-keybinding"
-        custom_path = "/org/gnome/settings-daemon/plugins/media-keys/custom-keybindings/custom0/"
-        
-        subprocess.run([
-            "sudo", "-u", user, f"DBUS_SESSION_BUS_ADDRESS={bus_addr}",
-            "gsettings", "set", f"{base_path}:{custom_path}",
-            "name", "'File Explorer'"
-        ], check=True)
-        
-        subprocess.run([
-            "sudo", "-u", user, f"DBUS_SESSION_BUS_ADDRESS={bus_addr}",
-            "gsettings", "set", f"{base_path}:{custom_path}",
-            "command", "'nautilus --new-window'"
-        ], check=True)
-        
-        subprocess.run([
-            "sudo", "-u", user, f"DBUS_SESSION_BUS_ADDRESS={bus_addr}",
-            "gsettings", "set", f"{base_path}:{custom_path}",
-            "binding", "'<Super>e'"
-        ], check=True)
+        # Configure keyboard shortcuts and set Super+E for Nautilus
+        gsettings_set_many(windows_shortcut_settings(), user, offline)
         
         return True
-    except subprocess.CalledProcessError as e:
+    except RuntimeError as e:
+        print(f"Cannot set shortcuts: {e}")
+        return False
+    except (subprocess.CalledProcessError, subprocess.TimeoutExpired) as e:
         print(f"Failed to set shortcuts: {e}")
         return False
 
-def get_hang_timeout() -> int:
-    """Get current GNOME hang timeout"""
+def get_hang_timeout(user: Optional[str] = None) -> Optional[int]:
+    """Get current GNOME hang timeout in seconds, or None if it cannot be read"""
+    output = gsettings_get("org.gnome.mutter", "check-alive-timeout", user)
+    if output is None:
+        return None
     try:
-        user = os.getenv("SUDO_USER", os.getlogin())
-        uid = subprocess.check_output(["id", "-u", user]).decode().strip()
-        output = subprocess.check_output([
-            "sudo", "-u", user,
-            "DBUS_SESSION_BUS_ADDRESS=unix:path=/run/user/" + uid + "/bus",
-            "gsettings", "get", "org.gnome.mutter", "check-alive-timeout"
-        ], text=True).strip()
         return int(output.replace("uint32 ", "")) // 1000
-    except:
-        return 5  # Default 5 seconds
+    except ValueError:
+        return None
+
+def set_hang_timeout(seconds: int, user: Optional[str] = None, offline: bool = False) -> None:
+    """Write the GNOME hang timeout; raises like gsettings_set_many"""
+    gsettings_set_many([("org.gnome.mutter", "check-alive-timeout", f"uint32 {seconds * 1000}")], user, offline)
 
 def adjust_hang_timeout() -> bool:
     """Adjust GNOME hang timeout"""
     try:
         current = get_hang_timeout()
+        if current is None:
+            print(f"Cannot read hang timeout: {probe_unavailable(f'bus:{get_target_user()}') or 'gsettings unavailable'}")
+            return False
         new_seconds = input(f"Enter new timeout in seconds (current: {current}, 0=disable): ").strip()
         if not new_seconds.isdigit():
             print("Invalid input. Must be a number.")
             return False
             
-        new_milliseconds = int(new_seconds) * 1000
-        user = os.getenv("SUDO_USER", os.getlogin())
-        uid = subprocess.check_output(["id", "-u", user]).decode().strip()
-        
-        subprocess.run([
-            "sudo", "-u", user,
-            "DBUS_SESSION_BUS_ADDRESS=unix:path=/run/user/" + uid + "/bus",
-            "gsettings", "set", "org.gnome.mutter",
-            "check-alive-timeout", f"uint32 {new_milliseconds}"
-        ], check=True)
+        set_hang_timeout(int(new_seconds))
         return True
-    except subprocess.CalledProcessError as e:
+    except RuntimeError as e:
+        print(f"Cannot adjust timeout: {e}")
+        return False
+    except (subprocess.CalledProcessError, subprocess.TimeoutExpired) as e:
         print(f"Timeout adjustment failed: {e}")
-        return False
\ No newline at end of file
+        return False
+
+# Multi-user batch
+BATCH_WORKERS = 8
+HUMAN_UID_MIN = 1000
+HUMAN_UID_MAX = 60000  # Above this are nobody and systemd dynamic users
+NOLOGIN_SHELLS = ("/usr/sbin/nologin", "/sbin/nologin", "/bin/false", "/usr/bin/false", "")
+
+def list_human_users(pattern: Optional[str] = None, passwd_file: str = "/etc/passwd") -> List[Dict]:
+    """Return human accounts from passwd (login shell, UID range), optionally filtered by an fnmatch pattern"""
+    users = []
+    try:
+        with open(passwd_file, "r") as f:
+            lines = f.read().splitlines()
+    except OSError:
+        return users
+    for line in lines:
+        fields = line.split(":")
+        if len(fields) < 7 or not fields[2].isdigit():
+            continue
+        name, uid, home, shell = fields[0], int(fields[2]), fields[5], fields[6]
+        if not HUMAN_UID_MIN <= uid <= HUMAN_UID_MAX or shell in NOLOGIN_SHELLS:
+            continue
+        if pattern and not fnmatch.fnmatch(name, pattern):
+            continue
+        users.append({"name": name, "uid": uid, "home": home})
+    return users
+
+def portable_dir_layout(user_dirs: Dict[str, str], home: str = HOME_DIR) -> Dict[str, str]:
+    """Rewrite paths under a home directory to $HOME-relative form so a layout can be shared"""
+    layout = {}
+    for key, value in user_dirs.items():
+        if value == home or value.startswith(home + "/"):
+            value = "$HOME" + value[len(home):]
+        layout[key] = value
+    return layout
+
+def apply_user_tweaks(user: str, layout: Optional[Dict[str, str]] = None, shortcuts: bool = False,
+                      hang_timeout: Optional[int] = None) -> List[str]:
+    """Apply the selected per-user tweaks to one account; returns a list of errors"""
+    errors = []
+    home = pwd.getpwnam(user).pw_dir
+    offline = session_bus_address(user) is None
+    if layout:
+        try:
+            for value in layout.values():
+                # xdg-user-dirs-update resets entries whose folder is missing
+                folder = expand_user_dir(value, home)
+                if not os.path.isdir(folder):
+                    os.makedirs(folder)
+                    chown_to_user(folder, user)
+            save_user_dirs(layout, user)
+        except OSError as e:
+            errors.append(f"folders: {e}")
+    settings = []
+    if shortcuts:
+        settings += windows_shortcut_settings()
+    if hang_timeout is not None:
+        settings.append(("org.gnome.mutter", "check-alive-timeout", f"uint32 {hang_timeout * 1000}"))
+    if settings:
+        try:
+            gsettings_set_many(settings, user, offline=True)
+        except (RuntimeError, subprocess.CalledProcessError, subprocess.TimeoutExpired) as e:
+            errors.append(f"gsettings{' (offline)' if offline else ''}: {e}")
+    return errors
+
+def batch_apply_user_tweaks(users: List[str], workers: int = BATCH_WORKERS, **tweaks) -> Dict[str, List[str]]:
+    """Apply per-user tweaks to many accounts concurrently; returns {user: errors}"""
+    results = {}
+    with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = {pool.submit(apply_user_tweaks, user, **tweaks): user for user in users}
+        for future in concurrent.futures.as_completed(futures):
+            user = futures[future]
+            try:
+                results[user] = future.result()
+            except Exception as e:
+                results[user] = [str(e)]
+            print(f"    {user}: {'; '.join(results[user]) or 'done'}")
+    return results
+
+# Shell startup profiling
+SHELL_ENV_FILE = "/etc/profile.d/ubuntu25-tweakinstall.sh"  # The one fragment this tool installs
+LEGACY_SHELL_FRAGMENTS = ("/etc/profile.d/cuda.sh", LEGACY_WINDOWS_COMMANDS)
+SHELL_SLOW_FRAGMENT_MS = 10.0
+SHELL_TIMING_RUNS = 5
+
+# Variable -> directories (relative to root) added when present
+SHELL_PATH_ENTRIES = {
+    "PATH": ["usr/local/cuda/bin"],
+    "LD_LIBRARY_PATH": ["usr/local/cuda/lib64"],
+}
+
+# Sources each file in turn in one interactive bash, recording EPOCHREALTIME and the paths around it
+FRAGMENT_TIMER_SCRIPT = r"""
+for f in "$@"; do
+    p=$PATH; l=${LD_LIBRARY_PATH:-}; s=$EPOCHREALTIME
+    . "$f" >/dev/null 2>&1 </dev/null
+    e=$EPOCHREALTIME
+    printf '%s\037%s\037%s\037%s\037%s\037%s\037%s\n' "$f" "$s" "$e" "$p" "$PATH" "$l" "${LD_LIBRARY_PATH:-}" >&3
+done
+"""
+
+def user_shell_command(user: str, args: List[str]) -> List[str]:
+    """Build a command that runs a shell as the user with their own HOME"""
+    info = pwd.getpwnam(user)
+    cmd = ["env", f"HOME={info.pw_dir}", f"USER={user}"] + args
+    if os.getuid() == info.pw_uid:
+        return cmd
+    return ["sudo", "-u", user] + cmd
+
+def time_login_shell(user: Optional[str] = None, runs: int = SHELL_TIMING_RUNS) -> Optional[float]:
+    """Return the median wall time in ms of an interactive login bash that exits immediately"""
+    cmd = user_shell_command(user or get_target_user(), ["bash", "-lic", "exit"])
+    samples = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        try:
+            subprocess.run(cmd, stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL,
+                           stderr=subprocess.DEVNULL, timeout=ACTION_TIMEOUT)
+        except (subprocess.TimeoutExpired, OSError):
+            return None
+        samples.append((time.perf_counter() - start) * 1000)
+    samples.sort()
+    return samples[len(samples) // 2]
+
+def startup_fragments(user: Optional[str] = None, root: str = "/") -> List[str]:
+    """Return the files a login bash sources, in order, that can be timed individually"""
+    home = pwd.getpwnam(user or get_target_user()).pw_dir
+    files = sorted(glob.glob(os.path.join(root, "etc/profile.d/*.sh")))
+    files.append(os.path.join(root, "etc/bash.bashrc"))
+    files.append(os.path.join(home, ".bashrc"))
+    return [f for f in files if os.path.isfile(f)]
+
+def path_changes(before: str, after: str) -> Tuple[List[str], List[str]]:
+    """Return (entries added, entries added that were already present) between two path strings"""
+    old = [p for p in before.split(":") if p]
+    new = [p for p in after.split(":") if p]
+    remaining = list(old)
+    added = []
+    for entry in new:
+        if entry in remaining:
+            remaining.remove(entry)
+        else:
+            added.append(entry)
+    duplicates = [entry for entry in added if entry in old or added.count(entry) > 1]
+    return added, sorted(set(duplicates))
+
+def parse_fragment_timings(output: str) -> List[Dict]:
+    """Parse the fragment timer output into per-file timing and path changes"""
+    rows = []
+    for line in output.splitlines():
+        fields = line.split("\x1f")
+        if len(fields) != 7:
+            continue
+        try:
+            # EPOCHREALTIME follows LC_NUMERIC, which may use a decimal comma
+            start, end = (float(v.replace(",", ".")) for v in fields[1:3])
+        except ValueError:
+            continue
+        path_added, path_dupes = path_changes(fields[3], fields[4])
+        ld_added, ld_dupes = path_changes(fields[5], fields[6])
+        rows.append({"file": fields[0], "ms": (end - start) * 1000,
+                     "path_added": path_added, "path_dupes": path_dupes,
+                     "ld_added": ld_added, "ld_dupes": ld_dupes})
+    return rows
+
+def profile_shell_fragments(user: Optional[str] = None) -> Optional[List[Dict]]:
+    """Source each startup fragment under a timer as the user; None when bash cannot run"""
+    user = user or get_target_user()
+    files = startup_fragments(user)
+    # Results go to fd 3 so fragment output on stdout cannot corrupt them
+    script = "exec 3>&1 >/dev/null 2>&1\n" + FRAGMENT_TIMER_SCRIPT
+    cmd = user_shell_command(user, ["bash", "--noprofile", "--norc", "-i", "-c", script, "bash"] + files)
+    output = run_probe("shell-profile", cmd, timeout=ACTION_TIMEOUT)
+    if output is None:
+        return None
+    return parse_fragment_timings(output)
+
+def fragment_warnings(rows: List[Dict], slow_ms: float = SHELL_SLOW_FRAGMENT_MS) -> List[str]:
+    """Describe slow fragments and duplicate PATH/LD_LIBRARY_PATH additions"""
+    warnings = []
+    for row in rows:
+        name = row["file"]
+        if row["ms"] >= slow_ms:
+            warnings.append(f"{name}: slow ({row['ms']:.1f} ms)")
+        for entry in row["path_dupes"]:
+            warnings.append(f"{name}: adds {entry} to PATH again")
+        for entry in row["ld_dupes"]:
+            warnings.append(f"{name}: adds {entry} to LD_LIBRARY_PATH again")
+        if name in LEGACY_SHELL_FRAGMENTS:
+            warnings.append(f"{name}: legacy fragment from this tool, can be consolidated")
+    return warnings
+
+def shell_env_content(root: str = "/") -> Optional[str]:
+    """Return the consolidated profile fragment for what is installed, or None when nothing is needed"""
+    lines = []
+    for variable, entries in SHELL_PATH_ENTRIES.items():
+        present = ["/" + entry for entry in entries if os.path.isdir(os.path.join(root, entry))]
+        for directory in present:
+            lines.append(f'case ":${{{variable}:-}}:" in *:{directory}:*) ;; '
+                         f'*) {variable}="{directory}${{{variable}:+:${variable}}}" ;; esac')
+        if present:
+            lines.append(f"export {variable}")
+    if not lines:
+        return None
+    return ("# Generated by Ubuntu25-TweakInstall: consolidated shell environment\n"
+            "# Each entry is added once, however often this file is sourced\n"
+            + "\n".join(lines) + "\n")
+
+def write_shell_env(root: str = "/") -> None:
+    """Install or remove the consolidated profile fragment to match what is installed"""
+    content = shell_env_content(root)
+    path = os.path.join(root, SHELL_ENV_FILE.lstrip("/"))
+    if content is None:
+        remove_file(path)
+    else:
+        write_config_file(path, content)
+
+def consolidate_shell_fragments() -> List[str]:
+    """Fold this tool's shell fragments into SHELL_ENV_FILE; returns what was changed"""
+    changes = []
+    write_shell_env()
+    if os.path.exists(SHELL_ENV_FILE):
+        changes.append(f"Wrote {SHELL_ENV_FILE}")
+    for fragment in LEGACY_SHELL_FRAGMENTS:
+        # The legacy functions are only dropped once the dispatcher that replaces them is in place
+        if fragment == LEGACY_WINDOWS_COMMANDS and os.path.exists(fragment) and not check_windows_commands():
+            changes.append(f"Kept {fragment}: install the Windows-like commands first to replace it")
+            continue
+        if remove_file(fragment):
+            changes.append(f"Removed {fragment}")
+    return changes
+
+# Benchmark harness
+BENCH_HISTORY_DIR = os.path.join(STATE_DIR, "benchmarks")  # One JSONL run history per host
+BENCH_REPEATS = 7
+BENCH_IO_DIR = "/var/tmp"  # Disk-backed, unlike /tmp which may be tmpfs
+BENCH_IO_SIZE = 128 * 1024 * 1024
+BENCH_MEMORY_SIZE = 64 * 1024 * 1024
+BENCH_RANDOM_READS = 2048
+
+def bench_cpu_int() -> float:
+    """Integer LCG loop; returns million iterations per second"""
+    x, n = 1, 1_000_000
+    start = time.perf_counter()
+    for _ in range(n):
+        x = (x * 1103515245 + 12345) & 0x7FFFFFFF
+    return n / (time.perf_counter() - start) / 1e6
+
+def bench_cpu_float() -> float:
+    """Floating point multiply-add loop; returns million iterations per second"""
+    x, n = 1.0, 1_000_000
+    start = time.perf_counter()
+    for _ in range(n):
+        x = x * 0.999999 + 0.5
+    return n / (time.perf_counter() - start) / 1e6
+
+def bench_memory_copy() -> float:
+    """Copy a large buffer through memoryviews; returns GB/s"""
+    src = bytearray(BENCH_MEMORY_SIZE)
+    dst = bytearray(BENCH_MEMORY_SIZE)
+    src_view, dst_view = memoryview(src), memoryview(dst)
+    rounds = 8
+    start = time.perf_counter()
+    for _ in range(rounds):
+        dst_view[:] = src_view
+    return BENCH_MEMORY_SIZE * rounds / (time.perf_counter() - start) / 1e9
+
+def bench_io_file() -> str:
+    """Create (once per run) the disk benchmark file and return its path"""
+    path = os.path.join(BENCH_IO_DIR, "tweakinstall-bench.dat")
+    if os.path.exists(path) and os.path.getsize(path) == BENCH_IO_SIZE:
+        return path
+    chunk = os.urandom(1 << 20)
+    with open(path, "wb") as f:
+        for _ in range(BENCH_IO_SIZE >> 20):
+            f.write(chunk)
+        f.flush()
+        os.fsync(f.fileno())
+    return path
+
+def drop_file_cache(fd: int) -> None:
+    """Evict a file from the page cache so reads hit the disk"""
+    os.fsync(fd)
+    os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_DONTNEED)
+
+def bench_mmap_sequential() -> float:
+    """Read the benchmark file sequentially through mmap from a cold cache; returns MB/s"""
+    fd = os.open(bench_io_file(), os.O_RDONLY)
+    try:
+        drop_file_cache(fd)
+        with mmap.mmap(fd, BENCH_IO_SIZE, prot=mmap.PROT_READ) as mapped:
+            mapped.madvise(mmap.MADV_SEQUENTIAL)
+            view = memoryview(mapped)
+            start = time.perf_counter()
+            total = 0
+            for offset in range(0, BENCH_IO_SIZE, 4096):
+                total += view[offset]
+            elapsed = time.perf_counter() - start
+            view.release()
+    finally:
+        os.close(fd)
+    return BENCH_IO_SIZE / elapsed / 1e6
+
+def bench_mmap_random() -> float:
+    """Touch random pages of the benchmark file through mmap from a cold cache; returns reads/s"""
+    offsets = [random.Random(42 + i).randrange(BENCH_IO_SIZE // 4096) * 4096 for i in range(BENCH_RANDOM_READS)]
+    fd = os.open(bench_io_file(), os.O_RDONLY)
+    try:
+        drop_file_cache(fd)
+        with mmap.mmap(fd, BENCH_IO_SIZE, prot=mmap.PROT_READ) as mapped:
+            mapped.madvise(mmap.MADV_RANDOM)
+            start = time.perf_counter()
+            total = 0
+            for offset in offsets:
+                total += mapped[offset]
+            elapsed = time.perf_counter() - start
+    finally:
+        os.close(fd)
+    return BENCH_RANDOM_READS / elapsed
+
+def bench_fork_exec() -> float:
+    """Spawn /bin/true repeatedly; returns milliseconds per fork/exec/wait"""
+    n = 50
+    start = time.perf_counter()
+    for _ in range(n):
+        subprocess.run(["/bin/true"])
+    return (time.perf_counter() - start) / n * 1000
+
+def bench_shell_startup() -> float:
+    """Interactive login shell startup of the target user; returns milliseconds"""
+    return time_login_shell(runs=1) or float("nan")
+
+# name -> (description, unit, higher is better, function)
+BENCHMARKS = {
+    "cpu-int": ("CPU integer loop", "Mops/s", True, bench_cpu_int),
+    "cpu-float": ("CPU float loop", "Mops/s", True, bench_cpu_float),
+    "memory-copy": ("Memory copy bandwidth", "GB/s", True, bench_memory_copy),
+    "mmap-seq": ("Disk sequential read (mmap, cold)", "MB/s", True, bench_mmap_sequential),
+    "mmap-random": ("Disk random 4K read (mmap, cold)", "reads/s", True, bench_mmap_random),
+    "fork-exec": ("fork/exec latency", "ms", False, bench_fork_exec),
+    "shell-startup": ("Login shell startup", "ms", False, bench_shell_startup),
+}
+
+def run_benchmarks(label: str = "", names: Optional[List[str]] = None, repeats: int = BENCH_REPEATS) -> Dict:
+    """Run the benchmark battery, append it to this host's history and return the run"""
+    names = names or list(BENCHMARKS)
+    run = {"host": socket.gethostname(), "time": int(time.time()), "label": label, "results": {}}
+    try:
+        for name in names:
+            description, unit, _, function = BENCHMARKS[name]
+            print(f"    {description}...", end="", flush=True)
+            samples = [function() for _ in range(repeats)]
+            run["results"][name] = samples
+            print(f" {statistics.median(samples):.2f} {unit}")
+    finally:
+        remove_file(os.path.join(BENCH_IO_DIR, "tweakinstall-bench.dat"))
+    os.makedirs(BENCH_HISTORY_DIR, exist_ok=True)
+    with open(os.path.join(BENCH_HISTORY_DIR, f"{run['host']}.jsonl"), "a") as f:
+        f.write(json.dumps(run) + "\n")
+    return run
+
+def load_benchmark_history(host: Optional[str] = None) -> List[Dict]:
+    """Return the recorded runs for a host, oldest first"""
+    path = os.path.join(BENCH_HISTORY_DIR, f"{host or socket.gethostname()}.jsonl")
+    runs = []
+    for line in (read_text(path) or "").splitlines():
+        try:
+            runs.append(json.loads(line))
+        except ValueError:
+            continue
+    return runs
+
+def t_critical(df: float, confidence: float = 0.95) -> float:
+    """Two-sided Student t critical value (Cornish-Fisher expansion around the normal quantile)"""
+    z = statistics.NormalDist().inv_cdf(0.5 + confidence / 2)
+    df = max(df, 1.0)
+    return (z + (z ** 3 + z) / (4 * df) + (5 * z ** 5 + 16 * z ** 3 + 3 * z) / (96 * df ** 2)
+            + (3 * z ** 7 + 19 * z ** 5 + 17 * z ** 3 - 15 * z) / (384 * df ** 3))
+
+def welch_interval(before: List[float], after: List[float], confidence: float = 0.95) -> Tuple[float, float, float]:
+    """Return (difference of means, CI low, CI high) for after - before using Welch's t interval"""
+    before = [v for v in before if v == v]
+    after = [v for v in after if v == v]
+    if len(before) < 2 or len(after) < 2:
+        return float("nan"), float("nan"), float("nan")
+    diff = statistics.fmean(after) - statistics.fmean(before)
+    va, vb = statistics.variance(before) / len(before), statistics.variance(after) / len(after)
+    se = (va + vb) ** 0.5
+    if se == 0:
+        return diff, diff, diff
+    df = (va + vb) ** 2 / (va ** 2 / (len(before) - 1) + vb ** 2 / (len(after) - 1))
+    margin = t_critical(df, confidence) * se
+    return diff, diff - margin, diff + margin
+
+def compare_benchmarks(before: Dict, after: Dict) -> List[Dict]:
+    """Compare two runs per benchmark: relative change with a 95% CI and a verdict"""
+    rows = []
+    for name, (description, unit, higher_is_better, _) in BENCHMARKS.items():
+        if name not in before["results"] or name not in after["results"]:
+            continue
+        # Failed samples are recorded as NaN; leave them out as welch_interval does
+        before_samples = [v for v in before["results"][name] if v == v]
+        after_samples = [v for v in after["results"][name] if v == v]
+        base = statistics.fmean(before_samples) if before_samples else float("nan")
+        current = statistics.fmean(after_samples) if after_samples else float("nan")
+        diff, low, high = welch_interval(before_samples, after_samples)
+        if diff != diff:
+            verdict = "not enough samples"
+        elif low > 0 or high < 0:
+            verdict = "better" if (low > 0) == higher_is_better else "worse"
+        else:
+            verdict = "no significant change"
+        rows.append({"name": name, "description": description, "unit": unit,
+                     "before": base, "after": current,
+                     "change": 100 * (current - base) / base if base else float("nan"),
+                     "low": 100 * low / base if base else float("nan"),
+                     "high": 100 * high / base if base else float("nan"),
+                     "verdict": verdict})
+    return rows
+
+def ab_benchmark(operation, label: str, names: Optional[List[str]] = None) -> Optional[List[Dict]]:
+    """Benchmark, run an operation (a callable returning False/None on failure), benchmark again and compare"""
+    print("Baseline run:")
+    before = run_benchmarks(f"before {label}", names)
+    if not operation():
+        print("Operation failed; skipping the second run.")
+        return None
+    print("After run:")
+    after = run_benchmarks(f"after {label}", names)
+    return compare_benchmarks(before, after)
+
+# Hardware detection
+PCI_VENDORS = {
+    "0x1002": "AMD",
+    "0x10de": "NVIDIA",
+    "0x8086": "Intel",
+    "0x17cb": "Qualcomm",
+    "0x1af4": "Red Hat (virtio)",
+    "0x15ad": "VMware",
+    "0x1234": "QEMU",
+}
+
+VIRTUAL_GPU_VENDORS = {"0x1af4", "0x15ad", "0x1234"}
+
+# Bundled table of GPUs with official ROCm support (vendor 0x1002); others use the Mesa stack
+ROCM_DEVICE_IDS = {
+    "0x66a0": "Instinct MI50/MI60",
+    "0x66a1": "Instinct MI50/MI60",
+    "0x66af": "Radeon VII",
+    "0x738c": "Instinct MI100",
+    "0x7408": "Instinct MI250X",
+    "0x740c": "Instinct MI250X/MI250",
+    "0x740f": "Instinct MI210",
+    "0x74a1": "Instinct MI300X",
+    "0x73a1": "Radeon Pro V620",
+    "0x73a2": "Radeon Pro W6900X",
+    "0x73a3": "Radeon Pro W6800",
+    "0x73a5": "Radeon RX 6950 XT",
+    "0x73af": "Radeon RX 6900 XT",
+    "0x73bf": "Radeon RX 6800/6800 XT/6900 XT",
+    "0x744c": "Radeon RX 7900 XT/XTX/GRE",
+    "0x7448": "Radeon Pro W7900",
+    "0x745e": "Radeon Pro W7800",
+    "0x747e": "Radeon RX 7800 XT/7700 XT",
+    "0x7480": "Radeon RX 7600/7600 XT",
+    "0x7550": "Radeon RX 9070/9070 XT",
+    "0x7590": "Radeon RX 9060 XT",
+}
+
+# Setup functions offered by the hardware menus, keyed by detection result
+SETUP_DESCRIPTIONS = {
+    "amd_cpu_setup": "AMD CPU microcode",
+    "intel_cpu_setup": "Intel CPU microcode",
+    "arm64_firmware_setup": "ARM64 firmware (Snapdragon)",
+    "amdgpu_non_rocm_setup": "AMDGPU (Non-ROCm)",
+    "amdgpu_rocm_setup": "AMDGPU (ROCm)",
+    "nvidia_gpu_setup": "NVIDIA GPU drivers",
+    "intel_gpu_setup": "Intel GPU drivers",
+}
+
+def read_cpu_info(root: str = "/") -> Dict[str, str]:
+    """Read CPU vendor and model from the first processor entry in /proc/cpuinfo"""
+    info = {"vendor": "Unknown", "model": "Unknown"}
+    try:
+        with open(os.path.join(root, "proc/cpuinfo"), "r") as f:
+            for line in f:
+                if not line.strip():
+                    break  # End of the first processor block
+                key, _, value = line.partition(":")
+                key, value = key.strip(), value.strip()
+                if key == "vendor_id":
+                    info["vendor"] = value
+                elif key in ("model name", "Model"):
+                    info["model"] = value
+                elif key == "CPU implementer" and info["vendor"] == "Unknown":
+                    info["vendor"] = f"ARM implementer {value}"
+    except OSError:
+        pass
+    return info
+
+def read_pci_devices(root: str = "/") -> List[Dict[str, str]]:
+    """List PCI devices with vendor, device and class IDs from sysfs"""
+    devices = []
+    base = os.path.join(root, "sys/bus/pci/devices")
+    try:
+        entries = sorted(os.listdir(base))
+    except OSError:
+        return devices
+    for slot in entries:
+        device = {"slot": slot}
+        for attr in ("vendor", "device", "class"):
+            try:
+                with open(os.path.join(base, slot, attr), "r") as f:
+                    device[attr] = f.read().strip().lower()
+            except OSError:
+                device[attr] = ""
+        devices.append(device)
+    return devices
+
+def list_gpus(root: str = "/", devices: Optional[List[Dict[str, str]]] = None) -> List[Dict[str, str]]:
+    """Return display-class PCI devices (VGA, 3D and other display controllers)"""
+    if devices is None:
+        devices = read_pci_devices(root)
+    gpus = []
+    for device in devices:
+        if device["class"].startswith("0x03"):
+            gpus.append(dict(device, vendor_name=PCI_VENDORS.get(device["vendor"], "Unknown")))
+    return gpus
+
+def parse_ubuntu_drivers(output: str) -> Optional[str]:
+    """Pick the recommended driver from `ubuntu-drivers devices` output (first listed otherwise)"""
+    drivers = []
+    for line in output.splitlines():
+        if line.strip().startswith("driver") and ":" in line:
+            fields = line.split(":", 1)[1].split()
+            if fields:
+                if "recommended" in line:
+                    return fields[0]
+                drivers.append(fields[0])
+    return drivers[0] if drivers else None
+
+def detect_hardware(root: str = "/") -> Dict:
+    """Detect CPU and GPU vendors and the setup functions that match them"""
+    cpu = read_cpu_info(root)
+    gpus = list_gpus(root)
+    recommended = []
+
+    if cpu["vendor"] == "AuthenticAMD":
+        recommended.append(("amd_cpu_setup", f"{cpu['model']}"))
+    elif cpu["vendor"] == "GenuineIntel":
+        recommended.append(("intel_cpu_setup", f"{cpu['model']}"))
+    elif cpu["vendor"] == "ARM implementer 0x51":  # Qualcomm
+        recommended.append(("arm64_firmware_setup", "Qualcomm ARM64 CPU"))
+
+    for gpu in gpus:
+        vendor = gpu["vendor"]
+        if vendor in VIRTUAL_GPU_VENDORS:
+            gpu["name"] = f"{gpu['vendor_name']} virtual display"
+            continue
+        if vendor == "0x1002":
+            if gpu["device"] in ROCM_DEVICE_IDS:
+                gpu["name"] = ROCM_DEVICE_IDS[gpu["device"]]
+                recommended.append(("amdgpu_rocm_setup", f"{gpu['name']} ({gpu['slot']}) is ROCm capable"))
+            else:
+                gpu["name"] = f"AMD GPU {gpu['device']}"
+                recommended.append(("amdgpu_non_rocm_setup", f"{gpu['name']} ({gpu['slot']})"))
+        elif vendor == "0x10de":
+            gpu["name"] = f"NVIDIA GPU {gpu['device']}"
+            recommended.append(("nvidia_gpu_setup", f"{gpu['name']} ({gpu['slot']})"))
+        elif vendor == "0x8086":
+            gpu["name"] = f"Intel GPU {gpu['device']}"
+            recommended.append(("intel_gpu_setup", f"{gpu['name']} ({gpu['slot']})"))
+        else:
+            gpu["name"] = f"{gpu['vendor_name']} GPU {gpu['device']}"
+
+    # Keep the first reason per setup function
+    unique = {}
+    for function, reason in recommended:
+        unique.setdefault(function, reason)
+    return {"cpu": cpu, "gpus": gpus, "recommended": list(unique.items())}
+
+def run_recommended_setup(recommended: List[Tuple[str, str]]) -> bool:
+    """Run the recommended setup functions in order, returning True if all succeeded"""
+    results = []
+    for function, _ in recommended:
+        print(f"\n--- {SETUP_DESCRIPTIONS.get(function, function)} ---")
+        results.append(bool(globals()[function]()))
+    return all(results)
+
+# Machine state snapshot
+def read_dpkg_status(packages: Optional[List[str]] = None,
+                     status_file: str = "/var/lib/dpkg/status") -> Dict[str, str]:
+    """Return {package: version} for installed packages, optionally limited to a list"""
+    wanted = set(packages) if packages is not None else None
+    installed = {}
+    try:
+        with open(status_file, "r", errors="replace") as f:
+            content = f.read()
+    except OSError:
+        return installed
+    for block in content.split("\n\n"):
+        if not block.startswith("Package: "):
+            block = block.lstrip("\n")
+            if not block.startswith("Package: "):
+                continue
+        name = block[9:block.find("\n")] if "\n" in block else block[9:]
+        if wanted is not None and name not in wanted:
+            continue
+        if "\nStatus: install ok installed" not in block:
+            continue
+        version = ""
+        pos = block.find("\nVersion: ")
+        if pos != -1:
+            end = block.find("\n", pos + 1)
+            version = block[pos + 10:end if end != -1 else None]
+        installed[name] = version
+    return installed
+
+def get_cuda_version() -> Optional[str]:
+    """Return the installed CUDA toolkit version from version.json, falling back to nvcc"""
+    try:
+        with open("/usr/local/cuda/version.json", "r") as f:
+            return json.load(f)["cuda"]["version"]
+    except (OSError, ValueError, KeyError):
+        pass
+    nvcc = require_binary("nvcc") or ("/usr/local/cuda/bin/nvcc" if os.path.exists("/usr/local/cuda/bin/nvcc") else None)
+    if nvcc is None:
+        return None
+    output = run_probe("nvcc", [nvcc, "--version"])
+    if output and "release" in output:
+        # "Cuda compilation tools, release 12.5, V12.5.82"
+        return output.split("release", 1)[1].split(",")[0].strip()
+    return None
+
+def collect_machine_state() -> Dict:
+    """Gather everything the menus display in one pass, sharing reads and spawns"""
+    started = time.perf_counter()
+    user = get_target_user()
+
+    packages = read_dpkg_status(["notepadqq", "winehq-stable", "opensnitch"])
+    cuda_version = get_cuda_version()
+    shortcut_binding, hang_timeout = gsettings_get_many([
+        (f"{CUSTOM_KEYBINDING_SCHEMA}:{CUSTOM_KEYBINDING_PATH}", "binding"),
+        ("org.gnome.mutter", "check-alive-timeout"),
+    ], user)
+    try:
+        hang_seconds = int(hang_timeout.replace("uint32 ", "")) // 1000 if hang_timeout else None
+    except ValueError:
+        hang_seconds = None
+    _, user_dirs = read_user_dirs()
+    pci_devices = read_pci_devices()
+
+    state = {
+        "hostname": socket.gethostname(),
+        "user": user,
+        "packages": {
+            "opensnitch": shutil.which("opensnitch") is not None,
+            "notepadqq": "notepadqq" in packages,
+            "tor_browser": is_tor_installed(),
+            "wine": packages.get("winehq-stable"),
+            "cuda": cuda_version,
+        },
+        "tweaks": {
+            "sudo_nopasswd": check_sudo_nopasswd(),
+            "auto_login": check_auto_login(),
+            "windows_commands": check_windows_commands(),
+            "windows_shortcuts": shortcut_binding == "'<Super>e'",
+            "hang_timeout_seconds": hang_seconds,
+        },
+        "user_dirs": user_dirs,
+        "cpu": read_cpu_info(),
+        "gpus": [
+            {"slot": gpu["slot"], "vendor": gpu["vendor_name"], "device": gpu["device"]}
+            for gpu in list_gpus(devices=pci_devices)
+        ],
+        "unavailable": dict(_UNAVAILABLE),
+    }
+    state["probe_ms"] = round((time.perf_counter() - started) * 1000, 1)
+    return state
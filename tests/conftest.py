@@ -0,0 +1,12 @@
+import os
+import sys
+
+# The scripts package is imported from the repository root, as launcher.py does
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+
+def read_fixture(*parts: str) -> str:
+    """Return the text of a captured command output under tests/fixtures"""
+    with open(os.path.join(FIXTURES, *parts)) as f:
+        return f.read()
@@ -0,0 +1,74 @@
+import pytest
+
+from conftest import read_fixture
+from scripts.utility import (attribute_boot_delays, parse_blame, parse_boot_time,
+                             parse_critical_chain, parse_time_span)
+
+@pytest.mark.parametrize("text, seconds", [
+    ("345ms", 0.345),
+    ("2.345s", 2.345),
+    ("1min 2.3s", 62.3),
+    ("1h 2min 3s", 3723.0),
+    ("900us", 0.0009),
+    ("12µs", 0.000012),
+])
+def test_parse_time_span(text, seconds):
+    assert parse_time_span(text) == pytest.approx(seconds)
+
+@pytest.mark.parametrize("text", ["", "soon", "5 parsecs", "1.2.3s"])
+def test_parse_time_span_rejects_garbage(text):
+    assert parse_time_span(text) is None
+
+def test_parse_boot_time_with_firmware_loader_and_initrd():
+    times = parse_boot_time(read_fixture("boot", "time-efi.txt"))
+    assert times["total"] == pytest.approx(77.081)
+    assert times["firmware"] == pytest.approx(5.212)
+    assert times["loader"] == pytest.approx(3.104)
+    assert times["kernel"] == pytest.approx(2.345)
+    assert times["initrd"] == pytest.approx(4.12)
+    assert times["userspace"] == pytest.approx(62.3)
+
+def test_parse_boot_time_without_firmware_phases():
+    times = parse_boot_time(read_fixture("boot", "time-bios.txt"))
+    assert times["total"] == pytest.approx(12.845)
+    assert times["userspace"] == pytest.approx(10.5)
+    assert "firmware" not in times
+
+def test_parse_boot_time_while_booting():
+    assert parse_boot_time("Bootup is not yet finished.\n") == {"total": None, "userspace": None}
+
+def test_parse_blame():
+    blame = parse_blame(read_fixture("boot", "blame.txt"))
+    assert blame[0] == ("snapd.seeded.service", pytest.approx(62.3))
+    assert ("snapd.socket", pytest.approx(0.027)) in blame
+    assert blame[-1] == ("systemd-remount-fs.service", pytest.approx(0.0009))
+    assert len(blame) == 8
+
+def test_parse_critical_chain_unicode_tree():
+    chain = parse_critical_chain(read_fixture("boot", "critical-chain.txt"))
+    assert [entry["unit"] for entry in chain] == [
+        "graphical.target", "multi-user.target", "snapd.service", "basic.target",
+        "sockets.target", "snapd.socket", "sysinit.target", "-.mount",
+    ]
+    assert chain[0]["at"] == pytest.approx(62.12)
+    assert chain[0]["took"] == 0.0
+    assert chain[2]["took"] == pytest.approx(6.37)
+
+def test_parse_critical_chain_ascii_tree():
+    chain = parse_critical_chain(read_fixture("boot", "critical-chain-ascii.txt"))
+    assert [entry["unit"] for entry in chain] == [
+        "graphical.target", "multi-user.target", "libvirtd.service", "basic.target",
+        "sockets.target", "-.mount",
+    ]
+    assert chain[2]["took"] == pytest.approx(2.104)
+
+def test_attribute_boot_delays():
+    blame = parse_blame(read_fixture("boot", "blame.txt"))
+    chain = parse_critical_chain(read_fixture("boot", "critical-chain.txt"))
+    rows = {row["unit"]: row for row in attribute_boot_delays(blame, chain)}
+    assert set(rows) == {"snapd.service", "libvirtd.service", "tweakinstall-cpu-profile.service",
+                         "systemd-zram-setup@zram0.service"}
+    assert rows["snapd.service"]["critical"] is True
+    assert rows["libvirtd.service"]["critical"] is False
+    assert rows["snapd.service"]["source"] == "Software managers (snapd)"
+    assert rows["tweakinstall-cpu-profile.service"]["source"] == "Ubuntu25-TweakInstall generated unit"
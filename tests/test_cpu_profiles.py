@@ -0,0 +1,93 @@
+import os
+
+from scripts.utility import (CPU_SYSFS, cpu_profile_script, cpu_restore_writes, plan_cpu_profile,
+                             read_cpu_tuning_state, save_state, state_dir_for)
+
+IDLE_LATENCIES = ["0", "1", "18", "350"]  # POLL, C1, C2, C6 exit latency in microseconds
+
+def write(path, value):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w") as f:
+        f.write(value + "\n")
+
+def make_cpu_root(tmp_path, driver="amd-pstate-epp", cpus=4):
+    """Build a fake /sys/devices/system/cpu for an amd-pstate (boost) or intel_pstate (no_turbo) host"""
+    base = os.path.join(str(tmp_path), CPU_SYSFS)
+    write(os.path.join(base, "online"), f"0-{cpus - 1}")
+    for cpu in range(cpus):
+        policy = os.path.join(base, "cpufreq", f"policy{cpu}")
+        write(os.path.join(policy, "scaling_driver"), driver)
+        write(os.path.join(policy, "scaling_governor"), "powersave")
+        write(os.path.join(policy, "scaling_available_governors"), "performance powersave")
+        write(os.path.join(policy, "energy_performance_preference"), "balance_performance")
+        write(os.path.join(policy, "energy_performance_available_preferences"),
+              "default performance balance_performance balance_power power")
+        for index, latency in enumerate(IDLE_LATENCIES):
+            state = os.path.join(base, f"cpu{cpu}", "cpuidle", f"state{index}")
+            write(os.path.join(state, "latency"), latency)
+            write(os.path.join(state, "disable"), "0")
+    if driver.startswith("amd"):
+        write(os.path.join(base, "amd_pstate", "status"), "active")
+        write(os.path.join(base, "cpufreq", "boost"), "1")
+    else:
+        write(os.path.join(base, "intel_pstate", "status"), "active")
+        write(os.path.join(base, "intel_pstate", "no_turbo"), "0")
+    return str(tmp_path)
+
+def test_read_state(tmp_path):
+    root = make_cpu_root(tmp_path)
+    state = read_cpu_tuning_state(root)
+    assert state["policies"] == 4
+    assert state["driver"] == "amd-pstate-epp"
+    assert state["mode"] == "amd_pstate active"
+    assert state["governors"] == ["powersave"]
+    assert state["boost"] is True
+    assert state["profile"] is None
+
+def test_profile_name_read_from_fake_root_state(tmp_path):
+    root = make_cpu_root(tmp_path)
+    save_state("cpu-profile", {"profile": "latency", "original": {}}, state_dir_for(root))
+    assert read_cpu_tuning_state(root)["profile"] == "latency"
+
+def test_throughput_plan_orders_governor_before_epp(tmp_path):
+    root = make_cpu_root(tmp_path, cpus=2)
+    writes = [(os.path.relpath(path, root), value) for path, value in plan_cpu_profile("throughput", root)]
+    policy0 = os.path.join(CPU_SYSFS, "cpufreq", "policy0")
+    assert writes[:2] == [(os.path.join(policy0, "scaling_governor"), "performance"),
+                          (os.path.join(policy0, "energy_performance_preference"), "performance")]
+    assert writes[-1] == (os.path.join(CPU_SYSFS, "cpufreq", "boost"), "1")
+    assert not any("cpuidle" in path for path, _ in writes)
+
+def test_balanced_falls_back_to_available_governor(tmp_path):
+    root = make_cpu_root(tmp_path, cpus=1)
+    writes = dict(plan_cpu_profile("balanced", root))
+    policy = os.path.join(root, CPU_SYSFS, "cpufreq", "policy0")
+    assert writes[os.path.join(policy, "scaling_governor")] == "powersave"  # No schedutil on amd-pstate-epp
+    assert writes[os.path.join(policy, "energy_performance_preference")] == "balance_performance"
+
+def test_latency_disables_only_slow_idle_states(tmp_path):
+    root = make_cpu_root(tmp_path, cpus=2)
+    idle = [path for path, value in plan_cpu_profile("latency", root) if "cpuidle" in path]
+    assert sorted(os.path.basename(os.path.dirname(path)) for path in idle) == ["state3", "state3"]
+
+def test_intel_boost_is_inverted(tmp_path):
+    root = make_cpu_root(tmp_path, driver="intel_pstate", cpus=1)
+    writes = dict(plan_cpu_profile("throughput", root))
+    assert writes[os.path.join(root, CPU_SYSFS, "intel_pstate", "no_turbo")] == "0"
+
+def test_switching_away_from_latency_restores_idle_states(tmp_path):
+    root = make_cpu_root(tmp_path, cpus=1)
+    latency = plan_cpu_profile("latency", root)
+    original = {path: "0" if "cpuidle" in path else "powersave" for path, _ in latency}
+    restore = cpu_restore_writes(original, plan_cpu_profile("throughput", root))
+    assert restore == [(path, "0") for path, _ in latency if "cpuidle" in path]
+
+def test_no_cpufreq_plans_nothing(tmp_path):
+    assert plan_cpu_profile("throughput", str(tmp_path)) == []
+
+def test_boot_script_uses_real_paths(tmp_path):
+    root = make_cpu_root(tmp_path, cpus=1)
+    script = cpu_profile_script("throughput", plan_cpu_profile("throughput", root), root)
+    assert script.startswith("#!/bin/sh\n# Generated by Ubuntu25-TweakInstall")
+    assert str(tmp_path) not in script
+    assert 'echo performance > "/sys/devices/system/cpu/cpufreq/policy0/scaling_governor"' in script
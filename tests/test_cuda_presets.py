@@ -0,0 +1,32 @@
+from conftest import read_fixture
+from scripts.utility import (CUDA_PRESETS, cuda_install_options, cuda_preset_packages, parse_apt_records,
+                             parse_apt_simulation)
+
+def test_parse_apt_simulation_lists_installs_and_upgrades_only():
+    packages = parse_apt_simulation(read_fixture("apt", "cuda-compile-simulation.txt"))
+    assert len(packages) == 11
+    assert packages[0] == ("cuda-keyring", "1.1-2")
+    assert ("cuda-cccl-12-5", "12.5.39-1") in packages
+    assert ("libcublas-dev-12-5", "12.5.3.2-1") in packages
+    # Conf lines repeat packages already counted
+    assert len(set(packages)) == len(packages)
+
+def test_parse_apt_simulation_without_installs():
+    assert parse_apt_simulation("0 upgraded, 0 newly installed, 0 to remove and 0 not upgraded.\n") == []
+
+def test_parse_apt_records_sizes():
+    records = parse_apt_records(read_fixture("apt", "cuda-records.txt"))
+    assert records[("cuda-cudart-12-5", "12.5.82-1")] == (170446, 732 * 1024)
+    # The first record of a duplicated version wins
+    assert records[("libcublas-12-5", "12.5.3.2-1")] == (378651066, 776152 * 1024)
+    assert records[("cuda-toolkit-config-common", "12.5.82-1")] == (0, 0)
+    assert len(records) == 3
+
+def test_presets_expand_version():
+    assert cuda_preset_packages("runtime", "12-5") == ["cuda-cudart-12-5", "libcublas-12-5"]
+    assert all("{v}" not in name for preset in CUDA_PRESETS for name in cuda_preset_packages(preset))
+
+def test_full_preset_keeps_recommends():
+    assert cuda_install_options("full") == []
+    assert cuda_install_options("runtime") == ["--no-install-recommends"]
+    assert cuda_install_options("compile") == ["--no-install-recommends"]
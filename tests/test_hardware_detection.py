@@ -0,0 +1,72 @@
+import os
+
+import pytest
+
+from conftest import FIXTURES
+from scripts.utility import detect_hardware, list_gpus, read_cpu_info, read_pci_devices
+
+def make_root(tmp_path, cpuinfo: str, devices):
+    """Build a fake root with /proc/cpuinfo from a fixture and PCI devices as (slot, vendor, device, class)"""
+    os.makedirs(tmp_path / "proc")
+    with open(os.path.join(FIXTURES, "cpuinfo", cpuinfo)) as src, open(tmp_path / "proc" / "cpuinfo", "w") as dst:
+        dst.write(src.read())
+    for slot, vendor, device, pci_class in devices:
+        path = tmp_path / "sys" / "bus" / "pci" / "devices" / slot
+        os.makedirs(path)
+        for attr, value in (("vendor", vendor), ("device", device), ("class", pci_class)):
+            (path / attr).write_text(value + "\n")
+    return str(tmp_path)
+
+HOST_BRIDGE = ("0000:00:00.0", "0x1022", "0x1480", "0x060000")
+
+def test_read_cpu_info_uses_first_processor(tmp_path):
+    root = make_root(tmp_path, "amd-ryzen.txt", [])
+    assert read_cpu_info(root) == {"vendor": "AuthenticAMD", "model": "AMD Ryzen 9 5900X 12-Core Processor"}
+
+def test_read_cpu_info_arm_implementer(tmp_path):
+    root = make_root(tmp_path, "snapdragon.txt", [])
+    assert read_cpu_info(root)["vendor"] == "ARM implementer 0x51"
+
+def test_read_cpu_info_missing(tmp_path):
+    assert read_cpu_info(str(tmp_path)) == {"vendor": "Unknown", "model": "Unknown"}
+    assert read_pci_devices(str(tmp_path)) == []
+
+def test_list_gpus_only_display_class(tmp_path):
+    root = make_root(tmp_path, "intel-core.txt", [
+        HOST_BRIDGE,
+        ("0000:00:02.0", "0x8086", "0xA780", "0x030000"),
+        ("0000:01:00.0", "0x10de", "0x2684", "0x030200"),
+    ])
+    gpus = list_gpus(root)
+    assert [gpu["slot"] for gpu in gpus] == ["0000:00:02.0", "0000:01:00.0"]
+    assert gpus[0]["device"] == "0xa780"  # Lower-cased for table lookups
+    assert [gpu["vendor_name"] for gpu in gpus] == ["Intel", "NVIDIA"]
+
+@pytest.mark.parametrize("cpuinfo, devices, expected", [
+    ("amd-ryzen.txt", [HOST_BRIDGE, ("0000:0b:00.0", "0x1002", "0x744c", "0x030000")],
+     ["amd_cpu_setup", "amdgpu_rocm_setup"]),
+    ("amd-ryzen.txt", [("0000:0b:00.0", "0x1002", "0x164e", "0x030000")],
+     ["amd_cpu_setup", "amdgpu_non_rocm_setup"]),
+    ("intel-core.txt", [("0000:00:02.0", "0x8086", "0xa780", "0x030000"),
+                        ("0000:01:00.0", "0x10de", "0x2684", "0x030000")],
+     ["intel_cpu_setup", "intel_gpu_setup", "nvidia_gpu_setup"]),
+    ("intel-core.txt", [("0000:00:01.0", "0x1234", "0x1111", "0x030000")], ["intel_cpu_setup"]),
+    ("snapdragon.txt", [("0000:00:00.0", "0x17cb", "0x0111", "0x038000")], ["arm64_firmware_setup"]),
+])
+def test_detect_hardware_recommendations(tmp_path, cpuinfo, devices, expected):
+    result = detect_hardware(make_root(tmp_path, cpuinfo, devices))
+    assert [function for function, _ in result["recommended"]] == expected
+
+def test_detect_hardware_names_and_deduplicates(tmp_path):
+    root = make_root(tmp_path, "amd-ryzen.txt", [
+        ("0000:0b:00.0", "0x1002", "0x744c", "0x030000"),
+        ("0000:0c:00.0", "0x1002", "0x744c", "0x030000"),
+        ("0000:00:01.0", "0x1af4", "0x1050", "0x030000"),
+    ])
+    result = detect_hardware(root)
+    # Devices come back in PCI slot order
+    assert [gpu["name"] for gpu in result["gpus"]] == [
+        "Red Hat (virtio) virtual display", "Radeon RX 7900 XT/XTX/GRE", "Radeon RX 7900 XT/XTX/GRE"]
+    reasons = dict(result["recommended"])
+    assert reasons["amdgpu_rocm_setup"] == "Radeon RX 7900 XT/XTX/GRE (0000:0b:00.0) is ROCm capable"
+    assert len(result["recommended"]) == 2
@@ -0,0 +1,75 @@
+import fnmatch
+
+import pytest
+
+from scripts.utility import IO_POLICY, io_device_class, io_udev_rules, list_block_devices, plan_io_tuning
+
+DEVICES = {
+    # name: (rotational, scheduler line)
+    "nvme0n1": ("0", "[none] mq-deadline kyber bfq"),
+    "sda": ("1", "mq-deadline kyber [bfq] none"),
+    "sdb": ("0", "[mq-deadline] kyber bfq none"),
+    "mmcblk0": ("0", "[mq-deadline] kyber bfq none"),
+    "vda": ("1", "[none] mq-deadline kyber bfq"),
+    "xvdb": ("0", "[none] mq-deadline kyber bfq"),
+    "pmem0": ("0", "[none]"),
+    "loop0": ("0", "[none] mq-deadline"),
+    "zram0": ("0", "[none]"),
+}
+
+@pytest.fixture
+def fake_sysfs(tmp_path):
+    for name, (rotational, scheduler) in DEVICES.items():
+        queue = tmp_path / "sys" / "block" / name / "queue"
+        queue.mkdir(parents=True)
+        (queue / "rotational").write_text(rotational + "\n")
+        (queue / "scheduler").write_text(scheduler + "\n")
+        (queue / "read_ahead_kb").write_text("128\n")
+        (queue / "nr_requests").write_text("256\n")
+    return str(tmp_path)
+
+def parse_rules(text):
+    """Return [(kernel patterns, rotational or None, scheduler)] from the generated rules"""
+    rules = []
+    for line in text.splitlines():
+        if line.startswith("#"):
+            continue
+        fields = dict(field.strip().replace("==", "=", 1).split("=", 1) for field in line.split(", "))
+        rules.append((fields["KERNEL"].strip('"').split("|"),
+                      fields.get("ATTR{queue/rotational}", "").strip('"') or None,
+                      fields["ATTR{queue/scheduler}"].strip('"')))
+    return rules
+
+@pytest.mark.parametrize("name, rotational, kind", [
+    ("nvme0n1", False, "nvme"),
+    ("sda", True, "hdd"),
+    ("sda", False, "ssd"),
+    ("vdc", True, "hdd"),
+    ("xvda", False, "ssd"),
+    ("mmcblk1", False, "ssd"),
+    ("mmcblk1", True, "other"),
+    ("pmem0", False, "other"),
+    ("nvme0c0n1", False, "nvme"),
+])
+def test_io_device_class(name, rotational, kind):
+    assert io_device_class(name, rotational) == kind
+
+def test_list_block_devices_skips_virtual(fake_sysfs):
+    names = [device["name"] for device in list_block_devices(fake_sysfs)]
+    assert names == ["mmcblk0", "nvme0n1", "pmem0", "sda", "sdb", "vda", "xvdb"]
+
+def test_plan_only_targets_rule_matched_disks(fake_sysfs):
+    plan = {device["name"]: device for device in plan_io_tuning(fake_sysfs)}
+    assert sorted(plan) == ["mmcblk0", "nvme0n1", "sda", "sdb", "vda", "xvdb"]
+    assert plan["vda"]["target_scheduler"] == IO_POLICY["hdd"][0]
+    assert plan["xvdb"]["target_scheduler"] == IO_POLICY["ssd"][0]
+    assert plan["nvme0n1"]["target_read_ahead_kb"] == str(IO_POLICY["nvme"][1])
+
+def test_udev_rules_match_the_plan(fake_sysfs):
+    rules = parse_rules(io_udev_rules())
+    for device in plan_io_tuning(fake_sysfs):
+        rotational = "1" if device["kind"] == "hdd" else "0"
+        matched = [scheduler for patterns, rule_rotational, scheduler in rules
+                   if any(fnmatch.fnmatchcase(device["name"], pattern) for pattern in patterns)
+                   and rule_rotational in (None, rotational)]
+        assert matched == [device["target_scheduler"]], device["name"]
@@ -0,0 +1,101 @@
+import json
+
+import pytest
+
+from scripts.utility import (GRUB_DEFAULT_FILE, STATE_DIR, applied_param_sets, apply_kernel_param_set,
+                             kernel_param_diff, parse_grub_cmdline, remove_kernel_param_set, set_grub_cmdline)
+
+GRUB = """GRUB_DEFAULT=0
+GRUB_TIMEOUT=5
+GRUB_CMDLINE_LINUX_DEFAULT="quiet splash transparent_hugepage=never"
+GRUB_CMDLINE_LINUX=""
+"""
+
+def make_root(tmp_path, grub=GRUB, cmdline=None):
+    grub_path = tmp_path / GRUB_DEFAULT_FILE
+    grub_path.parent.mkdir(parents=True)
+    grub_path.write_text(grub)
+    if cmdline is not None:
+        (tmp_path / "proc").mkdir()
+        (tmp_path / "proc" / "cmdline").write_text(cmdline + "\n")
+    return str(tmp_path)
+
+def grub_tokens(root):
+    with open(f"{root}/{GRUB_DEFAULT_FILE}") as f:
+        return parse_grub_cmdline(f.read())
+
+def load_provenance(root):
+    with open(f"{root}/{STATE_DIR.lstrip('/')}/kernel-params.json") as f:
+        return json.load(f)
+
+@pytest.mark.parametrize("line, tokens", [
+    ('GRUB_CMDLINE_LINUX_DEFAULT="quiet splash"', ["quiet", "splash"]),
+    ("GRUB_CMDLINE_LINUX_DEFAULT='quiet splash'", ["quiet", "splash"]),
+    ("GRUB_CMDLINE_LINUX_DEFAULT=quiet", ["quiet"]),
+    ('GRUB_CMDLINE_LINUX_DEFAULT=""', []),
+])
+def test_parse_grub_cmdline_quoting(line, tokens):
+    assert parse_grub_cmdline(f"GRUB_DEFAULT=0\n{line}\n") == tokens
+
+def test_parse_grub_cmdline_missing_key():
+    assert parse_grub_cmdline("GRUB_DEFAULT=0\n") == []
+
+def test_set_grub_cmdline_replaces_only_its_key():
+    content = set_grub_cmdline(GRUB, ["quiet", "mitigations=off"])
+    assert 'GRUB_CMDLINE_LINUX_DEFAULT="quiet mitigations=off"' in content.splitlines()
+    assert 'GRUB_CMDLINE_LINUX=""' in content.splitlines()
+    assert parse_grub_cmdline(content) == ["quiet", "mitigations=off"]
+
+def test_set_grub_cmdline_appends_missing_key():
+    content = set_grub_cmdline("GRUB_DEFAULT=0\n", ["quiet"])
+    assert content.splitlines()[-1] == 'GRUB_CMDLINE_LINUX_DEFAULT="quiet"'
+
+def test_apply_is_idempotent(tmp_path):
+    root = make_root(tmp_path)
+    assert apply_kernel_param_set("mitigations-off", root=root)
+    first = grub_tokens(root)
+    assert apply_kernel_param_set("mitigations-off", root=root)
+    assert grub_tokens(root) == first
+    assert first.count("mitigations=off") == 1
+    assert applied_param_sets(root=root) == ["mitigations-off"]
+    assert (tmp_path / (GRUB_DEFAULT_FILE + ".tweakinstall.bak")).read_text() == GRUB
+
+def test_remove_restores_previous_token(tmp_path):
+    root = make_root(tmp_path)
+    assert apply_kernel_param_set("thp-madvise", root=root)
+    assert "transparent_hugepage=madvise" in grub_tokens(root)
+    assert "transparent_hugepage=never" not in grub_tokens(root)
+    assert load_provenance(root)["transparent_hugepage"]["previous"] == "transparent_hugepage=never"
+
+    # Switching sets keeps the user's original value as the one to restore
+    assert apply_kernel_param_set("thp-always", root=root)
+    assert load_provenance(root)["transparent_hugepage"]["previous"] == "transparent_hugepage=never"
+
+    assert remove_kernel_param_set("thp-always", root=root)
+    assert grub_tokens(root) == ["quiet", "splash", "transparent_hugepage=never"]
+    assert load_provenance(root) == {}
+    assert applied_param_sets(root=root) == []
+
+def test_remove_without_previous_drops_token(tmp_path):
+    root = make_root(tmp_path)
+    assert apply_kernel_param_set("preempt-full", root=root)
+    assert remove_kernel_param_set("preempt-full", root=root)
+    assert grub_tokens(root) == ["quiet", "splash", "transparent_hugepage=never"]
+
+def test_kernel_param_diff_ignores_kernel_added_tokens(tmp_path):
+    cmdline = ("BOOT_IMAGE=/boot/vmlinuz-6.14.0-15-generic root=UUID=0f3c-11aa ro "
+               "quiet splash transparent_hugepage=never preempt=voluntary")
+    root = make_root(tmp_path, cmdline=cmdline)
+    assert apply_kernel_param_set("mitigations-off", root=root)
+    assert apply_kernel_param_set("preempt-full", root=root)
+    assert sorted(kernel_param_diff(root)) == [
+        ("mitigations=off", "reboot to apply"),
+        ("preempt=full", "reboot to apply"),
+        ("preempt=voluntary", "reboot to remove"),
+    ]
+
+def test_kernel_param_diff_normalises_dashes(tmp_path):
+    grub = GRUB.replace("transparent_hugepage=never", "nvidia_drm.modeset=1")
+    root = make_root(tmp_path, grub=grub, cmdline="BOOT_IMAGE=/boot/vmlinuz root=/dev/sda1 quiet splash "
+                                                  "nvidia-drm.modeset=1")
+    assert kernel_param_diff(root) == []
@@ -0,0 +1,93 @@
+import http.server
+import os
+import shutil
+import threading
+import time
+
+import pytest
+
+from conftest import FIXTURES, read_fixture
+from scripts.utility import (UBUNTU_SOURCES_FILE, apply_mirror, current_archive_mirror, measure_mirror_latency,
+                             parse_deb822, rank_mirrors, restore_sources, rewrite_sources_mirror)
+
+CODENAME = "plucky"
+ARCH = "amd64"
+SAMPLE = os.urandom(256 * 1024)
+
+class MirrorHandler(http.server.BaseHTTPRequestHandler):
+    """Serves a Release file and a Packages.gz sample after the server's injected delay and rate"""
+
+    def do_GET(self):
+        time.sleep(self.server.delay)
+        if self.path == f"/ubuntu/dists/{CODENAME}/Release":
+            body = b"Origin: Ubuntu\n"
+        elif self.path == f"/ubuntu/dists/{CODENAME}/main/binary-{ARCH}/Packages.gz":
+            body = SAMPLE
+        else:
+            self.send_error(404)
+            return
+        self.send_response(200)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        for offset in range(0, len(body), 32768):
+            self.wfile.write(body[offset:offset + 32768])
+            time.sleep(self.server.chunk_delay)
+
+    def log_message(self, *args):
+        pass
+
+@pytest.fixture
+def mirror_server():
+    servers = []
+
+    def start(delay: float, chunk_delay: float = 0.0) -> str:
+        server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), MirrorHandler)
+        server.delay, server.chunk_delay = delay, chunk_delay
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        servers.append(server)
+        return f"http://127.0.0.1:{server.server_port}/ubuntu/"
+
+    yield start
+    for server in servers:
+        server.shutdown()
+        server.server_close()
+
+def test_rank_mirrors_orders_by_throughput_and_drops_broken(mirror_server):
+    fast = mirror_server(0.0)
+    slow_start = mirror_server(0.15)
+    slow_transfer = mirror_server(0.0, chunk_delay=0.05)
+    ranked = rank_mirrors([slow_transfer, "http://127.0.0.1:1/ubuntu", slow_start, fast, "http://host:abc/"],
+                          CODENAME, ARCH)
+    mirrors = [r["mirror"] for r in ranked]
+    # A slow first byte costs latency, not throughput; only the throttled transfer ranks last
+    assert set(mirrors[:2]) == {fast, slow_start}
+    assert mirrors[2] == slow_transfer
+    assert all(r["throughput"] for r in ranked[:3])
+    assert all(r["latency"] is None and r["error"] for r in ranked[3:])
+    latency = {r["mirror"]: r["latency"] for r in ranked}
+    assert latency[slow_start] > latency[fast] + 0.1
+
+def test_latency_survives_invalid_url():
+    result = measure_mirror_latency("http://host:abc/", CODENAME)
+    assert result["latency"] is None and result["error"]
+
+def test_rewrite_leaves_security_stanza_on_ports_layout():
+    text = read_fixture("apt", "ubuntu-ports.sources")
+    current = current_archive_mirror(text)
+    assert current == "http://ports.ubuntu.com/ubuntu-ports/"
+    stanzas = parse_deb822(rewrite_sources_mirror(text, current, "http://mirror.example/ubuntu-ports"))
+    assert stanzas[0]["URIs"] == "http://mirror.example/ubuntu-ports/"
+    assert stanzas[1]["URIs"] == "http://ports.ubuntu.com/ubuntu-ports/"
+    assert stanzas[1]["Suites"] == "plucky-security"
+
+def test_apply_mirror_is_repeatable_and_restorable(tmp_path):
+    path = tmp_path / UBUNTU_SOURCES_FILE
+    path.parent.mkdir(parents=True)
+    shutil.copy(os.path.join(FIXTURES, "apt", "ubuntu.sources"), path)
+    original = path.read_text()
+    assert apply_mirror("http://one.example/ubuntu", str(tmp_path))
+    assert apply_mirror("http://two.example/ubuntu/", str(tmp_path))
+    changed = path.read_text()
+    assert changed == original.replace("http://archive.ubuntu.com/ubuntu/", "http://two.example/ubuntu/")
+    assert restore_sources(str(tmp_path))
+    assert path.read_text() == original
@@ -0,0 +1,77 @@
+import csv
+import os
+import zipfile
+
+import pytest
+
+from scripts.utility import link_wheel_into_venv, record_hash, rewrite_script_shebang, unpack_wheel
+
+WHEEL_FILES = {
+    "demo/__init__.py": "def main():\n    return 0\n",
+    "demo-1.0.data/scripts/demo-tool": "#!python\nprint('tool')\n",
+    "demo-1.0.data/scripts/demo-shell": "#!/bin/sh\necho shell\n",
+    "demo-1.0.data/headers/demo.h": "/* not installed */\n",
+    "demo-1.0.dist-info/METADATA": "Metadata-Version: 2.1\nName: demo\nVersion: 1.0\n",
+    "demo-1.0.dist-info/WHEEL": "Wheel-Version: 1.0\nRoot-Is-Purelib: true\n",
+    "demo-1.0.dist-info/entry_points.txt": "[console_scripts]\ndemo = demo:main\n",
+}
+
+@pytest.fixture
+def venv(tmp_path):
+    wheel = tmp_path / "demo-1.0-py3-none-any.whl"
+    record = [[path, *record_hash(content.encode())] for path, content in WHEEL_FILES.items()]
+    record.append(["demo-1.0.dist-info/RECORD", "", ""])
+    with zipfile.ZipFile(wheel, "w") as archive:
+        for path, content in WHEEL_FILES.items():
+            archive.writestr(path, content)
+        archive.writestr("demo-1.0.dist-info/RECORD", "".join(",".join(row) + "\n" for row in record))
+    (tmp_path / "cache").mkdir()
+    unpacked = unpack_wheel(str(wheel), str(tmp_path / "cache"))
+    path = tmp_path / "env"
+    site_packages = path / "lib" / "python3.12" / "site-packages"
+    site_packages.mkdir(parents=True)
+    link_wheel_into_venv(unpacked, str(path), str(site_packages))
+    return path, site_packages, unpacked
+
+def read_record(site_packages):
+    with open(site_packages / "demo-1.0.dist-info" / "RECORD", newline="") as f:
+        return {row[0]: row[1:] for row in csv.reader(f)}
+
+@pytest.mark.parametrize("script, expected", [
+    (b"#!python\nprint(1)\n", b"#!/env/bin/python\nprint(1)\n"),
+    (b"#!pythonw\n", b"#!/env/bin/python\n"),
+    (b"#!python -E -s\nx\n", b"#!/env/bin/python -E -s\nx\n"),
+    (b"#!/bin/sh\necho\n", b"#!/bin/sh\necho\n"),
+    (b"#!python", b"#!/env/bin/python"),
+])
+def test_rewrite_script_shebang(script, expected):
+    assert rewrite_script_shebang(script, "/env/bin/python") == expected
+
+def test_data_scripts_are_rewritten_copies(venv):
+    path, _, unpacked = venv
+    tool = path / "bin" / "demo-tool"
+    assert tool.read_text() == f"#!{path / 'bin' / 'python'}\nprint('tool')\n"
+    assert os.stat(tool).st_mode & 0o777 == 0o755
+    assert (path / "bin" / "demo-shell").read_text() == WHEEL_FILES["demo-1.0.data/scripts/demo-shell"]
+    # The shared cache keeps the placeholder
+    cached = os.path.join(unpacked, "demo-1.0.data", "scripts", "demo-tool")
+    assert open(cached).read() == WHEEL_FILES["demo-1.0.data/scripts/demo-tool"]
+    assert os.stat(cached).st_ino != os.stat(tool).st_ino
+
+def test_record_lists_installed_files(venv):
+    path, site_packages, unpacked = venv
+    record = read_record(site_packages)
+    installed = {os.path.normpath(site_packages / entry) for entry in record}
+    expected = {str(path / "bin" / name) for name in ("demo", "demo-tool", "demo-shell")}
+    expected |= {str(site_packages / "demo" / "__init__.py")}
+    expected |= {str(site_packages / "demo-1.0.dist-info" / name)
+                 for name in ("METADATA", "WHEEL", "entry_points.txt", "INSTALLER", "RECORD")}
+    assert installed == expected
+    assert all(os.path.exists(entry) for entry in installed)
+    for entry, (digest, size) in record.items():
+        if not entry.endswith("RECORD"):
+            data = (site_packages / entry).read_bytes()
+            assert [digest, size] == list(record_hash(data)), entry
+    # The cached RECORD still describes the wheel itself
+    with open(os.path.join(unpacked, "demo-1.0.dist-info", "RECORD")) as f:
+        assert "demo-1.0.data/scripts/demo-tool" in f.read()
@@ -0,0 +1,94 @@
+import os
+
+import pytest
+
+from scripts.utility import (SYSCTL_PROFILES, apply_sysctl_profile, diff_sysctl_profile, is_sysctl_profile_applied,
+                             load_state, parse_sysctl_errors, read_sysctl, revert_sysctl_profile, state_dir_for,
+                             sysctl_path, sysctl_profile_file)
+
+# Live values on a stock Ubuntu desktop
+STOCK_VALUES = {
+    "net.core.default_qdisc": "fq_codel",
+    "net.ipv4.tcp_congestion_control": "cubic",
+    "net.core.rmem_max": "212992",
+    "net.core.wmem_max": "212992",
+    "net.ipv4.tcp_rmem": "4096\t131072\t6291456",
+    "net.ipv4.tcp_wmem": "4096\t16384\t4194304",
+    "net.core.netdev_max_backlog": "1000",
+    "vm.dirty_background_ratio": "10",
+    "vm.dirty_ratio": "20",
+    "vm.dirty_writeback_centisecs": "500",
+    "vm.dirty_expire_centisecs": "3000",
+    "vm.vfs_cache_pressure": "100",
+    "fs.inotify.max_user_watches": "65536",
+    "fs.inotify.max_user_instances": "128",
+    "fs.file-max": "9223372036854775807",
+}
+
+@pytest.fixture
+def fake_root(tmp_path):
+    """A root with /proc/sys populated from STOCK_VALUES (net.ipv4.tcp_mtu_probing is missing)"""
+    for key, value in STOCK_VALUES.items():
+        path = sysctl_path(key, str(tmp_path))
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "w") as f:
+            f.write(value + "\n")
+    return str(tmp_path)
+
+def test_read_sysctl_normalises_whitespace(fake_root):
+    assert read_sysctl("net.ipv4.tcp_rmem", fake_root) == "4096 131072 6291456"
+    assert read_sysctl("net.ipv4.tcp_mtu_probing", fake_root) is None
+
+def test_diff_lists_only_differing_keys(fake_root):
+    diff = {key: (live, target) for key, live, target in diff_sysctl_profile("desktop", fake_root)}
+    assert "vm.dirty_expire_centisecs" not in diff
+    assert diff["vm.dirty_ratio"] == ("20", "10")
+    network = {key: live for key, live, _ in diff_sysctl_profile("network", fake_root)}
+    assert network["net.ipv4.tcp_mtu_probing"] is None
+
+def test_state_dir_stays_inside_fake_root(fake_root):
+    assert state_dir_for("/") is None
+    assert state_dir_for(fake_root).startswith(fake_root + os.sep)
+
+def test_apply_and_revert_round_trip(fake_root):
+    assert apply_sysctl_profile("network", fake_root)
+    assert is_sysctl_profile_applied("network", fake_root)
+    with open(sysctl_profile_file("network", fake_root)) as f:
+        content = f.read()
+    assert content.startswith("# Generated by Ubuntu25-TweakInstall")
+    assert "net.ipv4.tcp_congestion_control = bbr\n" in content
+    saved = load_state("sysctl-profiles", {}, state_dir_for(fake_root))
+    assert saved["network"]["net.ipv4.tcp_congestion_control"] == "cubic"
+    assert "net.ipv4.tcp_mtu_probing" not in saved["network"]
+
+    # Simulate the values sysctl --system would have applied, then revert
+    for key, value in SYSCTL_PROFILES["network"]["values"].items():
+        if read_sysctl(key, fake_root) is not None:
+            with open(sysctl_path(key, fake_root), "w") as f:
+                f.write(value)
+    assert revert_sysctl_profile("network", fake_root)
+    assert not is_sysctl_profile_applied("network", fake_root)
+    assert read_sysctl("net.ipv4.tcp_congestion_control", fake_root) == "cubic"
+    assert read_sysctl("net.ipv4.tcp_wmem", fake_root) == "4096 16384 4194304"
+    assert load_state("sysctl-profiles", {}, state_dir_for(fake_root)) == {}
+
+def test_reapply_keeps_first_saved_values(fake_root):
+    assert apply_sysctl_profile("desktop", fake_root)
+    with open(sysctl_path("vm.dirty_ratio", fake_root), "w") as f:
+        f.write("10")
+    assert apply_sysctl_profile("desktop", fake_root)
+    saved = load_state("sysctl-profiles", {}, state_dir_for(fake_root))
+    assert saved["desktop"]["vm.dirty_ratio"] == "20"
+
+def test_parse_sysctl_errors():
+    stderr = (
+        "* Applying /etc/sysctl.d/10-console-messages.conf ...\n"
+        'sysctl: setting key "net.ipv4.tcp_congestion_control": No such file or directory\n'
+        "sysctl: cannot stat /proc/sys/net/ipv4/conf/virbr0/rp_filter: No such file or directory\n"
+        "sysctl: permission denied on key 'kernel.unprivileged_userns_clone', ignoring\n"
+    )
+    errors = parse_sysctl_errors(stderr)
+    assert set(errors) == {"net.ipv4.tcp_congestion_control", "net.ipv4.conf.virbr0.rp_filter",
+                           "kernel.unprivileged_userns_clone"}
+    assert errors["net.ipv4.tcp_congestion_control"].endswith("No such file or directory")
+    assert parse_sysctl_errors("* Applying /etc/sysctl.conf ...\n") == {}
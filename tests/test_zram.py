@@ -0,0 +1,30 @@
+import pytest
+
+from scripts.utility import plan_zram, zram_swap_active
+
+SWAPS_HEADER = "Filename\t\t\t\tType\t\tSize\t\tUsed\t\tPriority\n"
+
+def write_proc(tmp_path, name, content):
+    proc = tmp_path / "proc"
+    proc.mkdir(exist_ok=True)
+    (proc / name).write_text(content)
+
+@pytest.mark.parametrize("swaps, active", [
+    (SWAPS_HEADER + "/dev/zram0                              partition\t8388604\t\t0\t\t100\n", True),
+    (SWAPS_HEADER + "/swap.img                               file\t\t2097148\t\t0\t\t-2\n", False),
+    (SWAPS_HEADER + "/dev/zram01                             partition\t8388604\t\t0\t\t100\n", False),
+    (SWAPS_HEADER, False),
+])
+def test_zram_swap_active(tmp_path, swaps, active):
+    write_proc(tmp_path, "swaps", swaps)
+    assert zram_swap_active(str(tmp_path)) is active
+
+def test_zram_swap_active_without_proc_swaps(tmp_path):
+    assert zram_swap_active(str(tmp_path)) is False
+
+def test_plan_zram_caps_size(tmp_path):
+    write_proc(tmp_path, "meminfo", "MemTotal:       65536000 kB\nMemFree:        1000 kB\n")
+    plan = plan_zram("desktop", str(tmp_path))
+    assert plan["size_mb"] == 8192
+    assert plan["algorithm"] == "zstd"
+    assert plan["sysctl"]["vm.page-cluster"] == "0"